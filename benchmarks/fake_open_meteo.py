@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ FakeOpenMeteo
+ Local stand-in for the open-meteo.com forecast API, for offline benchmarks.
+ ***************************************************************************/
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeOpenMeteoServer(ThreadingHTTPServer):
+    """Answers /v1/forecast and the model meta.json like the real service, with synthetic data.
+
+    :param latency: Seconds every response is delayed.
+    :param error_rate: Fraction of forecast requests answered with HTTP 503.
+    :param padding: Extra bytes added to every forecast document to simulate larger payloads.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, padding=0, seed=None):
+        """Constructor, port 0 picks a free port."""
+        super(FakeOpenMeteoServer, self).__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.padding = padding
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        """Return the base URL of the server."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset_stats(self):
+        """Reset the request counters."""
+        with self.lock:
+            self.stats = {'requests': 0, 'locations': 0, 'errors': 0, 'bytes': 0}
+
+    def count(self, **amounts):
+        """Add to the request counters."""
+        with self.lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def start(self):
+        """Serve on a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of FakeOpenMeteoServer."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive like the real service
+
+    def log_message(self, format, *args):
+        """Keep the benchmark output clean."""
+
+    def do_GET(self):
+        """Answer a forecast or model meta request."""
+        url = urlparse(self.path)
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        if url.path == '/v1/forecast':
+            self._forecast(parse_qs(url.query))
+        elif url.path.startswith('/data/') and url.path.endswith('/meta.json'):
+            now = time.time()
+            self._send(200, {
+                'last_run_initialisation_time': now - 4 * 3600,
+                'last_run_availability_time': now - 600,
+                'update_interval_seconds': 3 * 3600,
+            })
+        else:
+            self._send(404, {'error': True, 'reason': f"Unknown path {url.path}"})
+
+    def _forecast(self, query):
+        """Answer a forecast request for one or more locations."""
+        with self.server.lock:
+            failed = self.server.random.random() < self.server.error_rate
+        if failed:
+            self.server.count(requests=1, errors=1)
+            self._send(503, {'error': True, 'reason': "Simulated overload"})
+            return
+        try:
+            latitudes = [float(value) for value in query['latitude'][0].split(',')]
+            longitudes = [float(value) for value in query['longitude'][0].split(',')]
+            start, hours = _hour_range(query)
+        except (KeyError, ValueError) as e:
+            self._send(400, {'error': True, 'reason': f"Invalid request: {e}"})
+            return
+        if len(latitudes) != len(longitudes):
+            self._send(400, {'error': True, 'reason': "Latitude and longitude lists differ in length"})
+            return
+        hourly = _split(query, 'hourly')
+        current = _split(query, 'current')
+        documents = [_document(latitude, longitude, start, hours, hourly, current, self.server.padding)
+                     for latitude, longitude in zip(latitudes, longitudes)]
+        self.server.count(requests=1, locations=len(documents))
+        self._send(200, documents if len(documents) > 1 else documents[0])
+
+    def _send(self, status, document):
+        """Send a JSON response."""
+        body = json.dumps(document, separators=(',', ':')).encode('utf-8')
+        self.server.count(bytes=len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _split(query, name):
+    """Return the comma separated values of a query parameter."""
+    return [value for value in query.get(name, [''])[0].split(',') if value]
+
+
+def _hour_range(query):
+    """Return the first hour and the number of hours requested."""
+    if 'start_hour' in query:
+        start = datetime.fromisoformat(query['start_hour'][0]).replace(tzinfo=timezone.utc)
+        end = datetime.fromisoformat(query['end_hour'][0]).replace(tzinfo=timezone.utc)
+        return start, int((end - start).total_seconds() // 3600) + 1
+    days = int(query.get('forecast_days', ['7'])[0])
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, days * 24
+
+
+def _value(name, latitude, longitude, epoch):
+    """Return a smooth synthetic value of a variable."""
+    phase = 2 * math.pi * (epoch % 86400) / 86400
+    if name == 'temperature_2m':
+        return round(15 - abs(latitude) / 6 + 6 * math.sin(phase - 2) + longitude % 3, 1)
+    if name == 'relative_humidity_2m':
+        return round(65 + 20 * math.cos(phase), 0)
+    if name == 'wind_direction_10m':
+        return round((240 + 60 * math.sin(phase + longitude)) % 360, 0)
+    return round(10 + 5 * math.sin(phase + latitude), 1)
+
+
+_UNITS = {
+    'temperature_2m': '°C', 'apparent_temperature': '°C', 'relative_humidity_2m': '%', 'wind_speed_10m': 'km/h',
+    'wind_gusts_10m': 'km/h', 'precipitation': 'mm', 'precipitation_probability': '%', 'cloud_cover': '%',
+    'pressure_msl': 'hPa', 'wind_direction_10m': '°',
+}
+
+
+def _document(latitude, longitude, start, hours, hourly, current, padding):
+    """Return the forecast document of one location."""
+    times = [start + timedelta(hours=index) for index in range(hours)]
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    document = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'generationtime_ms': 0.1,
+        'utc_offset_seconds': 0,
+        'timezone': 'GMT',
+        'timezone_abbreviation': 'GMT',
+        'elevation': 0.0,
+        'current_units': dict({'time': 'iso8601', 'interval': 'seconds'},
+                              **{name: _UNITS.get(name, '') for name in current}),
+        'current': dict({'time': now.strftime("%Y-%m-%dT%H:%M"), 'interval': 900},
+                        **{name: _value(name, latitude, longitude, now.timestamp()) for name in current}),
+        'hourly_units': dict({'time': 'iso8601'}, **{name: _UNITS.get(name, '') for name in hourly}),
+        'hourly': dict({'time': [moment.strftime("%Y-%m-%dT%H:%M") for moment in times]},
+                       **{name: [_value(name, latitude, longitude, moment.timestamp()) for moment in times]
+                          for name in hourly}),
+    }
+    if padding:
+        document['padding'] = 'x' * padding
+    return document
+
+
+def main():
+    """Run the server from the command line."""
+    parser = argparse.ArgumentParser(description="Local stand-in for the open-meteo.com forecast API.")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every response is delayed.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument('--padding', type=int, default=0, help="Extra bytes per forecast document.")
+    args = parser.parse_args()
+    server = FakeOpenMeteoServer(args.port, args.latency, args.error_rate, args.padding)
+    print(f"Serving on {server.url}/v1/forecast")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
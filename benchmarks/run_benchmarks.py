@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherDock benchmarks
+ Drives the plugin headless through pan traces against a local stand-in
+ of the forecast API and reports requests, latency, render time and memory.
+
+ Run with the Python of a QGIS installation, e.g.:
+     python benchmarks/run_benchmarks.py --days 1 3 7 --latency 0.05
+ ***************************************************************************/
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCHMARK_DIR)
+PACKAGE = 'weather_dock_plugin'
+
+sys.path.insert(0, BENCHMARK_DIR)
+from fake_open_meteo import FakeOpenMeteoServer  # noqa: E402
+
+# Without a display the canvas and dock are rendered offscreen
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QEventLoop, QSettings  # noqa: E402
+from PyQt5.QtWidgets import QMainWindow  # noqa: E402
+from qgis.core import (  # noqa: E402
+    QgsApplication, QgsCoordinateReferenceSystem, QgsNetworkAccessManager, QgsRectangle)
+from qgis.gui import QgsMapCanvas  # noqa: E402
+
+START_LONGITUDE = 13.4  # Berlin
+START_LATITUDE = 52.5
+WARMUP_LONGITUDE = -74.0  # New York, far from the traces so warming up caches none of their cells
+WARMUP_LATITUDE = 40.7
+VIEW_WIDTH_M = 200000.0  # Width of the canvas extent in EPSG:3857 meters
+SETTLE_TIMEOUT_S = 30.0
+
+
+class StubIface:
+    """The parts of QgisInterface the plugin uses, around a real, offscreen QgsMapCanvas."""
+
+    def __init__(self):
+        """Constructor."""
+        self.main_window = QMainWindow()
+        self.canvas = QgsMapCanvas(self.main_window)
+        self.canvas.setDestinationCrs(QgsCoordinateReferenceSystem('EPSG:3857'))
+        self.main_window.setCentralWidget(self.canvas)
+        self.main_window.resize(1200, 800)
+        self.main_window.show()
+
+    def mainWindow(self):
+        """Return the main window."""
+        return self.main_window
+
+    def mapCanvas(self):
+        """Return the map canvas."""
+        return self.canvas
+
+    def addDockWidget(self, area, dock_widget):
+        """Add a dock widget to the main window."""
+        self.main_window.addDockWidget(area, dock_widget)
+
+    def removeDockWidget(self, dock_widget):
+        """Remove a dock widget from the main window."""
+        self.main_window.removeDockWidget(dock_widget)
+
+    def addToolBarIcon(self, action):
+        """Ignore toolbar actions."""
+
+    def removeToolBarIcon(self, action):
+        """Ignore toolbar actions."""
+
+    def addPluginToMenu(self, menu, action):
+        """Ignore menu actions."""
+
+    def removePluginMenu(self, menu, action):
+        """Ignore menu actions."""
+
+
+def mercator(longitude, latitude):
+    """Return the EPSG:3857 coordinates of a WGS 84 coordinate."""
+    x = longitude * 20037508.34 / 180.0
+    y = math.log(math.tan((90.0 + latitude) * math.pi / 360.0)) * 20037508.34 / math.pi
+    return x, y
+
+
+def synthetic_traces():
+    """Return the built-in pan traces as name -> [(x, y, width, seconds to the next step)]."""
+    x, y = mercator(START_LONGITUDE, START_LATITUDE)
+    drag = [(x + step * 0.02 * VIEW_WIDTH_M, y, VIEW_WIDTH_M, 0.03) for step in range(60)]
+    jumps = [mercator(longitude, latitude) + (VIEW_WIDTH_M, 1.5)
+             for longitude, latitude in ((2.35, 48.86), (-0.13, 51.51), (12.5, 41.9), (16.37, 48.21), (13.4, 52.5))]
+    zoom = [(x, y, VIEW_WIDTH_M * 0.8 ** step, 0.05) for step in range(20)]
+    fling = [(x + 0.1 * VIEW_WIDTH_M * step * (1 - step / 40.0), y - 0.02 * VIEW_WIDTH_M * step, VIEW_WIDTH_M, 0.02)
+             for step in range(20)]
+    return {'drag': drag, 'jumps': jumps, 'zoom': zoom, 'fling': fling}
+
+
+def load_trace(path):
+    """Load a recorded trace, a JSON list of {"x", "y", "width", "dt"} objects in EPSG:3857."""
+    with open(path, encoding='utf-8') as trace_file:
+        return [(step['x'], step['y'], step['width'], step.get('dt', 0.05)) for step in json.load(trace_file)]
+
+
+def load_plugin():
+    """Import the plugin directory as a package, whatever the checkout is named."""
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, os.path.join(PLUGIN_DIR, '__init__.py'), submodule_search_locations=[PLUGIN_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = package
+    spec.loader.exec_module(package)
+    return {name: importlib.import_module(f'{PACKAGE}.{name}')
+            for name in ('weather_dock', 'settings_dialog', 'forecast_store', 'metrics', 'open_meteo')}
+
+
+def pump(app, seconds):
+    """Process events for the given time."""
+    deadline = time.perf_counter() + seconds
+    while True:
+        app.processEvents(QEventLoop.AllEvents, 5)
+        if time.perf_counter() >= deadline:
+            return
+        time.sleep(0.001)
+
+
+def wait_until(app, condition, timeout=SETTLE_TIMEOUT_S):
+    """Process events until condition() is true, return False on timeout."""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() >= deadline:
+            return False
+        app.processEvents(QEventLoop.AllEvents, 5)
+        time.sleep(0.001)
+    return True
+
+
+def run_trace(app, modules, plugin, iface, server, trace):
+    """Play a trace and return the measurements of this run."""
+    metrics = modules['metrics'].metrics
+    service = plugin.fetch_service
+    server.reset_stats()
+    metrics.reset()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    canvas = iface.mapCanvas()
+    aspect = canvas.height() / max(canvas.width(), 1)
+    for x, y, width, seconds in trace:
+        height = width * aspect
+        canvas.setExtent(QgsRectangle(x - width / 2, y - height / 2, x + width / 2, y + height / 2))
+        pump(app, seconds)
+
+    # The time from the last canvas change until the forecast for it is on display
+    last_change = time.perf_counter()
+    settled = wait_until(app, lambda: not plugin.update_timer.isActive() and plugin.dock_widget.request_id is None)
+    settle_ms = (time.perf_counter() - last_change) * 1000.0
+    # Let speculative and background requests finish so they are counted
+    wait_until(app, lambda: not service.stats()['queued'] and not service.stats()['in_flight'])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    snapshot = metrics.snapshot()
+    stages = snapshot['stages']
+
+    def percentile(stage, name):
+        return stages.get(stage, {}).get(name)
+
+    return {
+        'settled': settled,
+        'settle_ms': settle_ms,
+        'fetches': server.stats['requests'],
+        'locations_fetched': server.stats['locations'],
+        'server_errors': server.stats['errors'],
+        'bytes': server.stats['bytes'],
+        'updates': stages.get('total', {}).get('count', 0),
+        'update_p50_ms': percentile('total', 'p50'),
+        'update_p95_ms': percentile('total', 'p95'),
+        'render_p50_ms': percentile('render', 'p50'),
+        'render_p95_ms': percentile('render', 'p95'),
+        'layout_p50_ms': percentile('layout', 'p50'),
+        'parse_p50_ms': percentile('parse', 'p50'),
+        'python_peak_kib': peak / 1024.0,
+        'cache_entries': plugin.forecast_cache.stats()['entries'],
+        'cache_kib': plugin.forecast_cache.nbytes() / 1024.0,
+        'stages': stages,
+    }
+
+
+def open_store(modules, plugin, path):
+    """Replace the forecast store of the plugin and its dock with an empty one at path."""
+    plugin.forecast_store.close()
+    if os.path.exists(path):
+        os.remove(path)
+    plugin.forecast_store = modules['forecast_store'].ForecastStore(path)
+    plugin.forecast_store.set_source(plugin.fetch_service.provider.cache_key())
+    if plugin.dock_widget is not None:
+        plugin.dock_widget.store = plugin.forecast_store
+
+
+def run_scenario(app, modules, server, trace_name, trace, forecast_days, store_dir):
+    """Run a trace cache-cold with a fresh plugin, then again cache-warm, and return both results."""
+    SettingsDialog = modules['settings_dialog'].SettingsDialog
+    QSettings().setValue(SettingsDialog.FORECAST_DAYS_KEY, forecast_days)
+
+    iface = StubIface()
+    # Open the dock away from the trace, so its first position is a real change of view
+    x, y = mercator(WARMUP_LONGITUDE, WARMUP_LATITUDE)
+    iface.canvas.setExtent(QgsRectangle(x - VIEW_WIDTH_M / 2, y - VIEW_WIDTH_M / 2,
+                                        x + VIEW_WIDTH_M / 2, y + VIEW_WIDTH_M / 2))
+    plugin = modules['weather_dock'].WeatherDock(iface)
+    plugin.load()
+    open_store(modules, plugin, os.path.join(store_dir, f'{trace_name}_{forecast_days}_warmup.sqlite'))
+    plugin.initGui()
+    plugin.run()
+    wait_until(app, lambda: plugin.dock_widget.request_id is None)
+
+    results = []
+    for cache in ('cold', 'warm'):
+        if cache == 'cold':
+            # Neither the memory cache, the store nor the HTTP disk cache may have anything to serve
+            plugin.forecast_cache.clear()
+            disk_cache = QgsNetworkAccessManager.instance().cache()
+            if disk_cache is not None:
+                disk_cache.clear()
+            open_store(modules, plugin, os.path.join(store_dir, f'{trace_name}_{forecast_days}.sqlite'))
+        result = run_trace(app, modules, plugin, iface, server, trace)
+        result.update({'trace': trace_name, 'forecast_days': forecast_days, 'cache': cache})
+        results.append(result)
+
+    plugin.unload()
+    iface.main_window.close()
+    iface.main_window.deleteLater()
+    pump(app, 0.05)
+    return results
+
+
+def format_value(value, digits=1):
+    """Format a number for the report table."""
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}"
+    return str(value)
+
+
+def print_report(results):
+    """Print one line per scenario."""
+    columns = (
+        ('trace', "trace"), ('forecast_days', "days"), ('cache', "cache"), ('fetches', "fetches"),
+        ('locations_fetched', "locations"), ('bytes', "bytes"), ('settle_ms', "settle ms"),
+        ('update_p50_ms', "update p50"), ('update_p95_ms', "update p95"), ('render_p50_ms', "render p50"),
+        ('render_p95_ms', "render p95"), ('python_peak_kib', "peak KiB"), ('cache_kib', "cache KiB"),
+    )
+    rows = [[title for _, title in columns]]
+    rows += [[format_value(result[key]) for key, _ in columns] for result in results]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description="Headless Weather Dock benchmarks against a local forecast server.")
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 3, 7], help="Forecast days to benchmark.")
+    parser.add_argument('--traces', nargs='+', default=None,
+                        help="Built-in traces to run (drag, jumps, zoom, fling), all by default.")
+    parser.add_argument('--trace-file', action='append', default=[], help="Recorded trace JSON file, may be repeated.")
+    parser.add_argument('--latency', type=float, default=0.05, help="Server latency in seconds.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument('--padding', type=int, default=0, help="Extra bytes per forecast document.")
+    parser.add_argument('--rate', type=float, default=100.0, help="Request rate limit of the plugin per second.")
+    parser.add_argument('--burst', type=int, default=100, help="Request burst of the plugin.")
+    parser.add_argument('--variables', nargs='+', default=None,
+                        help="Hourly variables to fetch, the plugin defaults if not given.")
+    parser.add_argument('--output', help="Write all results, including every stage, to this JSON file.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='weather_dock_benchmark_')
+    # Keep the benchmark settings away from the user's QGIS settings
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, work_dir)
+    app = QgsApplication([], True)
+    app.initQgis()
+    QSettings().setValue('locale/userLocale', 'en_US')
+
+    server = FakeOpenMeteoServer(latency=args.latency, error_rate=args.error_rate, padding=args.padding, seed=1).start()
+    modules = load_plugin()
+    SettingsDialog = modules['settings_dialog'].SettingsDialog
+    # Point the plugin at the stand-in like at a self-hosted instance
+    QSettings().setValue(SettingsDialog.PROVIDER_KEY, 'self_hosted')
+    QSettings().setValue(SettingsDialog.PROVIDER_URL_KEY, server.url)
+    QSettings().setValue(SettingsDialog.REQUEST_RATE_KEY, args.rate)
+    QSettings().setValue(SettingsDialog.REQUEST_BURST_KEY, args.burst)
+    if args.variables:
+        QSettings().setValue(SettingsDialog.VARIABLES_KEY, ",".join(args.variables))
+
+    builtin = synthetic_traces()
+    traces = [(name, builtin[name]) for name in (args.traces or builtin)]
+    traces += [(os.path.splitext(os.path.basename(path))[0], load_trace(path)) for path in args.trace_file]
+
+    results = []
+    try:
+        for forecast_days in args.days:
+            for trace_name, trace in traces:
+                results += run_scenario(app, modules, server, trace_name, trace, forecast_days, work_dir)
+    finally:
+        server.stop()
+
+    json_backend = modules['open_meteo'].JSON_BACKEND
+    print(f"JSON decoding with {json_backend}")
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump({'arguments': vars(args), 'json_backend': json_backend, 'results': results}, output, indent=2)
+    app.exitQgis()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ BulkWeatherLookupAlgorithm
+ Processing algorithm that attaches forecasts to the features of a point layer.
+ ***************************************************************************/
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt5.QtCore import QCoreApplication, QDateTime, Qt, QVariant
+from PyQt5.QtGui import QIcon
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsFeature,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsWkbTypes,
+)
+
+from . import open_meteo
+from .forecast_cache import ForecastCache
+
+
+class BulkWeatherLookupAlgorithm(QgsProcessingAlgorithm):
+    """Looks up forecasts for all features of a point layer.
+
+    Points are deduplicated by forecast cell and fetched in batched requests
+    that run concurrently under the request rate limit of the plugin.
+    """
+
+    INPUT = 'INPUT'
+    FORECAST_DAYS = 'FORECAST_DAYS'
+    MAX_CONCURRENT = 'MAX_CONCURRENT'
+    OUTPUT = 'OUTPUT'
+    TIMESERIES = 'TIMESERIES'
+
+    def tr(self, message):
+        """Get the translation for a string using Qt translation API."""
+        return QCoreApplication.translate('BulkWeatherLookupAlgorithm', message)
+
+    def createInstance(self):
+        """Return a new instance of the algorithm."""
+        return BulkWeatherLookupAlgorithm()
+
+    def name(self):
+        """Return the algorithm id."""
+        return 'bulkweatherlookup'
+
+    def displayName(self):
+        """Return the translated algorithm name."""
+        return self.tr('Bulk weather lookup')
+
+    def shortHelpString(self):
+        """Return the help shown next to the algorithm dialog."""
+        return self.tr(
+            "Fetches the current weather and the hourly forecast for every feature of a point "
+            "layer from the weather provider selected in the plugin settings. Points falling into "
+            "the same forecast cell share one forecast, and up to 100 cells are fetched per "
+            "request. Requests share the rate limit set in the plugin settings. The optional time "
+            "series output holds one row per feature and forecast hour, related to the points by "
+            "the feature_id field of both outputs."
+        )
+
+    def icon(self):
+        """Return the plugin icon."""
+        return QIcon(os.path.join(os.path.dirname(__file__), 'icon.svg'))
+
+    def initAlgorithm(self, config=None):
+        """Define the inputs and outputs of the algorithm."""
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT, self.tr('Input point layer'), [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.FORECAST_DAYS, self.tr('Number of days to forecast'),
+            QgsProcessingParameterNumber.Integer, 1, False, 1, 16))
+
+        max_concurrent = QgsProcessingParameterNumber(
+            self.MAX_CONCURRENT, self.tr('Maximum concurrent requests'),
+            QgsProcessingParameterNumber.Integer, 4, False, 1, 16)
+        max_concurrent.setFlags(max_concurrent.flags() | QgsProcessingParameterNumber.FlagAdvanced)
+        self.addParameter(max_concurrent)
+
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, self.tr('Points with weather')))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.TIMESERIES, self.tr('Hourly forecast'), QgsProcessing.TypeVector, optional=True,
+            createByDefault=False))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """Fetch the forecasts and write the outputs."""
+        # Imported on first use, the provider is registered at startup before the plugin is used
+        from .fetch_service import WeatherFetchError, fetch_batch_blocking, request_bucket
+        from .settings_dialog import SettingsDialog
+
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+        forecast_days = self.parameterAsInt(parameters, self.FORECAST_DAYS, context)
+        max_concurrent = self.parameterAsInt(parameters, self.MAX_CONCURRENT, context)
+        # The weather provider and request rate selected in the plugin settings, also when
+        # the dock was never opened or the algorithm runs from qgis_process
+        provider = SettingsDialog.get_provider()
+        request_bucket.configure(SettingsDialog.get_request_rate(), SettingsDialog.get_request_burst())
+
+        # --- Collect the forecast cells of all features ---
+        transform = QgsCoordinateTransform(
+            source.sourceCrs(), QgsCoordinateReferenceSystem("EPSG:4326"), context.transformContext())
+        feature_cells = {}  # feature id -> cache key
+        for feature in source.getFeatures():
+            if feedback.isCanceled():
+                return {}
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            try:
+                point = transform.transform(geometry.centroid().asPoint())
+            except QgsCsException:
+                feedback.reportError(
+                    self.tr('Feature {} cannot be transformed to WGS 84, skipped.').format(feature.id()))
+                continue
+            feature_cells[feature.id()] = ForecastCache.cell_key(point.y(), point.x(), forecast_days)
+
+        cells = list(dict.fromkeys(feature_cells.values()))
+        feedback.pushInfo(self.tr('{} points fall into {} forecast cells.').format(len(feature_cells), len(cells)))
+
+        # --- Fetch the cells in concurrent batches ---
+        batches = [cells[start:start + open_meteo.MAX_BATCH_SIZE]
+                   for start in range(0, len(cells), open_meteo.MAX_BATCH_SIZE)]
+        forecasts = {}  # cache key -> Forecast
+
+        def fetch(batch):
+            # fetch_batch_blocking() waits for the shared request_bucket
+            if feedback.isCanceled():
+                return batch, None
+            points = [ForecastCache.cell_center(key) for key in batch]
+            return batch, fetch_batch_blocking(points, forecast_days, feedback, provider)
+
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            futures = [executor.submit(fetch, batch) for batch in batches]
+            for done, future in enumerate(as_completed(futures), start=1):
+                if feedback.isCanceled():
+                    for pending in futures:
+                        pending.cancel()
+                    return {}
+                # Fetching is the bulk of the work, writing takes the last 10 percent
+                feedback.setProgress(90.0 * done / len(batches))
+                try:
+                    batch, batch_forecasts = future.result()
+                except WeatherFetchError as e:
+                    feedback.reportError(str(e))
+                    continue
+                if batch_forecasts is not None:
+                    forecasts.update(zip(batch, batch_forecasts))
+
+        if len(forecasts) < len(cells):
+            feedback.reportError(self.tr('No forecast for {} of {} cells.').format(len(cells) - len(forecasts), len(cells)))
+
+        # --- Write the outputs ---
+        current_variables, hourly_variables = provider.variables()
+        fields = QgsFields(source.fields())
+        # Suffix the names the input already has, e.g. when run again on an output, so no value is misplaced
+        # feature_id is written to both outputs, the time series joins on it whatever fids the sinks assign
+        new_fields = ([('feature_id', QVariant.LongLong)] + [(name, QVariant.Double) for name in current_variables]
+                      + [('weather_time', QVariant.DateTime)])
+        for name, field_type in new_fields:
+            unique_name = self._unique_name(fields, name)
+            if unique_name != name:
+                feedback.pushInfo(self.tr('The input has a field {}, writing {} instead.').format(name, unique_name))
+            fields.append(QgsField(unique_name, field_type))
+        id_field = fields.at(source.fields().count()).name()
+        (sink, dest_id) = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, source.wkbType(), source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        timeseries_fields = QgsFields()
+        timeseries_fields.append(QgsField(id_field, QVariant.LongLong))
+        timeseries_fields.append(QgsField('time', QVariant.DateTime))
+        for name in hourly_variables:
+            timeseries_fields.append(QgsField(name, QVariant.Double))
+        (timeseries_sink, timeseries_id) = self.parameterAsSink(
+            parameters, self.TIMESERIES, context, timeseries_fields, QgsWkbTypes.NoGeometry)
+
+        total = source.featureCount() or 1
+        for current_feature, feature in enumerate(source.getFeatures()):
+            if feedback.isCanceled():
+                break
+            forecast = forecasts.get(feature_cells.get(feature.id()))
+            current = forecast.current if forecast is not None else {}
+
+            out_feature = QgsFeature(fields)
+            out_feature.setGeometry(feature.geometry())
+            out_feature.setAttributes(
+                feature.attributes()
+                + [feature.id()]
+                + [current.get(name) for name in current_variables]
+                + [self._to_datetime(forecast.current_time if forecast is not None else None)])
+            sink.addFeature(out_feature, QgsFeatureSink.FastInsert)
+
+            if timeseries_sink is not None and forecast is not None:
+                rows = []
+                for index in range(len(forecast)):
+                    row = QgsFeature(timeseries_fields)
+                    row.setAttributes(
+                        [feature.id(), self._to_datetime(forecast.time_at(index))]
+                        + [forecast.value_at(name, index) for name in hourly_variables])
+                    rows.append(row)
+                timeseries_sink.addFeatures(rows, QgsFeatureSink.FastInsert)
+
+            feedback.setProgress(90.0 + 10.0 * (current_feature + 1) / total)
+
+        results = {self.OUTPUT: dest_id}
+        if timeseries_sink is not None:
+            results[self.TIMESERIES] = timeseries_id
+        return results
+
+    @staticmethod
+    def _unique_name(fields, name):
+        """Return name, or name with the lowest numeric suffix not yet in fields, ignoring case."""
+        unique_name, suffix = name, 1
+        while fields.lookupField(unique_name) != -1:
+            suffix += 1
+            unique_name = f"{name}_{suffix}"
+        return unique_name
+
+    @staticmethod
+    def _to_datetime(epoch):
+        """Convert UTC epoch seconds to a QDateTime."""
+        if epoch is None:
+            return None
+        return QDateTime.fromSecsSinceEpoch(int(epoch), Qt.UTC)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ CanvasMotionTracker
+ Estimates how fast and where the map canvas is being panned.
+ ***************************************************************************/
+"""
+
+import time
+from collections import deque
+
+
+class CanvasMotionTracker:
+    """Keeps the recent canvas centers to estimate the pan velocity and interaction length."""
+
+    WINDOW_SECONDS = 1.5  # Only recent movement says where the user is heading
+    MIN_SAMPLES = 3
+    IDLE_GAP_SECONDS = 1.0  # A pause this long ends a continuous interaction
+
+    def __init__(self):
+        """Constructor."""
+        self._samples = deque()  # (monotonic time, x, y) in map units
+        self._crs = None
+        self._burst_start = None
+
+    def add(self, x, y, crs):
+        """Record the canvas center in map units of crs."""
+        now = time.monotonic()
+        if crs != self._crs:
+            self._samples.clear()
+            self._crs = crs
+        if not self._samples or now - self._samples[-1][0] > self.IDLE_GAP_SECONDS:
+            self._burst_start = now
+        self._samples.append((now, x, y))
+        while now - self._samples[0][0] > self.WINDOW_SECONDS:
+            self._samples.popleft()
+
+    def reset(self):
+        """Forget the recorded movement."""
+        self._samples.clear()
+        self._burst_start = None
+
+    def burst_duration(self):
+        """Return for how many seconds the canvas has been changing without a pause."""
+        if not self._samples or self._burst_start is None:
+            return 0.0
+        return self._samples[-1][0] - self._burst_start
+
+    def velocity(self):
+        """Return the (vx, vy) pan velocity in map units per second, or None if not panning."""
+        if len(self._samples) < self.MIN_SAMPLES:
+            return None
+        t0, x0, y0 = self._samples[0]
+        t1, x1, y1 = self._samples[-1]
+        if t1 - t0 <= 0 or (x0 == x1 and y0 == y1):
+            return None
+        return (x1 - x0) / (t1 - t0), (y1 - y0) / (t1 - t0)
+
+    def predict(self, seconds_ahead):
+        """Return the expected (x, y) canvas center after seconds_ahead, or None if not panning."""
+        velocity = self.velocity()
+        if velocity is None:
+            return None
+        _, x, y = self._samples[-1]
+        return x + velocity[0] * seconds_ahead, y + velocity[1] * seconds_ahead
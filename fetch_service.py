@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherFetchService
+ Long-lived asynchronous forecast client shared by the whole plugin.
+ ***************************************************************************/
+"""
+
+import re
+import time
+from email.utils import parsedate_to_datetime
+from functools import partial
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import QUrl
+from PyQt5.QtNetwork import QNetworkReply, QNetworkRequest
+
+from qgis.core import QgsBlockingNetworkRequest, QgsNetworkAccessManager
+
+from . import open_meteo
+from .metrics import metrics
+from .providers import OpenMeteoProvider
+from .rate_limiter import TokenBucket, backoff_delay
+
+DEFAULT_REQUEST_RATE = 1.0  # Requests per second
+DEFAULT_REQUEST_BURST = 10
+MAX_RETRIES = 3  # Retries of requests answered with HTTP 429 or 5xx
+
+# Shared by the plugin's service and the Processing algorithms, so together
+# they stay within the rate limits of the weather service
+request_bucket = TokenBucket(DEFAULT_REQUEST_RATE, DEFAULT_REQUEST_BURST)
+
+
+class WeatherFetchError(Exception):
+    """Raised by fetch_batch_blocking() when a request fails."""
+
+
+def fetch_batch_blocking(points, forecast_days, feedback=None, provider=None):
+    """Fetch forecasts for a batch of (latitude, longitude) points synchronously.
+
+    For use from worker threads such as Processing algorithms. Requests go
+    through the QGIS network stack and are parsed like those of
+    WeatherFetchService; canceling feedback aborts the transfer.
+
+    :param provider: WeatherProvider to fetch from, the public Open-Meteo API by default.
+    :raises WeatherFetchError: If the request fails or the response cannot be parsed.
+    """
+    if provider is None:
+        provider = OpenMeteoProvider()
+    is_canceled = feedback.isCanceled if feedback is not None else None
+    url = provider.build_request(points, forecast_days)
+    request = QNetworkRequest(QUrl(url))
+    request.setAttribute(QNetworkRequest.FollowRedirectsAttribute, True)
+    attempt = 0
+    while True:
+        if provider.rate_limited and not request_bucket.acquire(is_canceled):
+            raise WeatherFetchError("Error: The request was canceled.")
+        blocking_request = QgsBlockingNetworkRequest()
+        error = blocking_request.get(request, False, feedback)
+        reply = blocking_request.reply()
+        data = bytes(reply.content())
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if not is_throttled(status) or attempt >= MAX_RETRIES:
+            break
+        attempt += 1
+        deadline = time.monotonic() + backoff_delay(attempt, retry_after=retry_after(reply.rawHeader(b'Retry-After')))
+        while time.monotonic() < deadline:
+            if is_canceled is not None and is_canceled():
+                raise WeatherFetchError("Error: The request was canceled.")
+            time.sleep(0.1)
+    if error != QgsBlockingNetworkRequest.NoError:
+        message = provider.error_reason(data) or blocking_request.errorMessage()
+        raise WeatherFetchError(f"Network Error: {message}")
+    try:
+        return provider.parse_response(url, data, len(points))
+    except ValueError:
+        raise WeatherFetchError("Error: Could not parse weather data from the server.")
+
+
+def is_throttled(status):
+    """Return True for HTTP status codes that ask to retry later."""
+    return status is not None and (status == 429 or 500 <= status < 600)
+
+
+def retry_after(value):
+    """Return the seconds of a Retry-After header value, or None."""
+    value = bytes(value).decode('latin-1').strip()
+    if value.isdigit():
+        return float(value)
+    if value:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def response_expiry(reply):
+    """Return the UTC epoch until which a reply is fresh by its Cache-Control or Expires header, or None."""
+    cache_control = bytes(reply.rawHeader(b'Cache-Control')).decode('latin-1').lower()
+    if 'no-cache' in cache_control or 'no-store' in cache_control:
+        return time.time()
+    match = re.search(r'max-age=(\d+)', cache_control)
+    if match:
+        age = bytes(reply.rawHeader(b'Age')).decode('latin-1')
+        return time.time() + int(match.group(1)) - (int(age) if age.isdigit() else 0)
+    expires = bytes(reply.rawHeader(b'Expires')).decode('latin-1')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class WeatherFetchService(QtCore.QObject):
+    """Fetches forecasts through the QGIS network access manager.
+
+    All requests share one QNetworkAccessManager, so connections to the
+    weather service are kept alive and reused, the QGIS proxy settings apply,
+    and no thread is created per request. Qt adds ``Accept-Encoding: gzip``
+    and inflates the body transparently as long as the header is not set
+    by hand. Through the disk cache of the QGIS network manager, responses
+    are revalidated with If-None-Match/If-Modified-Since where the service
+    provides validators, and reused while their Cache-Control allows.
+
+    Requests for a URL that is already being fetched join that fetch
+    instead of sending a second one. Requests leave the queue, in order of
+    priority, as tokens of the shared TokenBucket become available, and
+    answers with HTTP 429 or 5xx are retried after an exponential backoff
+    that holds back the whole queue.
+    """
+    # All signals carry the id returned by fetch() or fetch_batch() as first argument
+    forecastReceived = QtCore.pyqtSignal(int, object)  # Forecast
+    batchReceived = QtCore.pyqtSignal(int, list)  # Forecast objects
+    forecastFailed = QtCore.pyqtSignal(int, str)
+
+    TIMEOUT_MS = 20000
+
+    def __init__(self, parent=None, bucket=None, provider=None):
+        """Constructor.
+
+        :param bucket: TokenBucket limiting the request rate, the shared request_bucket by default.
+        :param provider: WeatherProvider to fetch from, the public Open-Meteo API by default.
+        """
+        super(WeatherFetchService, self).__init__(parent)
+        self.network = QgsNetworkAccessManager.instance()
+        self.provider = provider if provider is not None else OpenMeteoProvider()
+        self.bucket = bucket if bucket is not None else request_bucket
+        self._flights = {}  # url -> _Flight
+        self._requests = {}  # request id -> url
+        self._batched = set()  # Ids of fetch_batch() requests, answered through batchReceived
+        self._queue = []  # Flights waiting to be sent, by priority
+        self._next_id = 0
+        self._backoff_until = 0.0  # Monotonic time until which nothing is sent
+        self._send_timer = QtCore.QTimer(self)
+        self._send_timer.setSingleShot(True)
+        self._send_timer.timeout.connect(self._send_queued)
+        # UTC epoch until which the latest response is fresh according to the service, 0 if unknown
+        self.fresh_until = 0.0
+        self.cache_served = 0  # Responses answered by the disk cache, fresh or revalidated
+        self.coalesced = 0  # Requests that joined a fetch of the same URL
+        self.throttled = 0  # Answers with HTTP 429 or 5xx
+        self.retries = 0
+
+    def fetch(self, latitude, longitude, forecast_days, priority=QNetworkRequest.NormalPriority, hours=None,
+              trace=None):
+        """Start fetching a forecast and return the request id.
+
+        :param hours: Optional (start, end) UTC epochs to fetch only these hours instead of whole days.
+        :param trace: Optional metrics Trace the network and parse stages are added to.
+        """
+        return self._get(
+            self.provider.build_request([(latitude, longitude)], forecast_days, hours), 1, priority, trace)
+
+    def fetch_batch(self, points, forecast_days, priority=QNetworkRequest.NormalPriority, hours=None,
+                    hourly_variables=None):
+        """Start fetching forecasts for up to open_meteo.MAX_BATCH_SIZE (latitude, longitude) points.
+
+        The result is emitted through batchReceived as a list in the order of points.
+
+        :param hourly_variables: Optional names to request instead of the variables selected on the provider.
+        """
+        if not points or len(points) > open_meteo.MAX_BATCH_SIZE:
+            raise ValueError(f"A batch must contain 1 to {open_meteo.MAX_BATCH_SIZE} points")
+        return self._get(
+            self.provider.build_request(points, forecast_days, hours, hourly_variables), len(points), priority,
+            batched=True)
+
+    def is_pending(self, request_id):
+        """Return True while a request waits for its answer."""
+        return request_id in self._requests
+
+    def is_receiving(self, request_id):
+        """Return True once the response headers of a request arrived, i.e. it is about to finish."""
+        flight = self._flights.get(self._requests.get(request_id))
+        return flight is not None and flight.headers_at is not None
+
+    def busy(self):
+        """Return True while requests above low priority are pending."""
+        return any(flight.priority != QNetworkRequest.LowPriority for flight in self._flights.values())
+
+    def queue_depth(self):
+        """Return the number of fetches waiting for the rate limit or a backoff."""
+        return len(self._queue)
+
+    def stats(self):
+        """Return the request counters as a dict."""
+        return {
+            'queued': len(self._queue),
+            'in_flight': len(self._flights) - len(self._queue),
+            'coalesced': self.coalesced,
+            'throttled': self.throttled,
+            'retries': self.retries,
+            'cache_served': self.cache_served,
+        }
+
+    def _get(self, url, batch_size, priority, trace=None, batched=False):
+        """Queue a GET request, or join the pending one for the same URL, and return its id.
+
+        A one-point fetch() and fetch_batch() share the URL and so the flight;
+        each request is answered through the signal of its own kind.
+        """
+        self._next_id += 1
+        request_id = self._next_id
+        self._requests[request_id] = url
+        if batched:
+            self._batched.add(request_id)
+
+        flight = self._flights.get(url)
+        if flight is not None:
+            flight.request_ids.append(request_id)
+            if trace is not None:
+                flight.traces.append(trace)
+            self.coalesced += 1
+            metrics.count('requests_coalesced')
+            if priority < flight.priority and flight.reply is None:
+                # Move it ahead in the queue for the more urgent request
+                self._queue.remove(flight)
+                flight.priority = priority
+                self._enqueue(flight)
+            return request_id
+
+        flight = _Flight(url, batch_size, priority, request_id)
+        if trace is not None:
+            flight.traces.append(trace)
+        self._flights[url] = flight
+        self._enqueue(flight)
+        self._send_queued()
+        return request_id
+
+    def _enqueue(self, flight, front=False):
+        """Queue a flight behind those of the same or a more urgent priority."""
+        if front:
+            self._queue.insert(0, flight)
+            return
+        # A lower value is a higher priority
+        index = next((index for index, queued in enumerate(self._queue) if queued.priority > flight.priority),
+                     len(self._queue))
+        self._queue.insert(index, flight)
+
+    def _send_queued(self):
+        """Send queued flights as far as the backoff and the rate limit allow."""
+        while self._queue:
+            wait = self._backoff_until - time.monotonic()
+            if wait <= 0 and self.provider.rate_limited:
+                wait = self.bucket.take()
+            if wait > 0:
+                self._send_timer.start(max(int(wait * 1000), 1))
+                return
+            self._send(self._queue.pop(0))
+
+    def _send(self, flight):
+        """Send the request of a flight."""
+        request = QNetworkRequest(QUrl(flight.url))
+        request.setAttribute(QNetworkRequest.FollowRedirectsAttribute, True)
+        request.setPriority(flight.priority)
+        # Revalidate stale disk cache entries instead of refetching them unconditionally
+        request.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.PreferNetwork)
+        flight.reply = self.network.get(request)
+        flight.sent_at = time.perf_counter()
+        self._record(flight, 'queue', flight.sent_at - flight.queued_at)
+        metrics.count('requests_sent')
+
+        flight.timer = QtCore.QTimer(self)
+        flight.timer.setSingleShot(True)
+        flight.timer.timeout.connect(partial(self._on_timeout, flight))
+        flight.timer.start(self.TIMEOUT_MS)
+
+        # Headers arrive after DNS lookup, connection, TLS handshake and server time
+        flight.reply.metaDataChanged.connect(partial(self._on_headers, flight, flight.reply))
+        flight.reply.finished.connect(partial(self._on_finished, flight, flight.reply))
+
+    def _record(self, flight, stage, seconds):
+        """Record the duration of a stage of a flight, and add it to the traces waiting for it."""
+        milliseconds = seconds * 1000.0
+        metrics.record(stage, milliseconds)
+        for trace in flight.traces:
+            trace.add(stage, milliseconds)
+
+    def _on_headers(self, flight, reply):
+        """Note when the response headers of a flight arrived."""
+        if reply is flight.reply and flight.headers_at is None:
+            flight.headers_at = time.perf_counter()
+            self._record(flight, 'network.first_byte', flight.headers_at - flight.sent_at)
+
+    def abort(self, request_id):
+        """Abort a request, no signal is emitted for it afterwards.
+
+        The network request is only aborted once no other request shares it,
+        and not before control returns to the event loop, so a request for
+        the same URL issued right after, e.g. by a superseding update, can
+        still join it.
+        """
+        url = self._requests.pop(request_id, None)
+        self._batched.discard(request_id)
+        flight = self._flights.get(url)
+        if flight is None:
+            return
+        flight.request_ids.remove(request_id)
+        if not flight.request_ids:
+            QtCore.QTimer.singleShot(0, partial(self._drop_if_unused, flight))
+
+    def abort_all(self):
+        """Abort all pending requests."""
+        self._requests.clear()
+        self._batched.clear()
+        for flight in list(self._flights.values()):
+            flight.request_ids.clear()
+            self._drop(flight)
+        self._send_timer.stop()
+
+    def _drop_if_unused(self, flight):
+        """Abort a flight nobody joined since its last request was aborted."""
+        if not flight.request_ids and self._flights.get(flight.url) is flight:
+            self._drop(flight)
+
+    def _drop(self, flight):
+        """Remove a flight and abort its network request."""
+        if self._flights.get(flight.url) is flight:
+            del self._flights[flight.url]
+        if flight in self._queue:
+            self._queue.remove(flight)
+        if flight.timer is not None:
+            flight.timer.stop()
+            flight.timer.deleteLater()
+            flight.timer = None
+        if flight.reply is not None:
+            reply, flight.reply = flight.reply, None
+            reply.abort()
+
+    def _finish(self, flight):
+        """Remove a completed flight and return (id, batched) of its requests."""
+        self._drop(flight)
+        requests = []
+        for request_id in flight.request_ids:
+            self._requests.pop(request_id, None)
+            requests.append((request_id, request_id in self._batched))
+            self._batched.discard(request_id)
+        return requests
+
+    def _on_timeout(self, flight):
+        """Give up on a request that took too long."""
+        if self._flights.get(flight.url) is flight:
+            for request_id, _ in self._finish(flight):
+                self.forecastFailed.emit(request_id, "Network Error: The request timed out.")
+
+    def _on_finished(self, flight, reply):
+        """Parse a finished reply and emit the result to every request that shares it."""
+        reply.deleteLater()
+        if reply is not flight.reply or self._flights.get(flight.url) is not flight:
+            return  # Aborted or timed out
+        flight.timer.stop()
+        flight.timer.deleteLater()
+        flight.timer = None
+        flight.reply = None
+        if not flight.request_ids:
+            self._drop(flight)  # Finished before the abort took effect
+            return
+
+        data = bytes(reply.readAll())
+        finished_at = time.perf_counter()
+        self._record(flight, 'network.transfer', finished_at - (flight.headers_at or flight.sent_at))
+        flight.headers_at = None
+        metrics.count('bytes_received', len(data))
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if is_throttled(status):
+            self.throttled += 1
+            metrics.count('requests_throttled')
+            if flight.attempts < MAX_RETRIES:
+                # Hold back the whole queue, the service is overloaded or limits our rate
+                flight.attempts += 1
+                self.retries += 1
+                delay = backoff_delay(flight.attempts, retry_after=retry_after(reply.rawHeader(b'Retry-After')))
+                self._backoff_until = max(self._backoff_until, time.monotonic() + delay)
+                flight.queued_at = time.perf_counter()
+                self._enqueue(flight, front=True)
+                self._send_queued()
+                return
+
+        traces = flight.traces
+        requests = self._finish(flight)
+        if reply.error() != QNetworkReply.NoError:
+            # The service explains rejected requests in a JSON body
+            message = self.provider.error_reason(data) or reply.errorString()
+            for request_id, _ in requests:
+                self.forecastFailed.emit(request_id, f"Network Error: {message}")
+            return
+        if reply.attribute(QNetworkRequest.SourceIsFromCacheAttribute):
+            self.cache_served += 1
+            metrics.count('responses_from_disk_cache')
+        expiry = response_expiry(reply)
+        if expiry is not None:
+            self.fresh_until = expiry
+
+        try:
+            weather_data = self.provider.parse_response(flight.url, data, flight.batch_size)
+        except ValueError:
+            for request_id, _ in requests:
+                self.forecastFailed.emit(request_id, "Error: Could not parse weather data from the server.")
+            return
+        parse_ms = (time.perf_counter() - finished_at) * 1000.0
+        metrics.record('parse', parse_ms)
+        for trace in traces:
+            trace.add('parse', parse_ms)
+        for request_id, batched in requests:
+            if batched:
+                self.batchReceived.emit(request_id, weather_data)
+            else:
+                self.forecastReceived.emit(request_id, weather_data[0])
+
+
+class _Flight:
+    """A network request and the ids of all requests waiting for its result."""
+
+    __slots__ = ('url', 'batch_size', 'priority', 'request_ids', 'reply', 'timer', 'attempts', 'traces',
+                 'queued_at', 'sent_at', 'headers_at')
+
+    def __init__(self, url, batch_size, priority, request_id):
+        """Constructor."""
+        self.url = url
+        self.batch_size = batch_size
+        self.priority = priority
+        self.request_ids = [request_id]
+        self.reply = None  # None while queued
+        self.timer = None
+        self.attempts = 0
+        self.traces = []  # metrics Traces of the requests waiting for the flight
+        self.queued_at = time.perf_counter()
+        self.sent_at = None
+        self.headers_at = None
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastCache
+ In-memory forecast cache keyed on snapped lat/lon grid cells.
+ ***************************************************************************/
+"""
+
+import time
+from collections import OrderedDict
+
+
+class ForecastCache:
+    """LRU cache of forecast responses with a time-to-live per entry."""
+
+    CELL_SIZE_DEGREES = 0.1  # Grid cell size used to snap coordinates
+
+    def __init__(self, ttl_seconds=1800, max_entries=64):
+        """Constructor."""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> [fetched_at, forecast, prefetched and not used yet]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+        self.prefetch_hits = 0
+
+    def configure(self, ttl_seconds, max_entries):
+        """Apply new TTL and size limits, evicting entries if necessary."""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._evict()
+
+    @classmethod
+    def cell_key(cls, latitude, longitude, forecast_days):
+        """Return the cache key of the grid cell containing the coordinate."""
+        return (round(latitude / cls.CELL_SIZE_DEGREES),
+                round(longitude / cls.CELL_SIZE_DEGREES),
+                forecast_days)
+
+    @classmethod
+    def cell_center(cls, key):
+        """Return the (latitude, longitude) center of the cell of a cache key."""
+        return (round(key[0] * cls.CELL_SIZE_DEGREES, 6), round(key[1] * cls.CELL_SIZE_DEGREES, 6))
+
+    def get(self, key, window=None):
+        """Return the cached Forecast for key, or None if missing or expired.
+
+        :param window: Optional (start, end) UTC epochs the forecast must cover. A forecast
+            that does not is a miss, but stays cached so it can be extended by the missing hours.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            self.misses += 1
+            return None
+        if window is not None and entry[1].missing_window(*window) is not None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if entry[2]:
+            # First use of a prefetched forecast
+            entry[2] = False
+            self.prefetch_hits += 1
+        return entry[1]
+
+    def peek(self, key):
+        """Return the fresh Forecast for key, or None, without touching the counters or the LRU order."""
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None and not self._expired(entry) else None
+
+    def contains(self, key):
+        """Return True if a fresh forecast is cached for key, without touching the counters."""
+        entry = self._entries.get(key)
+        return entry is not None and not self._expired(entry)
+
+    def peek_cell(self, key):
+        """Return (fetched_at, Forecast) of the most recent fresh entry for the cell of key, or None.
+
+        Entries for any number of forecast days qualify, so a forecast can be
+        extended or shortened instead of fetched again. The counters and the
+        LRU order are not touched.
+        """
+        best = None
+        for entry_key, entry in self._entries.items():
+            if entry_key[:2] == key[:2] and not self._expired(entry) and (best is None or entry[0] > best[0]):
+                best = entry
+        return (best[0], best[1]) if best is not None else None
+
+    def put(self, key, forecast, fetched_at=None, prefetched=False):
+        """Store a Forecast for key and evict the least recently used entries.
+
+        :param prefetched: True if the forecast was fetched speculatively, used for the prefetch hit rate.
+        """
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = [fetched_at if fetched_at is not None else time.time(), forecast, prefetched]
+        self._entries.move_to_end(key)
+        if prefetched:
+            self.prefetched += 1
+        self._evict()
+
+    def expire_before(self, timestamp):
+        """Remove the entries fetched before timestamp, e.g. when a newer model run is available."""
+        stale = [key for key, entry in self._entries.items() if entry[0] < timestamp]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+        self.prefetch_hits = 0
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'prefetched': self.prefetched,
+            'prefetch_hits': self.prefetch_hits,
+        }
+
+    def nbytes(self):
+        """Return the approximate memory used by the hourly arrays of all entries."""
+        return sum(entry[1].nbytes() for entry in self._entries.values())
+
+    def _expired(self, entry):
+        """Return True if a cache entry is older than the TTL."""
+        return self.ttl_seconds <= 0 or time.time() - entry[0] > self.ttl_seconds
+
+    def _evict(self):
+        """Drop least recently used entries until the size limit is met."""
+        while len(self._entries) > max(self.max_entries, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
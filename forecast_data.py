@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ Forecast
+ Compact columnar representation of a parsed forecast.
+ ***************************************************************************/
+"""
+
+import math
+import time
+from array import array
+from datetime import datetime, timezone
+
+HOUR_SECONDS = 3600
+
+
+def parse_time(time_str, utc_offset_seconds=0):
+    """Convert an ISO time of the service to UTC epoch seconds."""
+    naive = datetime.fromisoformat(time_str)
+    return int(naive.replace(tzinfo=timezone.utc).timestamp()) - utc_offset_seconds
+
+
+def iso_time(epoch):
+    """Format UTC epoch seconds the way the service formats times."""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M")
+
+
+def forecast_window(forecast_days, now=None):
+    """Return the (start, end) UTC epochs of the hours shown for forecast_days.
+
+    The window starts at the current full hour, so hours in the past drop
+    out of it as the clock moves on.
+    """
+    if now is None:
+        now = time.time()
+    start = int(now // HOUR_SECONDS) * HOUR_SECONDS
+    return start, start + forecast_days * 24 * HOUR_SECONDS
+
+
+def float_array(values):
+    """Return a list of numbers as array('f'), with NaN for None.
+
+    The array is built in one C level pass unless the list has gaps, which
+    only then takes the slower per value conversion.
+    """
+    try:
+        return array('f', values)
+    except TypeError:
+        return array('f', [math.nan if value is None else value for value in values])
+
+
+class Forecast:
+    """Forecast of one location with the hourly series stored as typed arrays.
+
+    The time axis is kept as a UTC start epoch plus a step in seconds, and
+    every hourly variable is an ``array('f')`` with NaN for missing values.
+    Compared to the parsed JSON document, with its lists of boxed floats and
+    ISO time strings, this takes about a tenth of the memory.
+    """
+
+    __slots__ = (
+        'latitude', 'longitude', 'start', 'step', 'hourly', 'hourly_units',
+        'current', 'current_units', 'current_time',
+    )
+
+    def __init__(self, latitude, longitude, start, step, hourly, hourly_units=None,
+                 current=None, current_units=None, current_time=None):
+        """Constructor.
+
+        :param start: UTC epoch seconds of the first hourly value.
+        :param step: Seconds between two hourly values.
+        :param hourly: Dict of variable name to array('f').
+        :param current: Dict of variable name to the current value.
+        :param current_time: UTC epoch seconds of the current values.
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.start = start
+        self.step = step
+        self.hourly = hourly
+        self.hourly_units = hourly_units or {}
+        self.current = current or {}
+        self.current_units = current_units or {}
+        self.current_time = current_time
+
+    @classmethod
+    def from_json(cls, document):
+        """Create a forecast from a parsed forecast document of the service.
+
+        :raises ValueError: If the document has an unexpected structure.
+        """
+        try:
+            offset = int(document.get('utc_offset_seconds') or 0)
+            hourly_document = document.get('hourly') or {}
+            times = hourly_document.get('time') or []
+            start = parse_time(times[0], offset) if times else 0
+            step = parse_time(times[1], offset) - start if len(times) > 1 else 3600
+            hourly = {name: float_array(values) for name, values in hourly_document.items() if name != 'time'}
+            current = dict(document.get('current') or {})
+            current_time = current.pop('time', None)
+            current.pop('interval', None)
+            return cls(
+                document.get('latitude'),
+                document.get('longitude'),
+                start,
+                step,
+                hourly,
+                {name: unit for name, unit in (document.get('hourly_units') or {}).items() if name != 'time'},
+                current,
+                {name: unit for name, unit in (document.get('current_units') or {}).items()
+                 if name not in ('time', 'interval')},
+                parse_time(current_time, offset) if current_time else None,
+            )
+        except (AttributeError, IndexError, TypeError) as e:
+            raise ValueError(f"Unexpected forecast document: {e}")
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a forecast from to_dict() output."""
+        if 'start' not in data:
+            return cls.from_json(data)  # Stored by versions that kept the raw document
+        return cls(
+            data['latitude'],
+            data['longitude'],
+            data['start'],
+            data['step'],
+            {name: float_array(values) for name, values in data['hourly'].items()},
+            data.get('hourly_units'),
+            data.get('current'),
+            data.get('current_units'),
+            data.get('current_time'),
+        )
+
+    def to_dict(self):
+        """Return a JSON serializable dict of the forecast."""
+        return {
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'start': self.start,
+            'step': self.step,
+            'hourly': {name: [None if math.isnan(value) else round(value, 2) for value in values]
+                       for name, values in self.hourly.items()},
+            'hourly_units': self.hourly_units,
+            'current': self.current,
+            'current_units': self.current_units,
+            'current_time': self.current_time,
+        }
+
+    def __len__(self):
+        """Return the number of hourly time steps."""
+        return max((len(values) for values in self.hourly.values()), default=0)
+
+    @property
+    def end(self):
+        """Return the UTC epoch seconds just after the last hourly value."""
+        return self.start + len(self) * self.step
+
+    def time_at(self, index):
+        """Return the UTC epoch seconds of the hourly value at index."""
+        return self.start + index * self.step
+
+    def times(self):
+        """Return the UTC epoch seconds of all hourly values."""
+        return range(self.start, self.end, self.step)
+
+    def value_at(self, name, index):
+        """Return the hourly value of name at index, or None if it is missing."""
+        values = self.hourly.get(name)
+        if values is None or index >= len(values) or math.isnan(values[index]):
+            return None
+        return values[index]
+
+    def window(self, start, end):
+        """Return the forecast restricted to the hours from start up to, not including, end.
+
+        The arrays are sliced, the forecast itself is returned if nothing is cut off.
+        """
+        count = len(self)
+        first = min(max(0, -(-(start - self.start) // self.step)), count)
+        last = min(max(first, -(-(end - self.start) // self.step)), count)
+        if first == 0 and last == count:
+            return self
+        return Forecast(
+            self.latitude, self.longitude, self.time_at(first), self.step,
+            {name: values[first:last] for name, values in self.hourly.items()},
+            self.hourly_units, self.current, self.current_units, self.current_time,
+        )
+
+    def missing_window(self, start, end):
+        """Return the (start, end) hours of the window this forecast lacks, or None if it covers it.
+
+        Only a gap at the end can be filled by a partial request, a forecast
+        that starts too late is reported as missing the whole window.
+        """
+        if not len(self) or self.start > start:
+            return start, end
+        if self.end >= end:
+            return None
+        return max(self.end, start), end
+
+    def merged(self, update):
+        """Return a forecast with the hours of update added to this one.
+
+        Where both have a value for an hour, the one of update wins; the
+        current conditions are taken from update if it has any.
+        """
+        if not len(self) or self.step != update.step:
+            return update
+        if not len(update):
+            return self
+        step = self.step
+        start = min(self.start, update.start)
+        count = (max(self.end, update.end) - start) // step
+        hourly = {}
+        for name in list(self.hourly) + [name for name in update.hourly if name not in self.hourly]:
+            values = array('f', [math.nan]) * count
+            for source in (self, update):
+                source_values = source.hourly.get(name)
+                if source_values is not None:
+                    offset = (source.start - start) // step
+                    values[offset:offset + len(source_values)] = source_values
+            hourly[name] = values
+        has_current = update.current_time is not None
+        return Forecast(
+            update.latitude, update.longitude, start, step, hourly,
+            dict(self.hourly_units, **update.hourly_units),
+            update.current if has_current else self.current,
+            update.current_units if has_current else self.current_units,
+            update.current_time if has_current else self.current_time,
+        )
+
+    def nbytes(self):
+        """Return the approximate memory used by the hourly arrays."""
+        return sum(values.itemsize * len(values) for values in self.hourly.values())
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastRenderer
+ Builds the HTML forecast document shown in the dock widget.
+ ***************************************************************************/
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+from .open_meteo import value_template, variable_title
+
+# Installed once as the default style sheet of the dock document, so the
+# style rules are not part of, and not reparsed with, every forecast page.
+FORECAST_CSS = """
+body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 0; background-color: white; color: black; font-size: 16px; }
+.container { padding: 15px; }
+.header { background-color: white; color: black; padding: 15px; border-radius: 8px 8px 0 0; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); border-bottom: 1px solid #ccc; }
+.header h2 { margin-top: 0; margin-bottom: 5px; }
+.header p { margin-bottom: 0; font-size: 0.9em; }
+.current-weather { background-color: white; border-radius: 8px; padding: 20px; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); overflow: hidden; }
+.temp-display { font-size: 2.0em; font-weight: bold; margin-bottom: 10px; color: black; }
+.weather-details p { margin: 5px 0; font-size: 1.1em; color: black; }
+.forecast-container { background-color: white; border-radius: 8px; padding: 20px; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
+h3 { margin-top: 0; color: black; border-bottom: 1px solid #ccc; padding-bottom: 5px; margin-bottom: 15px; font-size: 1.4em; }
+.forecast-table table { width: 100%; border-collapse: collapse; font-size: 1em; border: 1px solid black; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
+.forecast-table th, .forecast-table td { border: none; border-bottom: 1px solid #ddd; padding: 10px 8px; color: black; }
+.forecast-table thead tr { border-bottom: 2px solid black; }
+.forecast-table th { background-color: white; font-weight: bold; border-bottom: 2px solid black; }
+.forecast-table th.time-header { text-align: left; }
+.forecast-table th.data-header { text-align: right; padding-right: 12px; }
+.forecast-table td.time-cell { text-align: left; }
+.forecast-table td.data-cell { text-align: right; padding-right: 12px; }
+.forecast-table tr.odd { background-color: #f0f0f0; }
+.forecast-table tbody tr:last-child td { border-bottom: none; }
+.footer { font-size: 0.9em; text-align: center; margin-top: 20px; color: black; }
+.footer a { color: black; text-decoration: underline; }
+.label { font-weight: bold; color: black; }
+.status { color: #7a5a00; padding: 10px; margin-bottom: 20px; border-left: 4px solid #f1c40f; background-color: #fdf6d8; border-radius: 4px; }
+"""
+
+# The page is split in the parts above and from the hourly table on, so a refresh
+# with an unchanged table only needs to replace the part above it
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"></head>
+<body><div class="container">
+{top}{table}
+</div></body></html>
+"""
+
+TOP_TEMPLATE = """<div class="header"><h2>Weather Forecast</h2><p>{formatted_time}</p></div>
+{status_html}
+<div class="current-weather">
+<table style="width:100%; border:none;"><tr>
+<td style="width:50%; border:none; vertical-align:top;">
+<div class="temp-display"><span class="label">Now:</span><br><strong>{current_temp}</strong></div>
+</td>
+<td style="width:50%; border:none; vertical-align:top;">
+<div class="weather-details">{current_details}</div>
+</td>
+</tr></table>
+</div>
+<p></p>
+<p></p>
+"""
+
+# Named anchor on the title of the hourly table, marks where the part above it ends in the document
+TABLE_ANCHOR = 'hourly'
+TABLE_TEMPLATE = """<div class="forecast-container">
+<h3><a name="{table_anchor}">{forecast_title}</a></h3>
+<div class="forecast-table"><table>
+<thead><tr>
+<th class="time-header">Time</th>{header_cells}
+</tr></thead>
+<tbody>{rows}</tbody>
+</table></div>
+</div>
+<div class="footer">Data provided by <a href="https://open-meteo.com/" target="_blank">Open-Meteo.com</a></div>
+"""
+
+STATUS_TEMPLATE = '<div class="status">{status}</div>'
+CURRENT_DETAIL_TEMPLATE = '<p><span class="label">{}:</span><br><strong>{}</strong></p>'
+HEADER_CELL_TEMPLATE = '<th class="data-header">{}</th>'
+ROW_CELLS_TEMPLATE = '<td class="time-cell">{}</td>'
+DATA_CELL_TEMPLATE = '<td class="data-cell">{}</td>'
+NO_DATA_ROW = '<tr><td colspan="{}" style="text-align: center;">No hourly forecast data available.</td></tr>'
+
+
+def local_time_labels(start, step, count):
+    """Return "Mon 14:00" labels in the local time zone for count times from UTC epoch start.
+
+    A series without a daylight saving switch is converted with a single time
+    zone lookup; otherwise each time is converted on its own.
+    """
+    if count <= 0:
+        return []
+    first = datetime.fromtimestamp(start, timezone.utc).astimezone(None)
+    last = datetime.fromtimestamp(start + (count - 1) * step, timezone.utc).astimezone(None)
+    if first.utcoffset() != last.utcoffset():
+        return [datetime.fromtimestamp(start + index * step, timezone.utc).astimezone(None).strftime("%a %H:%M")
+                for index in range(count)]
+    local_start = first.replace(tzinfo=None)
+    delta = timedelta(seconds=step)
+    return [(local_start + index * delta).strftime("%a %H:%M") for index in range(count)]
+
+
+def format_current(forecast, name):
+    """Return the current value of a variable with its unit, or N/A."""
+    value = forecast.current.get(name)
+    if value is None:
+        return "N/A"
+    return value_template(name, forecast.current_units.get(name, '')).format(value)
+
+
+def _format_values(values, count, template):
+    """Format up to count values with template, using N/A for missing values."""
+    values = list(values[:count]) + [math.nan] * (count - len(values))
+    return ["N/A" if math.isnan(value) else template.format(value) for value in values]
+
+
+class ForecastRenderer:
+    """Renders forecasts to HTML and reuses the table rows while the hourly data is unchanged."""
+
+    def __init__(self):
+        """Constructor."""
+        self._rows_source = None  # Time axis, raw hourly values and units the cached rows were built from
+        self._rows = None
+
+    def clear(self):
+        """Drop the cached table rows."""
+        self._rows_source = None
+        self._rows = None
+
+    def render(self, forecast, forecast_days, status=None):
+        """Return the HTML document for a Forecast.
+
+        :param status: Optional notice shown above the forecast, e.g. for stale data.
+        """
+        return PAGE_TEMPLATE.format(
+            top=self.render_top(forecast, status), table=self.render_table(forecast, forecast_days))
+
+    def render_top(self, forecast, status=None):
+        """Return the HTML of the page above the hourly table: header, status and current values.
+
+        The header shows the time of the current values, not the wall clock, so
+        the part only changes with the data.
+        """
+        current_details = "".join(
+            CURRENT_DETAIL_TEMPLATE.format(variable_title(name), format_current(forecast, name))
+            for name in forecast.current if name != 'temperature_2m')
+
+        # Format the time of the current values (display in local time)
+        formatted_time = "Unknown Time"
+        if forecast.current_time is not None:
+            formatted_time = datetime.fromtimestamp(forecast.current_time, timezone.utc).astimezone(None).strftime(
+                "%A, %B %d, %Y %H:%M %Z%z")  # Include timezone info
+
+        return TOP_TEMPLATE.format(
+            formatted_time=formatted_time,
+            status_html=STATUS_TEMPLATE.format(status=status) if status else "",
+            current_temp=format_current(forecast, 'temperature_2m'),
+            current_details=current_details,
+        )
+
+    def render_table(self, forecast, forecast_days):
+        """Return the HTML of the hourly table and the footer, the rows reused while the hourly data is unchanged."""
+        return TABLE_TEMPLATE.format(
+            table_anchor=TABLE_ANCHOR,
+            header_cells="".join(HEADER_CELL_TEMPLATE.format(variable_title(name)) for name in forecast.hourly),
+            forecast_title=f"Hourly Forecast ({forecast_days} Day{'s' if forecast_days > 1 else ''})",
+            rows=self._table_rows(forecast),
+        )
+
+    def _table_rows(self, forecast):
+        """Return the HTML rows of the hourly table, rebuilt only if the hourly data changed.
+
+        There is one column per hourly variable of the forecast, in the order
+        they were requested.
+        """
+        hourly = forecast.hourly
+        hourly_units = forecast.hourly_units
+        # Compare raw bytes, NaN values never compare equal as floats
+        source = (forecast.start, forecast.step,
+                  [(name, values.tobytes()) for name, values in hourly.items()],
+                  dict(hourly_units))
+        if self._rows is not None and source == self._rows_source:
+            return self._rows
+
+        count = len(forecast)
+        if not count:
+            rows = NO_DATA_ROW.format(len(hourly) + 1)
+        else:
+            cells = ROW_CELLS_TEMPLATE + DATA_CELL_TEMPLATE * len(hourly) + '</tr>\n'
+            even_row, odd_row = '<tr>' + cells, '<tr class="odd">' + cells
+            columns = zip(
+                local_time_labels(forecast.start, forecast.step, count),
+                *(_format_values(values, count, value_template(name, hourly_units.get(name, '')))
+                  for name, values in hourly.items()),
+            )
+            rows = "".join(
+                (odd_row if index % 2 else even_row).format(*cells)
+                for index, cells in enumerate(columns)
+            )
+
+        self._rows_source = source
+        self._rows = rows
+        return rows
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastStore
+ Persistent SQLite store of the most recent forecast per grid cell.
+ ***************************************************************************/
+"""
+
+import os
+import json
+import sqlite3
+import time
+
+from qgis.core import QgsApplication, QgsMessageLog, Qgis
+
+from .forecast_data import Forecast
+
+
+class ForecastStore:
+    """On-disk store of forecast responses, used to paint stale data at once and when offline.
+
+    Rows are keyed by the forecast source and the cache key, so after
+    switching the provider or the variables the forecasts of the previous
+    configuration are never shown as stale data of the new one.
+    """
+
+    MAX_AGE_SECONDS = 7 * 24 * 3600  # Older forecasts are of no use anymore
+    MAX_ROWS = 2000
+
+    def __init__(self, path=None):
+        """Constructor."""
+        if path is None:
+            path = os.path.join(QgsApplication.qgisSettingsDirPath(), 'weather_dock', 'forecasts.sqlite')
+        self.path = path
+        self.source = ""  # Serialized cache_key() of the provider the stored forecasts come from
+        self._connection = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._connection = sqlite3.connect(path)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts ("
+                " cell TEXT PRIMARY KEY,"
+                " fetched_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            self.prune()
+        except (OSError, sqlite3.Error) as e:
+            self._log_error(f"Could not open forecast store {path}: {e}")
+            self._connection = None
+
+    def set_source(self, provider_key):
+        """Store and load the forecasts of the provider with the given cache_key() from now on."""
+        self.source = json.dumps(provider_key, separators=(',', ':'))
+
+    def _cell_id(self, key):
+        """Serialize the source and a cache key to the text stored in the database."""
+        return self.source + '|' + ':'.join(str(part) for part in key)
+
+    def load(self, key):
+        """Return (fetched_at, Forecast) for key, or None if nothing is stored."""
+        if self._connection is None:
+            return None
+        try:
+            row = self._connection.execute(
+                "SELECT fetched_at, payload FROM forecasts WHERE cell = ?", (self._cell_id(key),)
+            ).fetchone()
+            if row is None:
+                return None
+            return row[0], Forecast.from_dict(json.loads(row[1]))
+        except (sqlite3.Error, ValueError) as e:
+            self._log_error(f"Could not read from forecast store: {e}")
+            return None
+
+    def save(self, key, forecast, fetched_at=None):
+        """Store a Forecast for key, replacing any previous forecast of the cell."""
+        if self._connection is None:
+            return
+        try:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO forecasts (cell, fetched_at, payload) VALUES (?, ?, ?)",
+                    (self._cell_id(key), fetched_at if fetched_at is not None else time.time(),
+                     json.dumps(forecast.to_dict(), separators=(',', ':')))
+                )
+        except sqlite3.Error as e:
+            self._log_error(f"Could not write to forecast store: {e}")
+
+    def prune(self):
+        """Delete expired forecasts and keep only the most recent MAX_ROWS cells."""
+        if self._connection is None:
+            return
+        try:
+            with self._connection:
+                self._connection.execute(
+                    "DELETE FROM forecasts WHERE fetched_at < ?", (time.time() - self.MAX_AGE_SECONDS,)
+                )
+                self._connection.execute(
+                    "DELETE FROM forecasts WHERE cell NOT IN "
+                    "(SELECT cell FROM forecasts ORDER BY fetched_at DESC LIMIT ?)", (self.MAX_ROWS,)
+                )
+        except sqlite3.Error as e:
+            self._log_error(f"Could not prune forecast store: {e}")
+
+    def close(self):
+        """Close the database connection."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def _log_error(message):
+        """Report a store problem without interrupting the dock."""
+        QgsMessageLog.logMessage(message, 'Weather Dock', Qgis.Warning)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastTableView
+ Native forecast view: a table model over the hourly arrays and a sparkline.
+ ***************************************************************************/
+"""
+
+import math
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+
+from .forecast_renderer import format_current, local_time_labels
+from .open_meteo import value_template, variable_title
+
+
+class ForecastTableModel(QtCore.QAbstractTableModel):
+    """Table model that reads the hourly arrays of a Forecast directly.
+
+    Cells are formatted on request, so only the rows a view actually shows
+    are ever converted to text. There is one column per hourly variable of
+    the forecast.
+    """
+
+    def __init__(self, parent=None):
+        """Constructor."""
+        super(ForecastTableModel, self).__init__(parent)
+        self._labels = []
+        self._titles = []  # Title per column
+        self._series = []  # Values per column
+        self._templates = []  # Value format with unit per column
+
+    def set_forecast(self, forecast):
+        """Show the hourly data of a Forecast."""
+        self.beginResetModel()
+        self._labels = local_time_labels(forecast.start, forecast.step, len(forecast))
+        self._titles = [variable_title(name) for name in forecast.hourly]
+        self._series = list(forecast.hourly.values())
+        self._templates = [value_template(name, forecast.hourly_units.get(name, '')) for name in forecast.hourly]
+        self.endResetModel()
+
+    def clear(self):
+        """Remove all rows."""
+        self.beginResetModel()
+        self._labels = []
+        self._titles = []
+        self._series = []
+        self._templates = []
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """Return the number of forecast hours."""
+        return 0 if parent.isValid() else len(self._labels)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """Return the number of columns including the time column."""
+        return 0 if parent.isValid() else len(self._series) + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Return the formatted value of a cell."""
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignLeft | Qt.AlignVCenter) if column == 0 else int(Qt.AlignRight | Qt.AlignVCenter)
+        if role != Qt.DisplayRole:
+            return None
+        if column == 0:
+            return self._labels[row]
+        values = self._series[column - 1]
+        value = values[row] if row < len(values) else None
+        if value is None or math.isnan(value):
+            return "N/A"
+        return self._templates[column - 1].format(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Return the column titles."""
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        return "Time" if section == 0 else self._titles[section - 1]
+
+
+class SparklineWidget(QtWidgets.QWidget):
+    """Draws a series of values as a line chart with its minimum and maximum."""
+
+    def __init__(self, parent=None):
+        """Constructor."""
+        super(SparklineWidget, self).__init__(parent)
+        self.setMinimumHeight(70)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        self._values = []
+        self._unit = ''
+
+    def set_series(self, values, unit=''):
+        """Set the values to draw, missing values leave a gap."""
+        self._values = [None if value is None or (isinstance(value, float) and math.isnan(value)) else value
+                        for value in values]
+        self._unit = unit
+        self.update()
+
+    def paintEvent(self, event):
+        """Paint the chart."""
+        valid = [value for value in self._values if value is not None]
+        if len(valid) < 2:
+            return
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        metrics = painter.fontMetrics()
+        low, high = min(valid), max(valid)
+        span = (high - low) or 1.0
+        margin = metrics.height()
+        rect = QtCore.QRectF(self.rect()).adjusted(4, margin, -4, -margin)
+        step = rect.width() / (len(self._values) - 1)
+
+        path = QtGui.QPainterPath()
+        pen_down = False
+        for index, value in enumerate(self._values):
+            if value is None:
+                pen_down = False
+                continue
+            point = QtCore.QPointF(rect.left() + index * step, rect.bottom() - (value - low) / span * rect.height())
+            if pen_down:
+                path.lineTo(point)
+            else:
+                path.moveTo(point)
+                pen_down = True
+
+        painter.setPen(QtGui.QPen(QtGui.QColor("#e67e22"), 1.5))
+        painter.drawPath(path)
+        painter.setPen(self.palette().color(QtGui.QPalette.WindowText))
+        painter.drawText(QtCore.QPointF(4, metrics.ascent()), f"max {high:.1f} {self._unit}")
+        painter.drawText(QtCore.QPointF(4, self.height() - metrics.descent()), f"min {low:.1f} {self._unit}")
+        painter.end()
+
+
+class ForecastNativeView(QtWidgets.QWidget):
+    """Current conditions, a sparkline of the temperature, or the first variable, and the hourly forecast table."""
+
+    def __init__(self, parent=None):
+        """Constructor."""
+        super(ForecastNativeView, self).__init__(parent)
+        layout = QtWidgets.QVBoxLayout(self)
+
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setWordWrap(True)
+        self.status_label.setStyleSheet(
+            "color: #7a5a00; background-color: #fdf6d8; border-left: 4px solid #f1c40f; padding: 6px;")
+        self.status_label.hide()
+        layout.addWidget(self.status_label)
+
+        self.current_label = QtWidgets.QLabel()
+        self.current_label.setTextFormat(Qt.RichText)
+        layout.addWidget(self.current_label)
+
+        self.title_label = QtWidgets.QLabel()
+        layout.addWidget(self.title_label)
+        self.sparkline = SparklineWidget()
+        layout.addWidget(self.sparkline)
+
+        self.model = ForecastTableModel(self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.table.setAlternatingRowColors(True)
+        self.table.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.table.verticalHeader().hide()
+        # Fixed row heights keep scrolling independent of the number of rows
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.fontMetrics().height() + 8)
+        self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        footer = QtWidgets.QLabel('Data provided by <a href="https://open-meteo.com/">Open-Meteo.com</a>')
+        footer.setOpenExternalLinks(True)
+        footer.setAlignment(Qt.AlignCenter)
+        layout.addWidget(footer)
+
+    def show_forecast(self, forecast, forecast_days, status=None):
+        """Show a Forecast.
+
+        :param status: Optional notice shown above the forecast, e.g. for stale data.
+        """
+        self.status_label.setText(status or "")
+        self.status_label.setVisible(bool(status))
+
+        self.current_label.setText("&nbsp;&nbsp;&nbsp;".join(
+            [f"<b>Now:</b> {format_current(forecast, 'temperature_2m')}"]
+            + [f"<b>{variable_title(name)}:</b> {format_current(forecast, name)}"
+               for name in forecast.current if name != 'temperature_2m']
+        ))
+        self.title_label.setText(f"Hourly Forecast ({forecast_days} Day{'s' if forecast_days > 1 else ''})")
+
+        chart = 'temperature_2m' if 'temperature_2m' in forecast.hourly else next(iter(forecast.hourly), None)
+        if chart is None:
+            self.sparkline.set_series([])
+        else:
+            self.sparkline.set_series(forecast.hourly[chart], forecast.hourly_units.get(chart, ''))
+        self.model.set_forecast(forecast)
+
+    def clear(self):
+        """Release the shown forecast."""
+        self.model.clear()
+        self.sparkline.set_series([])
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherGridSampler
+ Samples forecasts on a regular grid over the map canvas into a memory layer.
+ ***************************************************************************/
+"""
+
+from PyQt5 import QtCore
+
+from qgis.core import (
+    Qgis,
+    QgsCsException,
+    QgsFeature,
+    QgsGeometry,
+    QgsMessageLog,
+    QgsPointXY,
+    QgsProject,
+    QgsVectorLayer,
+)
+
+from . import open_meteo
+from .forecast_data import forecast_window, iso_time
+from .transforms import to_wgs84_transform
+
+
+class WeatherGridSampler(QtCore.QObject):
+    """Fetches the current weather for an N x M grid of points over the canvas extent.
+
+    Grid points are snapped to forecast cache cells; cells already cached are
+    reused and all others are fetched with as few batched requests as possible.
+    """
+
+    sampled = QtCore.pyqtSignal(list)  # (wgs84 point, Forecast or None) per grid point
+
+    LAYER_NAME = "Weather Grid"
+    LAYER_URI = "Point?crs=EPSG:4326&field=latitude:double&field=longitude:double&field=time:string(20)"
+
+    def __init__(self, iface, service, cache):
+        """Constructor."""
+        super(WeatherGridSampler, self).__init__()
+        self.iface = iface
+        self.service = service
+        self.cache = cache
+        self.layer_id = None
+        self.layer_variables = None  # Current variables the grid layer has fields for
+        self._variables = ()  # Current variables of the sampling in progress
+        self._samples = []  # (wgs84 point, cache key) per grid point
+        self._results = {}  # cache key -> Forecast of the current sampling
+        self._pending = {}  # request id -> cache keys in request order
+        self.service.batchReceived.connect(self._on_batch_received)
+        self.service.forecastFailed.connect(self._on_failed)
+
+    def update(self, rows, columns, forecast_days):
+        """Sample the current canvas extent, superseding any sampling in progress."""
+        self.cancel()
+        self._variables = self.service.provider.variables()[0]
+        # The hours the dock fetches for the same cache keys, so either can reuse the other's forecasts
+        window = forecast_window(forecast_days)
+
+        canvas = self.iface.mapCanvas()
+        extent = canvas.extent()
+        transform = to_wgs84_transform(canvas.mapSettings().destinationCrs())
+
+        self._samples = []
+        self._results = {}
+        missing = {}  # cache key -> cell center to fetch
+        for row in range(rows):
+            y = extent.yMaximum() - (row + 0.5) * extent.height() / rows
+            for column in range(columns):
+                x = extent.xMinimum() + (column + 0.5) * extent.width() / columns
+                point = QgsPointXY(x, y)
+                try:
+                    if transform is not None:
+                        point = transform.transform(point)
+                except QgsCsException:
+                    continue  # Outside the area the canvas projection is valid for
+                # Snap to cache cells of valid coordinates only, e.g. in world views
+                point = QgsPointXY(min(max(point.x(), -180.0), 180.0), min(max(point.y(), -90.0), 90.0))
+                key = self.cache.cell_key(point.y(), point.x(), forecast_days)
+                self._samples.append((point, key))
+                if key in self._results or key in missing:
+                    continue
+                forecast = self.cache.get(key, window)
+                if forecast is not None:
+                    self._results[key] = forecast
+                else:
+                    missing[key] = self.cache.cell_center(key)
+
+        keys = list(missing)
+        for start in range(0, len(keys), open_meteo.MAX_BATCH_SIZE):
+            batch_keys = keys[start:start + open_meteo.MAX_BATCH_SIZE]
+            request_id = self.service.fetch_batch(
+                [missing[key] for key in batch_keys], forecast_days, hours=window)
+            self._pending[request_id] = batch_keys
+
+        if not self._pending:
+            self._publish()
+
+    def cancel(self):
+        """Abort all requests of the sampling in progress."""
+        for request_id in list(self._pending):
+            self.service.abort(request_id)
+        self._pending.clear()
+
+    def _on_batch_received(self, request_id, forecasts):
+        """Cache the forecasts of a finished batch."""
+        keys = self._pending.pop(request_id, None)
+        if keys is None:
+            return  # Not ours, or superseded
+        for key, forecast in zip(keys, forecasts):
+            self.cache.put(key, forecast)
+            self._results[key] = forecast
+        if not self._pending:
+            self._publish()
+
+    def _on_failed(self, request_id, error_message):
+        """Log a failed batch; its points are published without values."""
+        if self._pending.pop(request_id, None) is None:
+            return
+        QgsMessageLog.logMessage(f"Weather grid sampling failed: {error_message}", 'Weather Dock', Qgis.Warning)
+        if not self._pending:
+            self._publish()
+
+    def _layer(self):
+        """Return the grid layer, creating it if it does not exist (anymore) or the variables changed."""
+        layer = QgsProject.instance().mapLayer(self.layer_id) if self.layer_id else None
+        if layer is not None and self.layer_variables != self._variables:
+            QgsProject.instance().removeMapLayer(self.layer_id)
+            layer = None
+        if layer is None:
+            uri = self.LAYER_URI + "".join(f"&field={name}:double" for name in self._variables)
+            layer = QgsVectorLayer(uri, self.LAYER_NAME, "memory")
+            QgsProject.instance().addMapLayer(layer)
+            self.layer_id = layer.id()
+            self.layer_variables = self._variables
+        return layer
+
+    def _publish(self):
+        """Replace the features of the grid layer with the current samples."""
+        layer = self._layer()
+        fields = layer.fields()
+        features = []
+        for point, key in self._samples:
+            forecast = self._results.get(key)
+            current = forecast.current if forecast is not None else {}
+            current_time = forecast.current_time if forecast is not None else None
+            feature = QgsFeature(fields)
+            feature.setGeometry(QgsGeometry.fromPointXY(point))
+            feature.setAttributes([
+                point.y(),
+                point.x(),
+                iso_time(current_time) if current_time is not None else None,
+            ] + [current.get(name) for name in self._variables])
+            features.append(feature)
+
+        provider = layer.dataProvider()
+        provider.truncate()
+        provider.addFeatures(features)  # One bulk insert for the whole grid
+        layer.updateExtents()
+        layer.triggerRepaint()
+        self.sampled.emit([(point, self._results.get(key)) for point, key in self._samples])
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ Metrics
+ Rolling latency histograms and counters of the stages of a forecast update.
+ ***************************************************************************/
+"""
+
+import csv
+import io
+import json
+import math
+import time
+from collections import OrderedDict, deque
+
+from qgis.core import Qgis, QgsMessageLog
+
+
+class LatencyHistogram:
+    """Keeps the most recent samples of a stage to report its percentiles."""
+
+    def __init__(self, window=1000):
+        """Constructor."""
+        self._samples = deque(maxlen=window)
+        self.count = 0  # All samples ever recorded, not just those in the window
+
+    def add(self, milliseconds):
+        """Record a duration in milliseconds."""
+        self._samples.append(milliseconds)
+        self.count += 1
+
+    def percentile(self, fraction):
+        """Return the duration below which fraction of the recent samples lie, or None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+    def summary(self):
+        """Return count, p50, p95, p99 and max of the recent samples as a dict."""
+        return {
+            'count': self.count,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': max(self._samples) if self._samples else None,
+        }
+
+
+class Trace:
+    """The stage durations of one forecast update, from the canvas change to the painted forecast."""
+
+    __slots__ = ('label', 'started', 'stages')
+
+    def __init__(self, label):
+        """Constructor."""
+        self.label = label
+        self.started = time.perf_counter()
+        self.stages = []  # (stage, milliseconds) in the order they happened
+
+    def add(self, stage, milliseconds):
+        """Append the duration of a stage."""
+        self.stages.append((stage, milliseconds))
+
+
+class Metrics:
+    """Collects stage latencies and counters of the whole plugin.
+
+    Stages are recorded where they happen, e.g. the network stages by the
+    fetch service and the layout by the dock; a Trace additionally
+    collects the stages of one update so they can be logged together.
+    """
+
+    WINDOW = 1000  # Samples kept per stage
+
+    def __init__(self):
+        """Constructor."""
+        self.histograms = OrderedDict()  # stage -> LatencyHistogram, in order of first use
+        self.counters = OrderedDict()
+        self.log_traces = False  # Log every finished trace to the QGIS message log
+
+    def record(self, stage, milliseconds, trace=None):
+        """Record the duration of a stage, and add it to trace if given."""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram(self.WINDOW)
+        histogram.add(milliseconds)
+        if trace is not None:
+            trace.add(stage, milliseconds)
+
+    def count(self, name, amount=1):
+        """Increase a counter, e.g. of bytes received."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def start_trace(self, label):
+        """Return a new Trace."""
+        return Trace(label)
+
+    def finish_trace(self, trace):
+        """Record the total duration of a trace and log it if enabled."""
+        total = (time.perf_counter() - trace.started) * 1000.0
+        self.record('total', total)
+        if self.log_traces:
+            stages = ", ".join(f"{stage} {milliseconds:.1f} ms" for stage, milliseconds in trace.stages)
+            QgsMessageLog.logMessage(
+                f"{trace.label}: {stages}, total {total:.1f} ms", 'Weather Dock', Qgis.Info)
+
+    def reset(self):
+        """Drop all samples and counters."""
+        self.histograms.clear()
+        self.counters.clear()
+
+    def snapshot(self, extra=None):
+        """Return the stage summaries and counters as a JSON serializable dict.
+
+        :param extra: Optional dict of further sections, e.g. the cache statistics.
+        """
+        data = {
+            'timestamp': time.time(),
+            'stages': {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+            'counters': dict(self.counters),
+        }
+        data.update(extra or {})
+        return data
+
+    def log_summary(self, extra=None):
+        """Write the stage percentiles and counters to the QGIS message log."""
+        snapshot = self.snapshot(extra)
+        lines = [_format_stage(stage, summary) for stage, summary in snapshot['stages'].items()]
+        lines += [f"{name}: {value}" for name, value in snapshot['counters'].items()]
+        QgsMessageLog.logMessage("Metrics\n" + "\n".join(lines), 'Weather Dock', Qgis.Info)
+
+    def to_json(self, extra=None):
+        """Return the snapshot as JSON text."""
+        return json.dumps(self.snapshot(extra), indent=2)
+
+    def to_csv(self, extra=None):
+        """Return the stage summaries as CSV text with one row per stage, then one per counter.
+
+        :param extra: Optional dict of further sections like for snapshot(), their values
+            are written as counters named "section.name".
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['stage', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+        for stage, histogram in self.histograms.items():
+            summary = histogram.summary()
+            writer.writerow([stage, summary['count'], summary['p50'], summary['p95'], summary['p99'], summary['max']])
+        for name, value in self.counters.items():
+            writer.writerow([name, value, '', '', '', ''])
+        for section, values in (extra or {}).items():
+            for name, value in values.items():
+                writer.writerow([f"{section}.{name}", value, '', '', '', ''])
+        return output.getvalue()
+
+
+def _format_stage(stage, summary):
+    """Format the summary of a stage as one log line."""
+    def milliseconds(value):
+        return "-" if value is None else f"{value:.1f}"
+    return (f"{stage}: n={summary['count']} p50={milliseconds(summary['p50'])} "
+            f"p95={milliseconds(summary['p95'])} p99={milliseconds(summary['p99'])} "
+            f"max={milliseconds(summary['max'])} ms")
+
+
+# Shared by all parts of the plugin
+metrics = Metrics()
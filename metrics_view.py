@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ MetricsView
+ Debug tab showing the stage latencies, cache and request statistics.
+ ***************************************************************************/
+"""
+
+from PyQt5 import QtCore, QtWidgets
+
+from .metrics import metrics
+
+
+class MetricsView(QtWidgets.QWidget):
+    """Table of the stage percentiles with the cache hit ratio, bytes received and exports."""
+
+    REFRESH_INTERVAL_MS = 1000
+    COLUMNS = ("Stage", "Count", "p50 ms", "p95 ms", "p99 ms", "Max ms")
+
+    def __init__(self, cache=None, service=None, parent=None):
+        """Constructor."""
+        super(MetricsView, self).__init__(parent)
+        self.cache = cache
+        self.service = service
+        layout = QtWidgets.QVBoxLayout(self)
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        layout.addWidget(self.table)
+
+        self.summary_label = QtWidgets.QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        buttons = QtWidgets.QHBoxLayout()
+        for text, slot in (("Export JSON...", self.export_json), ("Export CSV...", self.export_csv),
+                           ("Log", self.log_summary), ("Reset", self.reset)):
+            button = QtWidgets.QPushButton(text)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+
+        # Only refresh while the tab is shown
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.REFRESH_INTERVAL_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        """Start refreshing when the tab becomes visible."""
+        super(MetricsView, self).showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        """Stop refreshing when the tab is hidden."""
+        super(MetricsView, self).hideEvent(event)
+        self.timer.stop()
+
+    def extra(self):
+        """Return the cache and request statistics to add to the metrics."""
+        extra = {}
+        if self.cache is not None:
+            extra['cache'] = self.cache.stats()
+        if self.service is not None:
+            extra['requests'] = self.service.stats()
+        return extra
+
+    def refresh(self):
+        """Show the current metrics."""
+        snapshot = metrics.snapshot(self.extra())
+        stages = snapshot['stages']
+        self.table.setRowCount(len(stages))
+        for row, (stage, summary) in enumerate(stages.items()):
+            values = [stage, str(summary['count'])] + [
+                "-" if summary[name] is None else f"{summary[name]:.1f}" for name in ('p50', 'p95', 'p99', 'max')]
+            for column, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(value)
+                if column > 0:
+                    item.setTextAlignment(int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter))
+                self.table.setItem(row, column, item)
+
+        parts = []
+        cache = snapshot.get('cache')
+        if cache is not None:
+            lookups = cache['hits'] + cache['misses']
+            ratio = f"{100.0 * cache['hit_ratio']:.0f}%" if cache['hit_ratio'] is not None else "-"
+            parts.append(f"Cache hit ratio {ratio} ({cache['hits']}/{lookups})")
+        counters = snapshot['counters']
+        parts.append(f"{counters.get('bytes_received', 0) / 1024.0:.1f} KiB received "
+                     f"in {counters.get('requests_sent', 0)} requests")
+        requests = snapshot.get('requests')
+        if requests is not None:
+            parts.append(f"{requests['queued']} queued, {requests['coalesced']} coalesced, "
+                         f"{requests['throttled']} throttled")
+        self.summary_label.setText("; ".join(parts))
+
+    def export_json(self):
+        """Save the metrics as a JSON file."""
+        self._export("JSON (*.json)", metrics.to_json(self.extra()))
+
+    def export_csv(self):
+        """Save the metrics as a CSV file."""
+        self._export("CSV (*.csv)", metrics.to_csv(self.extra()))
+
+    def log_summary(self):
+        """Write the metrics to the QGIS message log."""
+        metrics.log_summary(self.extra())
+
+    def reset(self):
+        """Drop the collected samples."""
+        metrics.reset()
+        self.refresh()
+
+    def _export(self, file_filter, text):
+        """Ask for a file name and write text to it."""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export Metrics", "", file_filter)
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                output.write(text)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, "Export Metrics", f"Could not write {path}: {e}")
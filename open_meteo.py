@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ Open-Meteo
+ Request building and response parsing for the open-meteo.com forecast API.
+ ***************************************************************************/
+"""
+
+from urllib.parse import urlencode
+
+try:
+    # Optional, decodes large batch responses several times faster
+    from orjson import loads as json_loads
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    from json import loads as json_loads
+    JSON_BACKEND = 'json'
+
+from .forecast_data import HOUR_SECONDS, Forecast, iso_time
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+# Hourly variables that can be selected, in display order: name -> (title, number format, also a current value)
+VARIABLES = {
+    'temperature_2m': ("Temp", "{:.1f}", True),
+    'apparent_temperature': ("Feels like", "{:.1f}", True),
+    'wind_speed_10m': ("Wind", "{:.1f}", True),
+    'wind_gusts_10m': ("Gusts", "{:.1f}", True),
+    'wind_direction_10m': ("Wind from", "{:.0f}", True),
+    'relative_humidity_2m': ("Humidity", "{:.0f}", True),
+    'precipitation': ("Precip", "{:.1f}", True),
+    'precipitation_probability': ("Precip chance", "{:.0f}", False),
+    'cloud_cover': ("Clouds", "{:.0f}", True),
+    'pressure_msl': ("Pressure", "{:.0f}", True),
+}
+HOURLY_VARIABLES = ("temperature_2m", "wind_speed_10m", "relative_humidity_2m")  # Selected by default
+MAX_BATCH_SIZE = 100  # Locations per request, keeps the URL at a sane length
+# Update times of a weather model, published by the service next to the API
+MODEL_META_URL = "https://api.open-meteo.com/data/{model}/static/meta.json"
+REFERENCE_MODEL = "dwd_icon"  # Global model whose runs pace the background refresh
+
+
+def current_variables(hourly_variables):
+    """Return the variables of hourly_variables that the service also has as current values."""
+    return tuple(name for name in hourly_variables if VARIABLES.get(name, (None, None, False))[2])
+
+
+def variable_title(name):
+    """Return the column title of a variable."""
+    return VARIABLES[name][0] if name in VARIABLES else name
+
+
+def value_template(name, unit):
+    """Return the str.format template of a value of a variable with its unit, e.g. "{:.1f} °C"."""
+    number_format = VARIABLES[name][1] if name in VARIABLES else "{:.1f}"
+    if not unit:
+        return number_format
+    return number_format + ("" if unit in ('%', '°') else " ") + unit.replace('{', '{{').replace('}', '}}')
+
+
+def build_forecast_url(latitude, longitude, forecast_days, hours=None):
+    """Return the forecast URL for a single location."""
+    return build_batch_url([(latitude, longitude)], forecast_days, hours)
+
+
+def build_batch_url(points, forecast_days, hours=None, base_url=None, hourly_variables=HOURLY_VARIABLES):
+    """Return the forecast URL for a list of (latitude, longitude) tuples.
+
+    The service answers a request for several locations with a list of
+    forecast documents in the same order.
+
+    :param hours: Optional (start, end) UTC epochs; if given only the hourly
+        values from start up to end are requested instead of whole forecast days.
+    :param base_url: Forecast endpoint of another instance of the service, FORECAST_URL by default.
+    :param hourly_variables: Variables to request; only these are downloaded and parsed.
+    """
+    params = {
+        'latitude': ','.join(str(latitude) for latitude, _ in points),
+        'longitude': ','.join(str(longitude) for _, longitude in points),
+    }
+    current = current_variables(hourly_variables)
+    if current:
+        params['current'] = ','.join(current)
+    params['hourly'] = ','.join(hourly_variables)
+    params['timezone'] = 'GMT'  # Times in UTC, they are converted to the local time zone for display
+    if hours is None:
+        params['forecast_days'] = forecast_days
+    else:
+        start, end = hours
+        params['start_hour'] = iso_time(start)
+        params['end_hour'] = iso_time(end - HOUR_SECONDS)  # The end hour is inclusive
+    query = urlencode(params, safe=',:')
+    return f"{base_url or FORECAST_URL}?{query}"
+
+
+def parse_forecast(data):
+    """Parse a raw response body into a Forecast.
+
+    :raises ValueError: If the body is not a valid forecast document.
+    """
+    weather_data = json_loads(data)
+    if not isinstance(weather_data, dict):
+        raise ValueError("Unexpected forecast document")
+    if weather_data.get('error'):
+        raise ValueError(weather_data.get('reason', "The weather service rejected the request"))
+    return Forecast.from_json(weather_data)
+
+
+def parse_batch(data, expected_count):
+    """Parse the response to a batch request into a list of Forecast objects.
+
+    The body is decoded straight from bytes, and every document is released
+    as soon as it is converted, so the peak memory is about one decoded
+    response rather than the decoded response plus all its forecasts.
+
+    :param expected_count: Number of forecasts the response must contain, None accepts any number.
+    :raises ValueError: If the body is not a list of expected_count forecasts.
+    """
+    documents = json_loads(data)
+    if isinstance(documents, dict):
+        if documents.get('error'):
+            raise ValueError(documents.get('reason', "The weather service rejected the request"))
+        documents = [documents]  # A batch of one is answered with a single document
+    if not isinstance(documents, list) or (expected_count is not None and len(documents) != expected_count):
+        raise ValueError("Unexpected number of forecast documents")
+    if not all(isinstance(document, dict) for document in documents):
+        raise ValueError("Unexpected forecast document")
+    forecasts = []
+    for index in range(len(documents)):
+        forecasts.append(Forecast.from_json(documents[index]))
+        documents[index] = None
+    return forecasts
+
+
+def error_reason(data):
+    """Return the reason the service gave for rejecting a request, if any."""
+    try:
+        document = json_loads(data)
+    except ValueError:
+        return None
+    if isinstance(document, dict) and document.get('error'):
+        return document.get('reason')
+    return None
+
+
+def parse_model_update(data):
+    """Parse a model meta document into (last run available at, update interval) in UTC epoch seconds.
+
+    :raises ValueError: If the body is not a valid model meta document.
+    """
+    document = json_loads(data)
+    if not isinstance(document, dict):
+        raise ValueError("Unexpected model meta document")
+    try:
+        return float(document['last_run_availability_time']), float(document['update_interval_seconds'])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Unexpected model meta document: {e}")
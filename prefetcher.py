@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastPrefetcher
+ Speculatively fetches forecasts of the cells the user is panning toward.
+ ***************************************************************************/
+"""
+
+from PyQt5 import QtCore
+from PyQt5.QtNetwork import QNetworkRequest
+
+from .forecast_data import forecast_window
+
+
+class ForecastPrefetcher(QtCore.QObject):
+    """Fills the forecast cache ahead of the user with low priority requests.
+
+    Prefetching only uses idle capacity: nothing is requested while the
+    service has a regular request pending, and each new prediction
+    supersedes the previous one. The cache counts how many prefetched
+    forecasts were used later.
+    """
+    prefetchFinished = QtCore.pyqtSignal(list)  # Cache keys of a prefetch that was answered or failed
+
+    NEIGHBOUR_CELLS = 1  # A prefetch with a cell this close to the resting position is kept
+
+    def __init__(self, service, cache):
+        """Constructor."""
+        super(ForecastPrefetcher, self).__init__()
+        self.service = service
+        self.cache = cache
+        self._pending = {}  # request id -> cache keys in request order
+        self.issued = 0
+        self.canceled = 0
+        self.service.batchReceived.connect(self._on_batch_received)
+        self.service.forecastFailed.connect(self._on_failed)
+
+    def prefetch(self, points, forecast_days):
+        """Prefetch the cells of the given (latitude, longitude) points, superseding earlier prefetches."""
+        if self.service.busy():
+            return
+        keys = []
+        for latitude, longitude in points:
+            key = self.cache.cell_key(latitude, longitude, forecast_days)
+            if key not in keys and not self.cache.contains(key):
+                keys.append(key)
+        pending_keys = {key for batch in self._pending.values() for key in batch}
+        if not keys or pending_keys.issuperset(keys):
+            return
+        self.cancel()
+        request_id = self.service.fetch_batch(
+            [self.cache.cell_center(key) for key in keys], forecast_days, QNetworkRequest.LowPriority,
+            forecast_window(forecast_days))
+        self._pending[request_id] = keys
+        self.issued += len(keys)
+
+    def cancel(self):
+        """Abort all prefetch requests in flight."""
+        for request_id, keys in self._pending.items():
+            self.service.abort(request_id)
+            self.canceled += len(keys)
+        self._pending.clear()
+
+    def cancel_far_from(self, key):
+        """Abort the prefetches not needed at the cell of key, return True if one still fetches key itself.
+
+        A prefetch is kept if one of its cells is at most NEIGHBOUR_CELLS cells
+        away from key, or if its response is already arriving.
+        """
+        for request_id, keys in list(self._pending.items()):
+            if not self.service.is_pending(request_id):
+                del self._pending[request_id]  # Aborted by someone else, e.g. a change of provider
+                continue
+            near = any(other[2] == key[2]
+                       and max(abs(other[0] - key[0]), abs(other[1] - key[1])) <= self.NEIGHBOUR_CELLS
+                       for other in keys)
+            if not near and not self.service.is_receiving(request_id):
+                self.service.abort(request_id)
+                self.canceled += len(keys)
+                del self._pending[request_id]
+        return any(key in keys for keys in self._pending.values())
+
+    def _on_batch_received(self, request_id, forecasts):
+        """Cache the prefetched forecasts."""
+        keys = self._pending.pop(request_id, None)
+        if keys is None:
+            return
+        for key, forecast in zip(keys, forecasts):
+            self.cache.put(key, forecast, prefetched=True)
+        self.prefetchFinished.emit(keys)
+
+    def _on_failed(self, request_id, error_message):
+        """Drop a failed prefetch, the regular update will report problems."""
+        keys = self._pending.pop(request_id, None)
+        if keys is not None:
+            self.prefetchFinished.emit(keys)
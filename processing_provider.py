@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherProcessingProvider
+ Processing provider for the algorithms of the Weather Dock plugin.
+ ***************************************************************************/
+"""
+
+import os
+
+from PyQt5.QtGui import QIcon
+
+from qgis.core import QgsProcessingProvider
+
+from .bulk_weather_algorithm import BulkWeatherLookupAlgorithm
+
+
+class WeatherProcessingProvider(QgsProcessingProvider):
+    """Processing provider implementation."""
+
+    def loadAlgorithms(self):
+        """Register the algorithms of the provider."""
+        self.addAlgorithm(BulkWeatherLookupAlgorithm())
+
+    def id(self):
+        """Return the provider id used in algorithm ids."""
+        return 'weatherdock'
+
+    def name(self):
+        """Return the provider name shown in the toolbox."""
+        return 'Weather Dock'
+
+    def icon(self):
+        """Return the plugin icon."""
+        return QIcon(os.path.join(os.path.dirname(__file__), 'icon.svg'))
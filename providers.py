@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ Providers
+ Forecast sources: how to request forecasts and how to parse the answers.
+ ***************************************************************************/
+"""
+
+import glob
+import os
+import zlib
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse
+
+from PyQt5.QtCore import QUrl
+
+from . import open_meteo
+from .forecast_data import HOUR_SECONDS, Forecast, forecast_window
+
+
+class WeatherProvider:
+    """Interface of a forecast source used by WeatherFetchService.
+
+    A provider turns a batch of locations into a request URL and the
+    response body back into one Forecast per location. It does no I/O
+    itself, so the service keeps control of queuing, coalescing and rate
+    limiting whatever the source.
+    """
+
+    id = None
+    label = None
+    rate_limited = True  # Whether requests count against the shared rate limit
+    hourly_variables = open_meteo.HOURLY_VARIABLES  # Selection of supported_variables() to request
+
+    def supported_variables(self):
+        """Return the hourly variable names the provider can deliver."""
+        raise NotImplementedError
+
+    def select_variables(self, names):
+        """Request the names the provider supports, or the supported defaults if none of them is.
+
+        :param names: Hourly variable names in catalog order, None for the defaults.
+        """
+        supported = self.supported_variables()
+        selected = tuple(name for name in names or () if name in supported)
+        defaults = tuple(name for name in open_meteo.HOURLY_VARIABLES if name in supported)
+        self.hourly_variables = selected or defaults or supported[:1]
+
+    def variables(self, hourly_variables=None):
+        """Return the (current, hourly) variable names requested.
+
+        :param hourly_variables: Names requested instead of the selection; those not supported are left out.
+        """
+        if hourly_variables is None:
+            hourly_variables = self.hourly_variables
+        else:
+            supported = self.supported_variables()
+            hourly_variables = tuple(name for name in hourly_variables if name in supported)
+        return open_meteo.current_variables(hourly_variables), hourly_variables
+
+    def cache_key(self):
+        """Return what tells the forecasts of this provider apart from those of another configuration."""
+        return self.id, self.label, tuple(self.hourly_variables)
+
+    def build_request(self, points, forecast_days, hours=None, hourly_variables=None):
+        """Return the URL requesting forecasts for a list of (latitude, longitude) points.
+
+        :param hours: Optional (start, end) UTC epochs to request only these hours instead of whole days.
+        :param hourly_variables: Optional names to request instead of the selection, see variables().
+        """
+        raise NotImplementedError
+
+    def parse_response(self, url, data, expected_count):
+        """Parse a response body into a list of expected_count Forecast objects.
+
+        :param url: The URL returned by build_request() for this response.
+        :raises ValueError: If the body is not a valid response.
+        """
+        raise NotImplementedError
+
+    def error_reason(self, data):
+        """Return the reason given in the body of a failed response, if any."""
+        return None
+
+    def model_meta_url(self, model):
+        """Return the URL of the update times of a weather model, or None if unknown."""
+        return None
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """The public open-meteo.com API, or a self-hosted instance of it at base_url."""
+
+    def __init__(self, base_url=None, hourly_variables=None):
+        """Constructor.
+
+        :param base_url: Root URL of a self-hosted instance, e.g. "https://weather.example.com".
+        :param hourly_variables: Variables to request, HOURLY_VARIABLES by default.
+        """
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.id = 'self_hosted' if base_url else 'open_meteo'
+        self.label = f"Open-Meteo at {self.base_url}" if base_url else "Open-Meteo"
+        self.select_variables(hourly_variables)
+
+    def supported_variables(self):
+        """Return the hourly variable names the provider can deliver."""
+        return tuple(open_meteo.VARIABLES)
+
+    def build_request(self, points, forecast_days, hours=None, hourly_variables=None):
+        """Return the forecast URL of the instance."""
+        base_url = f"{self.base_url}/v1/forecast" if self.base_url else None
+        return open_meteo.build_batch_url(points, forecast_days, hours, base_url, self.variables(hourly_variables)[1])
+
+    def parse_response(self, url, data, expected_count):
+        """Parse a forecast response."""
+        return open_meteo.parse_batch(data, expected_count)
+
+    def error_reason(self, data):
+        """Return the reason the service gave for rejecting a request, if any."""
+        return open_meteo.error_reason(data)
+
+    def model_meta_url(self, model):
+        """Return the URL of the update times of a weather model on the instance."""
+        if self.base_url:
+            return urljoin(self.base_url + '/', f"data/{model}/static/meta.json")
+        return open_meteo.MODEL_META_URL.format(model=model)
+
+
+class FixtureProvider(WeatherProvider):
+    """Replays archived forecast responses from a directory, without network access.
+
+    Every ``*.json`` file in the directory must be a response of the
+    forecast API, for one or several locations. A request is answered with
+    the archived forecast picked by a hash of its location, moved to the
+    requested location and shifted in time so it starts at the requested
+    hour. This gives deterministic, realistic data at file read speed, e.g.
+    for demonstrations, benchmarks and debugging.
+    """
+
+    id = 'fixture'
+    label = "Local fixtures"
+    rate_limited = False
+
+    def __init__(self, directory, hourly_variables=None):
+        """Constructor."""
+        self.directory = directory
+        self.files = sorted(glob.glob(os.path.join(directory, '*.json')))
+        self._supported = None
+        self.select_variables(hourly_variables)
+
+    def supported_variables(self):
+        """Return the catalog variables in the hourly data of the first fixture, all if it cannot be read."""
+        if self._supported is None:
+            hourly = {}
+            try:
+                with open(self.files[0], 'rb') as fixture:
+                    document = open_meteo.json_loads(fixture.read())
+                document = document[0] if isinstance(document, list) else document
+                hourly = document.get('hourly') or {}
+            except (IndexError, OSError, ValueError, AttributeError, KeyError):
+                pass  # Fetching fails later with a proper message
+            self._supported = (tuple(name for name in open_meteo.VARIABLES if name in hourly)
+                               or tuple(open_meteo.VARIABLES))
+        return self._supported
+
+    def cache_key(self):
+        """Return the key of the base class with the directory, other fixtures are another source."""
+        return super(FixtureProvider, self).cache_key() + (os.path.abspath(self.directory),)
+
+    def build_request(self, points, forecast_days, hours=None, hourly_variables=None):
+        """Return a file URL of a fixture, with the request as query."""
+        start, end = hours if hours is not None else forecast_window(forecast_days)
+        latitude, longitude = points[0]
+        if self.files:
+            path = self.files[zlib.crc32(f"{latitude:.1f},{longitude:.1f}".encode()) % len(self.files)]
+        else:
+            path = os.path.join(self.directory, 'forecast.json')  # Fails like a missing file when fetched
+        url = QUrl.fromLocalFile(path)
+        url.setQuery(urlencode({
+            'latitude': ','.join(str(latitude) for latitude, _ in points),
+            'longitude': ','.join(str(longitude) for _, longitude in points),
+            'start': start,
+            'end': end,
+            'hourly': ','.join(self.variables(hourly_variables)[1]),
+        }, safe=','))
+        return url.toString()
+
+    def parse_response(self, url, data, expected_count):
+        """Return the archived forecasts moved to the requested locations and hours."""
+        query = parse_qs(urlparse(url).query)
+        try:
+            latitudes = [float(value) for value in query['latitude'][0].split(',')]
+            longitudes = [float(value) for value in query['longitude'][0].split(',')]
+            start = int(query['start'][0])
+            count = (int(query['end'][0]) - start) // HOUR_SECONDS
+            requested = query['hourly'][0].split(',')
+        except (KeyError, IndexError) as e:
+            raise ValueError(f"Unexpected fixture request: {e}")
+        archived = open_meteo.parse_batch(data, None)  # Archived locations are reused round robin
+        if not archived:
+            raise ValueError("Empty fixture")
+        current_variables, hourly_variables = self.variables(requested)
+        forecasts = []
+        for index, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            forecast = archived[index % len(archived)]
+            # Keep only the selected variables, like the service would have answered
+            forecasts.append(Forecast(
+                latitude, longitude, start, forecast.step,
+                {name: forecast.hourly[name][:count] for name in hourly_variables if name in forecast.hourly},
+                forecast.hourly_units,
+                {name: forecast.current[name] for name in current_variables if name in forecast.current},
+                forecast.current_units, start,
+            ))
+        return forecasts
+
+    def error_reason(self, data):
+        """Return the reason stored in an archived error response, if any."""
+        return open_meteo.error_reason(data)
+
+
+PROVIDER_LABELS = (
+    ('open_meteo', "Open-Meteo (open-meteo.com)"),
+    ('self_hosted', "Self-hosted Open-Meteo"),
+    ('fixture', "Local fixtures (archived responses)"),
+)
+
+
+def create_provider(provider_id, base_url=None, fixture_directory=None, hourly_variables=None):
+    """Return the provider for a provider id, falling back to the public Open-Meteo API.
+
+    :param hourly_variables: Variables to request, HOURLY_VARIABLES by default; those the provider
+        does not support are left out.
+    """
+    if provider_id == 'self_hosted' and base_url:
+        return OpenMeteoProvider(base_url, hourly_variables)
+    if provider_id == 'fixture' and fixture_directory:
+        return FixtureProvider(fixture_directory, hourly_variables)
+    return OpenMeteoProvider(hourly_variables=hourly_variables)
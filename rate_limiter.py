@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ TokenBucket
+ Thread-safe limit on the number of requests sent per second, and retry backoff.
+ ***************************************************************************/
+"""
+
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Allows bursts of up to capacity requests and refills at rate tokens per second.
+
+    take() never blocks and is meant for the event loop; acquire() blocks
+    and is meant for worker threads. Both may be used on the same bucket.
+    """
+
+    def __init__(self, rate, capacity):
+        """Constructor."""
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def configure(self, rate, capacity):
+        """Apply a new rate and capacity."""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, float(capacity))
+
+    def take(self):
+        """Take a token if one is available.
+
+        :return: 0.0 if a token was taken, otherwise the seconds until the next one.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            if self.rate <= 0:
+                return 1.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self, is_canceled=None):
+        """Block until a token was taken.
+
+        :param is_canceled: Optional callable; waiting stops early when it returns True.
+        :return: False if waiting was canceled, True otherwise.
+        """
+        while True:
+            wait = self.take()
+            if wait <= 0:
+                return True
+            if is_canceled is not None and is_canceled():
+                return False
+            time.sleep(min(wait, 0.1))
+
+    def _refill(self):
+        """Add the tokens earned since the last update, the lock must be held."""
+        now = time.monotonic()
+        self._tokens = min(float(self.capacity), self._tokens + (now - self._updated) * max(self.rate, 0.0))
+        self._updated = now
+
+
+def backoff_delay(attempt, base=1.0, maximum=60.0, retry_after=None):
+    """Return the seconds to wait before retry number attempt (starting at 1).
+
+    The delay doubles with every attempt up to maximum, and its second half
+    is random so clients that were throttled together do not retry
+    together. A Retry-After given by the server is a lower bound.
+    """
+    capped = min(maximum, base * 2 ** (attempt - 1))
+    delay = capped / 2 + random.uniform(0, capped / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
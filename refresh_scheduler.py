@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ RefreshScheduler
+ Refreshes the shown forecasts when a new weather model run is published.
+ ***************************************************************************/
+"""
+
+import random
+import time
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt, QUrl
+from PyQt5.QtNetwork import QNetworkReply, QNetworkRequest
+from PyQt5.QtWidgets import QApplication
+
+from qgis.core import Qgis, QgsMessageLog, QgsNetworkAccessManager
+
+from . import open_meteo
+
+
+class RefreshScheduler(QtCore.QObject):
+    """Emits refreshDue when fresh model output is likely available.
+
+    Forecasts only change when a weather model run is published, so
+    instead of refetching them on a fixed timer the small meta document of
+    a reference model is checked once per expected run. The checks are
+    spread with a random delay, so many desktops behind one address do not
+    hit the service at the same moment, and they pause while the dock is
+    hidden or QGIS has been in the background for a while.
+    """
+
+    refreshDue = QtCore.pyqtSignal(float)  # UTC epoch the new model run became available
+
+    FALLBACK_INTERVAL_S = 3 * 3600  # Assumed time between model runs if the meta document is unavailable
+    AVAILABILITY_MARGIN_S = 10 * 60  # Runs are often published a little late
+    MIN_CHECK_INTERVAL_S = 15 * 60
+    MAX_JITTER_S = 10 * 60
+    IDLE_AFTER_S = 10 * 60  # QGIS in the background this long counts as idle
+
+    def __init__(self, service, parent=None):
+        """Constructor.
+
+        :param service: The WeatherFetchService, whose Cache-Control freshness delays the checks.
+        """
+        super(RefreshScheduler, self).__init__(parent)
+        self.service = service
+        self.network = QgsNetworkAccessManager.instance()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.check)
+        self.idle_timer = QtCore.QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.timeout.connect(self._on_idle)
+        self.active = False  # Requested by the plugin, e.g. while the dock is visible
+        self.idle = False
+        self.last_run = None  # UTC epoch the newest known model run became available
+        self.next_check = None  # UTC epoch of the next check
+        self.checks = 0
+        self.refreshes = 0
+        self._reply = None
+        QApplication.instance().applicationStateChanged.connect(self._on_application_state_changed)
+
+    def resume(self):
+        """Start checking for new model runs, at once if a check is overdue."""
+        self.active = True
+        self._schedule()
+
+    def pause(self):
+        """Stop checking until resume() is called."""
+        self.active = False
+        self.timer.stop()
+        self._abort()
+
+    def stop(self):
+        """Stop checking for good, e.g. when the plugin is unloaded."""
+        self.pause()
+        self.idle_timer.stop()
+        try:
+            QApplication.instance().applicationStateChanged.disconnect(self._on_application_state_changed)
+        except TypeError:
+            pass
+
+    def check(self):
+        """Fetch the update times of the reference model."""
+        self.timer.stop()
+        if self._reply is not None:
+            return
+        url = self.service.provider.model_meta_url(open_meteo.REFERENCE_MODEL)
+        if url is None:
+            # The source publishes no model runs, refresh every FALLBACK_INTERVAL_S
+            self._plan(None, self.FALLBACK_INTERVAL_S)
+            return
+        request = QNetworkRequest(QUrl(url))
+        request.setAttribute(QNetworkRequest.FollowRedirectsAttribute, True)
+        request.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.PreferNetwork)
+        request.setPriority(QNetworkRequest.LowPriority)
+        self._reply = self.network.get(request)
+        self._reply.finished.connect(self._on_finished)
+        self.checks += 1
+
+    def _schedule(self):
+        """Start the timer for the next check, or check now if it is overdue."""
+        if not self.active or self.idle:
+            return
+        if self.next_check is None or self.next_check <= time.time():
+            self.check()
+        else:
+            self.timer.start(int((self.next_check - time.time()) * 1000))
+
+    def _abort(self):
+        """Abort a check in progress."""
+        if self._reply is not None:
+            reply, self._reply = self._reply, None
+            reply.finished.disconnect(self._on_finished)
+            reply.abort()
+            reply.deleteLater()
+
+    def _on_finished(self):
+        """Emit refreshDue if a newer model run was published and plan the next check."""
+        reply, self._reply = self._reply, None
+        reply.deleteLater()
+        try:
+            if reply.error() != QNetworkReply.NoError:
+                raise ValueError(reply.errorString())
+            available, interval = open_meteo.parse_model_update(bytes(reply.readAll()))
+        except ValueError as e:
+            QgsMessageLog.logMessage(f"Could not check for new model runs: {e}", 'Weather Dock', Qgis.Info)
+            available, interval = None, self.FALLBACK_INTERVAL_S
+        self._plan(available, interval)
+
+    def _plan(self, available, interval):
+        """Emit refreshDue for a newer model run and schedule the next check.
+
+        :param available: UTC epoch the latest model run became available, None if unknown.
+        """
+        now = time.time()
+        if available is None and (self.last_run is None or now - self.last_run >= interval):
+            # Without the meta document assume a new run every interval
+            available = now
+
+        if available is not None:
+            # The first check only learns the latest run, the shown forecasts were just fetched
+            if self.last_run is not None and available > self.last_run:
+                self.refreshes += 1
+                self.refreshDue.emit(available)
+            self.last_run = max(self.last_run or 0.0, available)
+
+        expected_run = self.last_run + interval + self.AVAILABILITY_MARGIN_S
+        self.next_check = max(expected_run, now + self.MIN_CHECK_INTERVAL_S, self.service.fresh_until)
+        self.next_check += random.uniform(0, self.MAX_JITTER_S)
+        self._schedule()
+
+    def _on_application_state_changed(self, state):
+        """Pause while QGIS stays in the background, catch up when it is used again."""
+        if state == Qt.ApplicationActive:
+            self.idle_timer.stop()
+            if self.idle:
+                self.idle = False
+                self._schedule()
+        elif not self.idle and not self.idle_timer.isActive():
+            self.idle_timer.start(self.IDLE_AFTER_S * 1000)
+
+    def _on_idle(self):
+        """Stop checking while QGIS is idle."""
+        self.idle = True
+        self.timer.stop()
+        self._abort()
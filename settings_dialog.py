@@ -6,8 +6,13 @@
  ***************************************************************************/
 """
 
+import json
+
 from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtCore import QSettings
+from PyQt5.QtCore import QSettings, Qt
+
+from . import open_meteo
+from .providers import PROVIDER_LABELS, create_provider
 
 
 class SettingsDialog(QtWidgets.QDialog):
@@ -16,10 +21,39 @@ class SettingsDialog(QtWidgets.QDialog):
     # Define setting keys as constants
     FORECAST_DAYS_KEY = "weatherdock/forecast_days"
     DEFAULT_FORECAST_DAYS = 1
+    MAX_FORECAST_DAYS = 16
+    DISPLAY_MODE_KEY = "weatherdock/display_mode"
+    DISPLAY_MODE_HTML = "html"
+    DISPLAY_MODE_TABLE = "table"
+    CACHE_TTL_KEY = "weatherdock/cache_ttl_minutes"
+    DEFAULT_CACHE_TTL_MINUTES = 30
+    CACHE_MAX_ENTRIES_KEY = "weatherdock/cache_max_entries"
+    DEFAULT_CACHE_MAX_ENTRIES = 64
+    PREFETCH_ENABLED_KEY = "weatherdock/prefetch_enabled"
+    AUTO_REFRESH_KEY = "weatherdock/auto_refresh"
+    REQUEST_RATE_KEY = "weatherdock/request_rate"
+    REQUEST_BURST_KEY = "weatherdock/request_burst"
+    DEBUG_METRICS_KEY = "weatherdock/debug_metrics"
+    PROVIDER_KEY = "weatherdock/provider"
+    PROVIDER_URL_KEY = "weatherdock/provider_url"
+    FIXTURE_DIRECTORY_KEY = "weatherdock/fixture_directory"
+    VARIABLES_KEY = "weatherdock/hourly_variables"
+    TEMPORAL_LAYER_KEY = "weatherdock/temporal_layer"
+    TEMPORAL_SOURCE_KEY = "weatherdock/temporal_source"
+    TEMPORAL_SOURCE_CENTER = "center"
+    TEMPORAL_SOURCE_GRID = "grid"
+    WATCHLIST_KEY = "weatherdock/watchlist"
+    OVERLAY_ENABLED_KEY = "weatherdock/overlay_enabled"
+    GRID_ENABLED_KEY = "weatherdock/grid_enabled"
+    GRID_ROWS_KEY = "weatherdock/grid_rows"
+    GRID_COLUMNS_KEY = "weatherdock/grid_columns"
+    DEFAULT_GRID_SIZE = 5
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, cache=None, service=None):
         """Constructor."""
         super(SettingsDialog, self).__init__(parent)
+        self.cache = cache
+        self.service = service
 
         self.setWindowTitle("Weather Dock Settings")
         self.setMinimumWidth(300)
@@ -31,15 +65,158 @@ class SettingsDialog(QtWidgets.QDialog):
         days_group = QtWidgets.QGroupBox("Forecast Duration")
         days_layout = QtWidgets.QHBoxLayout(days_group)
 
-        days_label = QtWidgets.QLabel("Number of days to forecast (1-7):")
+        days_label = QtWidgets.QLabel(f"Number of days to forecast (1-{self.MAX_FORECAST_DAYS}):")
         self.days_spinbox = QtWidgets.QSpinBox()
-        self.days_spinbox.setRange(1, 7)
+        self.days_spinbox.setRange(1, self.MAX_FORECAST_DAYS)
         self.days_spinbox.setToolTip("Select how many days of hourly forecast data to fetch and display.")
 
         days_layout.addWidget(days_label)
         days_layout.addWidget(self.days_spinbox)
         layout.addWidget(days_group)
 
+        # Display Mode Setting
+        display_group = QtWidgets.QGroupBox("Display")
+        display_layout = QtWidgets.QHBoxLayout(display_group)
+        self.display_combo = QtWidgets.QComboBox()
+        self.display_combo.addItem("HTML page", self.DISPLAY_MODE_HTML)
+        self.display_combo.addItem("Table with temperature chart", self.DISPLAY_MODE_TABLE)
+        self.display_combo.setToolTip("The table view stays fast for long forecasts since it only draws the visible rows.")
+        display_layout.addWidget(QtWidgets.QLabel("Show forecast as:"))
+        display_layout.addWidget(self.display_combo)
+        layout.addWidget(display_group)
+
+        # Weather Provider Settings
+        provider_group = QtWidgets.QGroupBox("Weather Provider")
+        provider_layout = QtWidgets.QFormLayout(provider_group)
+        self.provider_combo = QtWidgets.QComboBox()
+        for provider_id, label in PROVIDER_LABELS:
+            self.provider_combo.addItem(label, provider_id)
+        provider_layout.addRow("Fetch forecasts from:", self.provider_combo)
+
+        self.provider_url_edit = QtWidgets.QLineEdit()
+        self.provider_url_edit.setPlaceholderText("https://weather.example.com")
+        self.provider_url_edit.setToolTip("Root URL of a self-hosted Open-Meteo instance, without /v1/forecast.")
+        provider_layout.addRow("Server URL:", self.provider_url_edit)
+
+        fixture_layout = QtWidgets.QHBoxLayout()
+        self.fixture_directory_edit = QtWidgets.QLineEdit()
+        self.fixture_directory_edit.setToolTip("Directory of archived forecast API responses (*.json) to replay.")
+        fixture_button = QtWidgets.QToolButton()
+        fixture_button.setText("...")
+        fixture_button.clicked.connect(self.browse_fixture_directory)
+        fixture_layout.addWidget(self.fixture_directory_edit)
+        fixture_layout.addWidget(fixture_button)
+        provider_layout.addRow("Fixture directory:", fixture_layout)
+
+        self.provider_combo.currentIndexChanged.connect(self.update_provider_fields)
+        self.fixture_directory_edit.editingFinished.connect(self.update_variables)
+        layout.addWidget(provider_group)
+
+        # Variable Selection
+        variables_group = QtWidgets.QGroupBox("Variables")
+        variables_layout = QtWidgets.QVBoxLayout(variables_group)
+        self.variables_list = QtWidgets.QListWidget()
+        self.variables_list.setToolTip("Only the checked variables are downloaded, parsed and shown.")
+        self.variables_list.setMaximumHeight(self.variables_list.fontMetrics().height() * 6 + 12)
+        variables_layout.addWidget(self.variables_list)
+        layout.addWidget(variables_group)
+
+        # Forecast Cache Settings
+        cache_group = QtWidgets.QGroupBox("Forecast Cache")
+        cache_layout = QtWidgets.QFormLayout(cache_group)
+
+        self.cache_ttl_spinbox = QtWidgets.QSpinBox()
+        self.cache_ttl_spinbox.setRange(0, 24 * 60)
+        self.cache_ttl_spinbox.setSuffix(" min")
+        self.cache_ttl_spinbox.setToolTip("How long a cached forecast is reused before it is fetched again (0 disables the cache).")
+        cache_layout.addRow("Keep forecasts for:", self.cache_ttl_spinbox)
+
+        self.cache_size_spinbox = QtWidgets.QSpinBox()
+        self.cache_size_spinbox.setRange(1, 10000)
+        self.cache_size_spinbox.setToolTip("Maximum number of map locations kept in the cache.")
+        cache_layout.addRow("Maximum cached locations:", self.cache_size_spinbox)
+
+        self.prefetch_checkbox = QtWidgets.QCheckBox("Prefetch forecasts in the panning direction")
+        self.prefetch_checkbox.setToolTip("While the map is panned, fetch the forecasts of the locations ahead in the background.")
+        cache_layout.addRow(self.prefetch_checkbox)
+
+        self.auto_refresh_checkbox = QtWidgets.QCheckBox("Refresh when a new weather model run is published")
+        self.auto_refresh_checkbox.setToolTip("While the dock is visible, refetch the shown forecasts once new model output is available.")
+        cache_layout.addRow(self.auto_refresh_checkbox)
+
+        if self.cache is not None:
+            stats = self.cache.stats()
+            stats_label = QtWidgets.QLabel(
+                f"{stats['entries']}/{stats['max_entries']} entries, {stats['hits']} hits, "
+                f"{stats['misses']} misses, {stats['evictions']} evictions"
+            )
+            cache_layout.addRow("Usage:", stats_label)
+            prefetch_label = QtWidgets.QLabel(
+                f"{stats['prefetch_hits']} of {stats['prefetched']} prefetched forecasts used"
+            )
+            cache_layout.addRow("Prefetch:", prefetch_label)
+
+        layout.addWidget(cache_group)
+
+        # Request Rate Settings
+        network_group = QtWidgets.QGroupBox("Requests")
+        network_layout = QtWidgets.QFormLayout(network_group)
+
+        self.request_rate_spinbox = QtWidgets.QDoubleSpinBox()
+        self.request_rate_spinbox.setRange(0.1, 50.0)
+        self.request_rate_spinbox.setSingleStep(0.5)
+        self.request_rate_spinbox.setSuffix(" /s")
+        self.request_rate_spinbox.setToolTip("Average number of requests per second sent to the weather service.")
+        network_layout.addRow("Request rate:", self.request_rate_spinbox)
+
+        self.request_burst_spinbox = QtWidgets.QSpinBox()
+        self.request_burst_spinbox.setRange(1, 100)
+        self.request_burst_spinbox.setToolTip("Number of requests that may be sent at once before the rate applies.")
+        network_layout.addRow("Burst:", self.request_burst_spinbox)
+
+        if self.service is not None:
+            stats = self.service.stats()
+            network_layout.addRow("Usage:", QtWidgets.QLabel(
+                f"{stats['queued']} queued, {stats['in_flight']} in flight, {stats['coalesced']} coalesced, "
+                f"{stats['throttled']} throttled, {stats['retries']} retries"
+            ))
+
+        self.debug_metrics_checkbox = QtWidgets.QCheckBox("Show timing metrics in a debug tab")
+        self.debug_metrics_checkbox.setToolTip(
+            "Adds a \"Metrics\" tab with the latency of every stage of an update and logs each update to the message log.")
+        network_layout.addRow(self.debug_metrics_checkbox)
+
+        layout.addWidget(network_group)
+
+        # Grid Sampling Settings
+        self.grid_group = QtWidgets.QGroupBox("Sample Grid Over Map Extent")
+        self.grid_group.setCheckable(True)
+        self.grid_group.setToolTip("Fetch the current weather for a grid of points over the map extent into the \"Weather Grid\" layer.")
+        grid_layout = QtWidgets.QFormLayout(self.grid_group)
+
+        self.grid_rows_spinbox = QtWidgets.QSpinBox()
+        self.grid_rows_spinbox.setRange(1, 20)
+        grid_layout.addRow("Rows:", self.grid_rows_spinbox)
+
+        self.grid_columns_spinbox = QtWidgets.QSpinBox()
+        self.grid_columns_spinbox.setRange(1, 20)
+        grid_layout.addRow("Columns:", self.grid_columns_spinbox)
+
+        layout.addWidget(self.grid_group)
+
+        # Temporal Layer Settings
+        self.temporal_group = QtWidgets.QGroupBox("Publish Forecast as Temporal Layer")
+        self.temporal_group.setCheckable(True)
+        self.temporal_group.setToolTip(
+            "Write all forecast hours to the \"Weather Forecast\" layer, to step through them with the Temporal Controller.")
+        temporal_layout = QtWidgets.QFormLayout(self.temporal_group)
+        self.temporal_source_combo = QtWidgets.QComboBox()
+        self.temporal_source_combo.addItem("Map center", self.TEMPORAL_SOURCE_CENTER)
+        self.temporal_source_combo.addItem("Sampled grid", self.TEMPORAL_SOURCE_GRID)
+        self.temporal_source_combo.setToolTip("The sampled grid needs grid sampling to be enabled.")
+        temporal_layout.addRow("Locations:", self.temporal_source_combo)
+        layout.addWidget(self.temporal_group)
+
         # --- Dialog Buttons ---
         button_box = QtWidgets.QDialogButtonBox(
             QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel
@@ -58,11 +235,82 @@ class SettingsDialog(QtWidgets.QDialog):
         settings = QSettings()
         forecast_days = settings.value(self.FORECAST_DAYS_KEY, self.DEFAULT_FORECAST_DAYS, type=int)
         self.days_spinbox.setValue(forecast_days)
+        self.display_combo.setCurrentIndex(max(self.display_combo.findData(self.get_display_mode()), 0))
+        self.provider_combo.setCurrentIndex(max(self.provider_combo.findData(self.get_provider_id()), 0))
+        self.provider_url_edit.setText(settings.value(self.PROVIDER_URL_KEY, "", type=str))
+        self.fixture_directory_edit.setText(settings.value(self.FIXTURE_DIRECTORY_KEY, "", type=str))
+        self.update_provider_fields()
+        self.update_variables(self.get_hourly_variables())
+        self.cache_ttl_spinbox.setValue(self.get_cache_ttl_minutes())
+        self.cache_size_spinbox.setValue(self.get_cache_max_entries())
+        self.prefetch_checkbox.setChecked(self.get_prefetch_enabled())
+        self.auto_refresh_checkbox.setChecked(self.get_auto_refresh_enabled())
+        self.request_rate_spinbox.setValue(self.get_request_rate())
+        self.request_burst_spinbox.setValue(self.get_request_burst())
+        self.debug_metrics_checkbox.setChecked(self.get_debug_metrics_enabled())
+        self.grid_group.setChecked(self.get_grid_enabled())
+        self.grid_rows_spinbox.setValue(self.get_grid_rows())
+        self.grid_columns_spinbox.setValue(self.get_grid_columns())
+        self.temporal_group.setChecked(self.get_temporal_layer_enabled())
+        self.temporal_source_combo.setCurrentIndex(max(self.temporal_source_combo.findData(self.get_temporal_source()), 0))
 
     def save_settings(self):
         """Save UI settings to QSettings."""
         settings = QSettings()
         settings.setValue(self.FORECAST_DAYS_KEY, self.days_spinbox.value())
+        settings.setValue(self.DISPLAY_MODE_KEY, self.display_combo.currentData())
+        settings.setValue(self.PROVIDER_KEY, self.provider_combo.currentData())
+        settings.setValue(self.PROVIDER_URL_KEY, self.provider_url_edit.text().strip())
+        settings.setValue(self.FIXTURE_DIRECTORY_KEY, self.fixture_directory_edit.text().strip())
+        items = [self.variables_list.item(row) for row in range(self.variables_list.count())]
+        settings.setValue(self.VARIABLES_KEY, ",".join(
+            item.data(Qt.UserRole) for item in items if item.checkState() == Qt.Checked))
+        settings.setValue(self.CACHE_TTL_KEY, self.cache_ttl_spinbox.value())
+        settings.setValue(self.CACHE_MAX_ENTRIES_KEY, self.cache_size_spinbox.value())
+        settings.setValue(self.PREFETCH_ENABLED_KEY, self.prefetch_checkbox.isChecked())
+        settings.setValue(self.AUTO_REFRESH_KEY, self.auto_refresh_checkbox.isChecked())
+        settings.setValue(self.REQUEST_RATE_KEY, self.request_rate_spinbox.value())
+        settings.setValue(self.REQUEST_BURST_KEY, self.request_burst_spinbox.value())
+        settings.setValue(self.DEBUG_METRICS_KEY, self.debug_metrics_checkbox.isChecked())
+        settings.setValue(self.GRID_ENABLED_KEY, self.grid_group.isChecked())
+        settings.setValue(self.GRID_ROWS_KEY, self.grid_rows_spinbox.value())
+        settings.setValue(self.GRID_COLUMNS_KEY, self.grid_columns_spinbox.value())
+        settings.setValue(self.TEMPORAL_LAYER_KEY, self.temporal_group.isChecked())
+        settings.setValue(self.TEMPORAL_SOURCE_KEY, self.temporal_source_combo.currentData())
+
+    def update_provider_fields(self):
+        """Enable the fields the selected provider uses."""
+        provider_id = self.provider_combo.currentData()
+        self.provider_url_edit.setEnabled(provider_id == 'self_hosted')
+        self.fixture_directory_edit.setEnabled(provider_id == 'fixture')
+        self.update_variables()
+
+    def update_variables(self, selected=None):
+        """List the variables the selected provider supports, keeping the checked ones.
+
+        :param selected: Names to check instead of those checked in the list.
+        """
+        if selected is None:
+            items = [self.variables_list.item(row) for row in range(self.variables_list.count())]
+            selected = [item.data(Qt.UserRole) for item in items if item.checkState() == Qt.Checked]
+        provider = create_provider(
+            self.provider_combo.currentData(), self.provider_url_edit.text().strip(),
+            self.fixture_directory_edit.text().strip())
+        self.variables_list.clear()
+        for name in provider.supported_variables():
+            title, _, has_current = open_meteo.VARIABLES[name]
+            item = QtWidgets.QListWidgetItem(f"{title} ({name})" + ("" if has_current else ", hourly only"))
+            item.setData(Qt.UserRole, name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name in selected else Qt.Unchecked)
+            self.variables_list.addItem(item)
+
+    def browse_fixture_directory(self):
+        """Let the user pick the fixture directory."""
+        directory = QtWidgets.QFileDialog.getExistingDirectory(
+            self, "Fixture Directory", self.fixture_directory_edit.text())
+        if directory:
+            self.fixture_directory_edit.setText(directory)
 
     # Override accept() to save settings before closing
     def accept(self):
@@ -76,3 +324,124 @@ class SettingsDialog(QtWidgets.QDialog):
         """Gets the stored forecast days value from QSettings."""
         settings = QSettings()
         return settings.value(SettingsDialog.FORECAST_DAYS_KEY, SettingsDialog.DEFAULT_FORECAST_DAYS, type=int)
+
+    @staticmethod
+    def get_display_mode():
+        """Gets the stored forecast display mode from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.DISPLAY_MODE_KEY, SettingsDialog.DISPLAY_MODE_HTML, type=str)
+
+    @staticmethod
+    def get_provider_id():
+        """Gets the id of the selected weather provider from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.PROVIDER_KEY, 'open_meteo', type=str)
+
+    @staticmethod
+    def get_provider():
+        """Creates the weather provider selected in QSettings."""
+        settings = QSettings()
+        return create_provider(
+            SettingsDialog.get_provider_id(),
+            settings.value(SettingsDialog.PROVIDER_URL_KEY, "", type=str),
+            settings.value(SettingsDialog.FIXTURE_DIRECTORY_KEY, "", type=str),
+            SettingsDialog.get_hourly_variables())
+
+    @staticmethod
+    def get_hourly_variables():
+        """Gets the selected hourly variables from QSettings, the defaults if none is selected."""
+        settings = QSettings()
+        stored = settings.value(SettingsDialog.VARIABLES_KEY, "", type=str).split(",")
+        selected = tuple(name for name in open_meteo.VARIABLES if name in stored)
+        return selected or open_meteo.HOURLY_VARIABLES
+
+    @staticmethod
+    def get_cache_ttl_minutes():
+        """Gets the stored forecast cache time-to-live in minutes from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.CACHE_TTL_KEY, SettingsDialog.DEFAULT_CACHE_TTL_MINUTES, type=int)
+
+    @staticmethod
+    def get_cache_max_entries():
+        """Gets the stored maximum number of cached forecasts from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.CACHE_MAX_ENTRIES_KEY, SettingsDialog.DEFAULT_CACHE_MAX_ENTRIES, type=int)
+
+    @staticmethod
+    def get_prefetch_enabled():
+        """Gets whether forecasts ahead of the panning direction are prefetched from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.PREFETCH_ENABLED_KEY, True, type=bool)
+
+    @staticmethod
+    def get_auto_refresh_enabled():
+        """Gets whether forecasts are refreshed when new model runs are published from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.AUTO_REFRESH_KEY, True, type=bool)
+
+    @staticmethod
+    def get_request_rate():
+        """Gets the stored number of requests per second from QSettings."""
+        from .fetch_service import DEFAULT_REQUEST_RATE  # Not at startup, the network stack loads with the dock
+        settings = QSettings()
+        return settings.value(SettingsDialog.REQUEST_RATE_KEY, DEFAULT_REQUEST_RATE, type=float)
+
+    @staticmethod
+    def get_request_burst():
+        """Gets the stored number of requests that may be sent at once from QSettings."""
+        from .fetch_service import DEFAULT_REQUEST_BURST
+        settings = QSettings()
+        return settings.value(SettingsDialog.REQUEST_BURST_KEY, DEFAULT_REQUEST_BURST, type=int)
+
+    @staticmethod
+    def get_debug_metrics_enabled():
+        """Gets whether the debug metrics tab is shown from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.DEBUG_METRICS_KEY, False, type=bool)
+
+    @staticmethod
+    def get_grid_enabled():
+        """Gets whether grid sampling of the map extent is enabled from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.GRID_ENABLED_KEY, False, type=bool)
+
+    @staticmethod
+    def get_grid_rows():
+        """Gets the stored number of grid sampling rows from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.GRID_ROWS_KEY, SettingsDialog.DEFAULT_GRID_SIZE, type=int)
+
+    @staticmethod
+    def get_grid_columns():
+        """Gets the stored number of grid sampling columns from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.GRID_COLUMNS_KEY, SettingsDialog.DEFAULT_GRID_SIZE, type=int)
+
+    @staticmethod
+    def get_watchlist():
+        """Gets the pinned sites as a list of {name, latitude, longitude} dicts from QSettings."""
+        settings = QSettings()
+        try:
+            sites = json.loads(settings.value(SettingsDialog.WATCHLIST_KEY, "[]", type=str))
+            return [{'name': str(site['name']), 'latitude': float(site['latitude']),
+                     'longitude': float(site['longitude'])} for site in sites]
+        except (ValueError, TypeError, KeyError):
+            return []
+
+    @staticmethod
+    def get_overlay_enabled():
+        """Gets whether weather glyphs are drawn on the map canvas from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.OVERLAY_ENABLED_KEY, False, type=bool)
+
+    @staticmethod
+    def get_temporal_layer_enabled():
+        """Gets whether forecasts are published as a temporal layer from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.TEMPORAL_LAYER_KEY, False, type=bool)
+
+    @staticmethod
+    def get_temporal_source():
+        """Gets which locations are published to the temporal layer from QSettings."""
+        settings = QSettings()
+        return settings.value(SettingsDialog.TEMPORAL_SOURCE_KEY, SettingsDialog.TEMPORAL_SOURCE_CENTER, type=str)
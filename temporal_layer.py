@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastTemporalLayer
+ Publishes fetched forecasts as a memory layer for the Temporal Controller.
+ ***************************************************************************/
+"""
+
+import math
+
+from PyQt5.QtCore import QDateTime, QVariant, Qt
+from PyQt5.QtGui import QColor
+
+from qgis.core import (
+    QgsDateTimeRange,
+    QgsFeature,
+    QgsField,
+    QgsGeometry,
+    QgsGradientColorRamp,
+    QgsInterval,
+    QgsMarkerSymbol,
+    QgsPalLayerSettings,
+    QgsProject,
+    QgsProperty,
+    QgsSingleSymbolRenderer,
+    QgsStyle,
+    QgsSymbolLayer,
+    QgsTemporalNavigationObject,
+    QgsVectorDataProvider,
+    QgsVectorLayer,
+    QgsVectorLayerSimpleLabeling,
+    QgsVectorLayerTemporalProperties,
+)
+
+from .open_meteo import value_template
+
+
+class ForecastTemporalLayer:
+    """Keeps a temporal point layer with one feature per location and forecast hour.
+
+    All hours are written in one go when new forecasts arrive, ordered by
+    hour, each with its values, a precomputed color and a label. The layer
+    filters them by their start and end fields, so stepping or scrubbing
+    through the hours in the Temporal Controller only redraws the layer: it
+    never refetches forecasts, rebuilds features or evaluates a color ramp.
+    """
+
+    LAYER_NAME = "Weather Forecast"
+    LAYER_URI = (
+        "Point?crs=EPSG:4326"
+        "&field=location:integer&field=latitude:double&field=longitude:double"
+        "&field=start:datetime&field=end:datetime&field=color:string(9)&field=label:string(24)"
+    )
+    COLOR_RAMP = 'Spectral'  # Inverted, so low values are blue and high values red
+
+    def __init__(self, iface):
+        """Constructor."""
+        self.iface = iface
+        self.layer_id = None
+        self._forecasts = []  # Forecasts of the published features, to skip republishing them
+
+    def publish(self, samples):
+        """Replace the features of the layer with the hours of the given forecasts.
+
+        :param samples: List of (QgsPointXY in WGS 84, Forecast or None) tuples.
+        """
+        samples = [(point, forecast) for point, forecast in samples if forecast is not None and len(forecast)]
+        forecasts = [forecast for _, forecast in samples]
+        layer = QgsProject.instance().mapLayer(self.layer_id) if self.layer_id else None
+        if layer is not None and len(forecasts) == len(self._forecasts) and all(
+                forecast is published for forecast, published in zip(forecasts, self._forecasts)):
+            return  # The same forecasts are already on the layer
+        self._forecasts = forecasts
+        if not samples:
+            if layer is not None:
+                layer.dataProvider().truncate()
+                layer.triggerRepaint()
+            return
+
+        names = list(dict.fromkeys(name for forecast in forecasts for name in forecast.hourly))
+        created = layer is None
+        if created:
+            layer = self._create_layer()
+        self._add_fields(layer, names)
+        fields = layer.fields()
+        value_indexes = [fields.indexOf(name) for name in names]
+        start_index, end_index = fields.indexOf('start'), fields.indexOf('end')
+        color_index, label_index = fields.indexOf('color'), fields.indexOf('label')
+
+        # The first variable drives the symbology, on one scale over all hours and locations
+        styled = names[0]
+        colors = self._color_scale(forecasts, styled)
+
+        # One QDateTime per hour, shared by all locations
+        epochs = sorted({epoch for forecast in forecasts for epoch in forecast.times()})
+        times = {epoch: QDateTime.fromSecsSinceEpoch(epoch, Qt.UTC) for epoch in epochs}
+        geometries = [QgsGeometry.fromPointXY(point) for point, _ in samples]
+        templates = [value_template(styled, forecast.hourly_units.get(styled, '')) for forecast in forecasts]
+
+        features = []
+        for epoch in epochs:
+            for location, (point, forecast) in enumerate(samples):
+                index = (epoch - forecast.start) // forecast.step
+                if not 0 <= index < len(forecast) or forecast.start + index * forecast.step != epoch:
+                    continue
+                attributes = [None] * fields.count()
+                attributes[0:3] = [location, point.y(), point.x()]
+                attributes[start_index] = times[epoch]
+                attributes[end_index] = times.get(epoch + forecast.step) or QDateTime.fromSecsSinceEpoch(
+                    epoch + forecast.step, Qt.UTC)
+                for name, field_index in zip(names, value_indexes):
+                    attributes[field_index] = forecast.value_at(name, index)
+                value = forecast.value_at(styled, index)
+                if value is not None:
+                    attributes[color_index] = colors(value)
+                    attributes[label_index] = templates[location].format(value)
+                feature = QgsFeature(fields)
+                feature.setGeometry(geometries[location])
+                feature.setAttributes(attributes)
+                features.append(feature)
+
+        provider = layer.dataProvider()
+        provider.truncate()
+        provider.addFeatures(features)  # One bulk insert for all hours
+        layer.updateExtents()
+        layer.triggerRepaint()
+        self._update_navigation(epochs[0], epochs[-1] + forecasts[0].step, forecasts[0].step, created)
+
+    def _create_layer(self):
+        """Create the layer with its temporal properties and precomputed symbology."""
+        layer = QgsVectorLayer(self.LAYER_URI, self.LAYER_NAME, "memory")
+        properties = layer.temporalProperties()
+        properties.setMode(QgsVectorLayerTemporalProperties.ModeFeatureDateTimeStartAndEndFromFields)
+        properties.setStartField('start')
+        properties.setEndField('end')
+        properties.setIsActive(True)
+
+        # Colors and labels are read from fields instead of being evaluated per frame
+        symbol = QgsMarkerSymbol.createSimple({'name': 'circle', 'size': '4', 'outline_color': '#404040'})
+        symbol.symbolLayer(0).setDataDefinedProperty(QgsSymbolLayer.PropertyFillColor, QgsProperty.fromField('color'))
+        layer.setRenderer(QgsSingleSymbolRenderer(symbol))
+        labels = QgsPalLayerSettings()
+        labels.fieldName = 'label'
+        labels.placement = QgsPalLayerSettings.OverPoint
+        labels.yOffset = -3.0
+        layer.setLabeling(QgsVectorLayerSimpleLabeling(labels))
+        layer.setLabelsEnabled(True)
+
+        provider = layer.dataProvider()
+        if provider.capabilities() & QgsVectorDataProvider.CreateAttributeIndex:
+            provider.createAttributeIndex(layer.fields().indexOf('start'))
+        QgsProject.instance().addMapLayer(layer)
+        self.layer_id = layer.id()
+        return layer
+
+    @staticmethod
+    def _add_fields(layer, names):
+        """Add a field for every variable the layer does not have yet, keeping the user's styling."""
+        missing = [QgsField(name, QVariant.Double) for name in names if layer.fields().indexOf(name) < 0]
+        if missing:
+            layer.dataProvider().addAttributes(missing)
+            layer.updateFields()
+
+    def _color_scale(self, forecasts, name):
+        """Return a function mapping a value of name to a color, spread over its range in the forecasts."""
+        values = [value for forecast in forecasts for value in forecast.hourly.get(name, ()) if not math.isnan(value)]
+        low, high = (min(values), max(values)) if values else (0.0, 1.0)
+        span = (high - low) or 1.0
+        ramp = QgsStyle.defaultStyle().colorRamp(self.COLOR_RAMP)
+        if ramp is None:
+            ramp = QgsGradientColorRamp(QColor('#d7191c'), QColor('#2b83ba'))
+        ramp.invert()
+        # The ramp is sampled once, values pick the nearest of the precomputed colors
+        palette = [ramp.color(step / 255.0).name() for step in range(256)]
+        return lambda value: palette[int(round((value - low) / span * 255))]
+
+    def _update_navigation(self, start, end, step, created):
+        """Set the Temporal Controller to the forecast hours, one hour per frame."""
+        controller = self.iface.mapCanvas().temporalController()
+        if not isinstance(controller, QgsTemporalNavigationObject):
+            return
+        controller.setTemporalExtents(QgsDateTimeRange(
+            QDateTime.fromSecsSinceEpoch(start, Qt.UTC), QDateTime.fromSecsSinceEpoch(end, Qt.UTC)))
+        if created:
+            controller.setFrameDuration(QgsInterval(step))
+            if controller.navigationMode() == QgsTemporalNavigationObject.NavigationOff:
+                controller.setNavigationMode(QgsTemporalNavigationObject.Animated)
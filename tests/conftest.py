@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ Shared test setup: imports the plugin directory as a package.
+ ***************************************************************************/
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(TESTS_DIR)
+PACKAGE = 'weather_dock_plugin'
+
+sys.path.insert(0, os.path.join(PLUGIN_DIR, 'benchmarks'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def import_plugin_module(name):
+    """Import a module of the plugin, whatever the checkout is named."""
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE, os.path.join(PLUGIN_DIR, '__init__.py'), submodule_search_locations=[PLUGIN_DIR])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f'{PACKAGE}.{name}')
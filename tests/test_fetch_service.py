@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherFetchService tests
+ Run against the local forecast API stand-in of the benchmarks, with the
+ Python of a QGIS installation:
+     python -m pytest tests
+ ***************************************************************************/
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip('qgis.core')
+
+from PyQt5.QtCore import QEventLoop  # noqa: E402
+from qgis.core import QgsApplication  # noqa: E402
+
+from conftest import import_plugin_module  # noqa: E402
+from fake_open_meteo import FakeOpenMeteoServer  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    """A QGIS application for the network stack."""
+    application = QgsApplication.instance() or QgsApplication([], False)
+    application.initQgis()
+    return application
+
+
+@pytest.fixture(scope='module')
+def plugin():
+    """The plugin modules under test."""
+    return {name: import_plugin_module(name) for name in ('fetch_service', 'providers')}
+
+
+@pytest.fixture
+def server():
+    """The forecast API stand-in, slow enough for a second request to join the first."""
+    fake_server = FakeOpenMeteoServer(latency=0.2, seed=1).start()
+    yield fake_server
+    fake_server.stop()
+
+
+def wait_until(app, condition, timeout=10.0):
+    """Process events until condition() is true, return False on timeout."""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() >= deadline:
+            return False
+        app.processEvents(QEventLoop.AllEvents, 5)
+        time.sleep(0.001)
+    return True
+
+
+def test_fetch_joining_a_one_point_batch_gets_its_own_signal(app, plugin, server):
+    """A fetch() of the cell of a pending one-point fetch_batch() shares its request but not its signal."""
+    provider = plugin['providers'].OpenMeteoProvider(base_url=server.url)
+    bucket = plugin['fetch_service'].TokenBucket(100.0, 100)
+    service = plugin['fetch_service'].WeatherFetchService(bucket=bucket, provider=provider)
+    received, batches, failures = {}, {}, {}
+    service.forecastReceived.connect(lambda request_id, forecast: received.__setitem__(request_id, forecast))
+    service.batchReceived.connect(lambda request_id, forecasts: batches.__setitem__(request_id, forecasts))
+    service.forecastFailed.connect(lambda request_id, message: failures.__setitem__(request_id, message))
+
+    batch_id = service.fetch_batch([(52.5, 13.4)], 1)
+    fetch_id = service.fetch(52.5, 13.4, 1)
+
+    assert wait_until(app, lambda: batch_id in batches and fetch_id in received)
+    assert service.coalesced == 1
+    assert server.stats['requests'] == 1
+    assert not failures
+    assert batch_id not in received and fetch_id not in batches
+    assert len(batches[batch_id]) == 1
+    assert received[fetch_id] is batches[batch_id][0]
+
+
+def test_batch_joining_a_fetch_gets_a_list(app, plugin, server):
+    """A one-point fetch_batch() joining a pending fetch() is answered with a list."""
+    provider = plugin['providers'].OpenMeteoProvider(base_url=server.url)
+    bucket = plugin['fetch_service'].TokenBucket(100.0, 100)
+    service = plugin['fetch_service'].WeatherFetchService(bucket=bucket, provider=provider)
+    received, batches = {}, {}
+    service.forecastReceived.connect(lambda request_id, forecast: received.__setitem__(request_id, forecast))
+    service.batchReceived.connect(lambda request_id, forecasts: batches.__setitem__(request_id, forecasts))
+
+    fetch_id = service.fetch(52.5, 13.4, 1)
+    batch_id = service.fetch_batch([(52.5, 13.4)], 1)
+
+    assert wait_until(app, lambda: batch_id in batches and fetch_id in received)
+    assert server.stats['requests'] == 1
+    assert batches[batch_id] == [received[fetch_id]]
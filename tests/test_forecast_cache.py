@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastCache tests
+ ***************************************************************************/
+"""
+
+from array import array
+
+import pytest
+
+from conftest import import_plugin_module
+
+
+@pytest.fixture(scope='module')
+def plugin():
+    """The plugin modules under test."""
+    return {name: import_plugin_module(name) for name in ('forecast_cache', 'forecast_data')}
+
+
+def test_forecast_not_covering_the_window_is_a_miss(plugin):
+    """A cached forecast that needs a delta fetch is not counted as a hit, and stays cached."""
+    forecast_data = plugin['forecast_data']
+    cache = plugin['forecast_cache'].ForecastCache()
+    start = 1700000000 // forecast_data.HOUR_SECONDS * forecast_data.HOUR_SECONDS
+    forecast = forecast_data.Forecast(52.5, 13.4, start, forecast_data.HOUR_SECONDS,
+                                      {'temperature_2m': array('f', [1.0] * 24)})
+    key = cache.cell_key(52.5, 13.4, 1)
+    cache.put(key, forecast)
+
+    assert cache.get(key, (start + forecast_data.HOUR_SECONDS, start + 25 * forecast_data.HOUR_SECONDS)) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.peek(key) is forecast
+    assert cache.get(key, (start, start + 24 * forecast_data.HOUR_SECONDS)) is forecast
+    assert (cache.hits, cache.misses) == (1, 1)
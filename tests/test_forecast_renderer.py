@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ ForecastRenderer tests
+ ***************************************************************************/
+"""
+
+from array import array
+
+import pytest
+
+from conftest import import_plugin_module
+
+
+@pytest.fixture(scope='module')
+def plugin():
+    """The plugin modules under test."""
+    return {name: import_plugin_module(name) for name in ('forecast_renderer', 'forecast_data')}
+
+
+def make_forecast(forecast_data, current_temperature):
+    """Return a two day forecast with the given current temperature."""
+    start = 1700000000 // forecast_data.HOUR_SECONDS * forecast_data.HOUR_SECONDS
+    return forecast_data.Forecast(
+        52.5, 13.4, start, forecast_data.HOUR_SECONDS, {'temperature_2m': array('f', [1.0] * 48)},
+        {'temperature_2m': '°C'}, {'temperature_2m': current_temperature}, {'temperature_2m': '°C'}, start)
+
+
+def test_new_current_values_leave_the_table_unchanged(plugin):
+    """A refresh that only changed the current values can keep the hourly table."""
+    renderer = plugin['forecast_renderer'].ForecastRenderer()
+    first = make_forecast(plugin['forecast_data'], 5.0)
+    second = make_forecast(plugin['forecast_data'], 7.0)
+    assert renderer.render_table(first, 2) == renderer.render_table(second, 2)
+    assert renderer.render_top(first) != renderer.render_top(second)
+    # The page only depends on the data, not on the wall clock
+    assert renderer.render(first, 2) == renderer.render(first, 2)
+    assert f'name="{plugin["forecast_renderer"].TABLE_ANCHOR}"' in renderer.render_table(first, 2)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherProvider tests
+ ***************************************************************************/
+"""
+
+import pytest
+
+pytest.importorskip('PyQt5.QtCore')
+
+from conftest import import_plugin_module  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def providers():
+    """The providers module."""
+    return import_plugin_module('providers')
+
+
+def test_fixture_directories_have_different_cache_keys(providers, tmp_path):
+    """Switching the fixture directory is a change of source."""
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.mkdir()
+    second.mkdir()
+    assert (providers.FixtureProvider(str(first)).cache_key()
+            != providers.FixtureProvider(str(second)).cache_key())
+    assert (providers.FixtureProvider(str(first)).cache_key()
+            == providers.FixtureProvider(str(first)).cache_key())
+
+
+def test_fixture_and_open_meteo_cache_keys_differ(providers, tmp_path):
+    """Forecasts of the fixtures are never served as those of the service."""
+    assert providers.FixtureProvider(str(tmp_path)).cache_key() != providers.OpenMeteoProvider().cache_key()
+
+
+def test_unsupported_variables_are_not_requested(providers, tmp_path):
+    """A fixture provider only requests the variables its fixtures contain."""
+    (tmp_path / 'forecast.json').write_text(
+        '{"latitude": 52.5, "longitude": 13.4, "hourly": {"time": [], "temperature_2m": [], "precipitation": []}}')
+    provider = providers.FixtureProvider(str(tmp_path), ('temperature_2m', 'wind_speed_10m', 'precipitation'))
+    assert provider.supported_variables() == ('temperature_2m', 'precipitation')
+    assert provider.variables()[1] == ('temperature_2m', 'precipitation')
+    # Without a supported selection the supported defaults are requested
+    provider = providers.FixtureProvider(str(tmp_path), ('cloud_cover',))
+    assert provider.variables()[1] == ('temperature_2m',)
+
+
+def test_requested_variables_override_the_selection(providers, tmp_path):
+    """A request can ask for other variables than the selection, e.g. those the overlay draws."""
+    (tmp_path / 'forecast.json').write_text(
+        '{"latitude": 52.5, "longitude": 13.4, "hourly": {"time": [], "temperature_2m": [], "wind_speed_10m": []}}')
+    provider = providers.FixtureProvider(str(tmp_path))
+    assert provider.variables(('wind_speed_10m', 'wind_direction_10m'))[1] == ('wind_speed_10m',)
+    url = providers.OpenMeteoProvider().build_request([(52.5, 13.4)], 1, None, ('wind_direction_10m',))
+    assert 'hourly=wind_direction_10m&' in url
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ Transforms
+ Cached coordinate transformations from the map canvas to WGS 84.
+ ***************************************************************************/
+"""
+
+from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsCsException, QgsProject
+
+_WGS84_AUTHID = "EPSG:4326"
+_transforms = {}  # source CRS id -> QgsCoordinateTransform, or None if already WGS 84
+
+
+def to_wgs84_transform(source_crs):
+    """Return the cached transform from source_crs to WGS 84, or None if no transform is needed."""
+    crs_id = source_crs.authid() or source_crs.toWkt()
+    if crs_id not in _transforms:
+        dest_crs = QgsCoordinateReferenceSystem(_WGS84_AUTHID)
+        if source_crs == dest_crs:
+            _transforms[crs_id] = None
+        else:
+            _transforms[crs_id] = QgsCoordinateTransform(source_crs, dest_crs, QgsProject.instance())
+    return _transforms[crs_id]
+
+
+def clear_transform_cache():
+    """Forget all cached transforms, e.g. after the project transform context changed."""
+    _transforms.clear()
+
+
+def canvas_center_wgs84(canvas):
+    """Return the center of the map canvas as a WGS 84 QgsPointXY, or None outside the valid area of its CRS."""
+    center = canvas.center()
+    transform = to_wgs84_transform(canvas.mapSettings().destinationCrs())
+    if transform is not None:
+        try:
+            center = transform.transform(center)
+        except QgsCsException:
+            return None
+    return center
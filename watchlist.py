@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WatchlistView
+ Pinned locations watched alongside the map center, refreshed in batches.
+ ***************************************************************************/
+"""
+
+import json
+import math
+import time
+
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import QSettings, Qt
+
+from qgis.core import QgsApplication, QgsCsException, QgsPointXY, QgsProject, QgsVectorLayer, QgsWkbTypes
+
+from . import open_meteo
+from .forecast_data import forecast_window
+from .forecast_renderer import format_current
+from .forecast_table_view import ForecastTableModel
+from .open_meteo import value_template, variable_title
+from .settings_dialog import SettingsDialog
+from .transforms import canvas_center_wgs84, to_wgs84_transform
+
+
+class _Site:
+    """A pinned location and its latest forecast."""
+
+    __slots__ = ('name', 'latitude', 'longitude', 'key', 'item', 'detail')
+
+    def __init__(self, name, latitude, longitude):
+        """Constructor."""
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.key = None  # Forecast cache key for the current forecast days
+        self.item = None  # Summary row
+        self.detail = None  # ForecastTableModel of the expanded row, None while collapsed
+
+
+class WatchlistView(QtWidgets.QWidget):
+    """Summary rows of pinned locations that expand to their hourly forecast.
+
+    All sites are refreshed together: cached forecasts are shown at once and
+    the cells still missing are fetched through the shared service in
+    batched requests of up to MAX_BATCH_SIZE locations, so twenty sites cost
+    one request. Every row is updated on its own as its batch arrives.
+    """
+
+    COLUMNS = ("Site", "Now", "Next 24 h", "Updated")
+    DETAIL_ROWS = 8  # Visible rows of an expanded forecast
+    MAX_IMPORT = 200  # Sites imported at once from a layer
+
+    def __init__(self, iface, service, cache, parent=None):
+        """Constructor."""
+        super(WatchlistView, self).__init__(parent)
+        self.iface = iface
+        self.service = service
+        self.cache = cache
+        self.sites = [_Site(site['name'], site['latitude'], site['longitude'])
+                      for site in SettingsDialog.get_watchlist()]
+        self._pending = {}  # request id -> cache keys in request order
+        layout = QtWidgets.QVBoxLayout(self)
+
+        buttons = QtWidgets.QHBoxLayout()
+        for text, tooltip, slot in (
+                ("Pin Center", "Pin the center of the map.", self.pin_map_center),
+                ("Import Layer", "Pin the selected, or all, features of the active point layer.", self.import_layer),
+                ("Import Bookmarks", "Pin the centers of the spatial bookmarks.", self.import_bookmarks),
+                ("Remove", "Unpin the selected sites.", self.remove_selected),
+                ("Refresh", "Refresh the forecasts of all sites.", self.refresh)):
+            button = QtWidgets.QPushButton(text)
+            button.setToolTip(tooltip)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setColumnCount(len(self.COLUMNS))
+        self.tree.setHeaderLabels(self.COLUMNS)
+        self.tree.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.tree.header().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        self.tree.header().setStretchLastSection(True)
+        self.tree.itemExpanded.connect(self._on_expanded)
+        self.tree.itemCollapsed.connect(self._on_collapsed)
+        self.tree.itemChanged.connect(self._on_item_changed)
+        layout.addWidget(self.tree)
+
+        self.status_label = QtWidgets.QLabel()
+        layout.addWidget(self.status_label)
+
+        for site in self.sites:
+            self._add_row(site)
+        self.service.batchReceived.connect(self._on_batch_received)
+        self.service.forecastFailed.connect(self._on_failed)
+
+    def showEvent(self, event):
+        """Refresh the sites when the tab becomes visible."""
+        super(WatchlistView, self).showEvent(event)
+        self.refresh()
+
+    def refresh(self):
+        """Show the cached forecasts of all sites and fetch the missing ones in batches."""
+        self.cancel()
+        forecast_days = SettingsDialog.get_forecast_days()
+        window = forecast_window(forecast_days)
+        missing = {}  # cache key -> cell center to fetch
+        for site in self.sites:
+            site.key = self.cache.cell_key(site.latitude, site.longitude, forecast_days)
+            forecast = self.cache.get(site.key, window)
+            if forecast is not None:
+                self._show(site, forecast.window(*window))
+            elif site.key not in missing:
+                missing[site.key] = self.cache.cell_center(site.key)
+
+        keys = list(missing)
+        for start in range(0, len(keys), open_meteo.MAX_BATCH_SIZE):
+            batch_keys = keys[start:start + open_meteo.MAX_BATCH_SIZE]
+            request_id = self.service.fetch_batch(
+                [missing[key] for key in batch_keys], forecast_days, hours=window)
+            self._pending[request_id] = batch_keys
+        if keys:
+            self.status_label.setText(
+                f"Updating {len(keys)} of {len(self.sites)} sites in {len(self._pending)} requests...")
+        else:
+            self.status_label.setText(f"{len(self.sites)} sites" if self.sites else
+                                      "No pinned sites. Pin the map center or import a layer or bookmarks.")
+
+    def cancel(self):
+        """Abort all requests of the refresh in progress."""
+        for request_id in list(self._pending):
+            self.service.abort(request_id)
+        self._pending.clear()
+
+    def release(self):
+        """Collapse all rows, freeing their forecast tables."""
+        self.tree.collapseAll()
+
+    def pin_map_center(self):
+        """Pin the center of the map canvas."""
+        center = canvas_center_wgs84(self.iface.mapCanvas())
+        if center is None:
+            QtWidgets.QMessageBox.information(
+                self, "Pin Site", "The map center is outside the area the map projection is valid for.")
+            return
+        name, accepted = QtWidgets.QInputDialog.getText(
+            self, "Pin Site", "Name:", text=f"{center.y():.3f}, {center.x():.3f}")
+        if accepted:
+            self.add_sites([(name.strip() or f"{center.y():.3f}, {center.x():.3f}", center.y(), center.x())])
+
+    def import_layer(self):
+        """Pin the selected features of the active point layer, or all of them if none is selected."""
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer) or layer.geometryType() != QgsWkbTypes.PointGeometry:
+            QtWidgets.QMessageBox.information(self, "Import Layer", "Select a point layer in the layers panel first.")
+            return
+        features = layer.selectedFeatures() if layer.selectedFeatureCount() else layer.getFeatures()
+        name_field = next((field.name() for field in layer.fields() if field.type() == QtCore.QVariant.String), None)
+        transform = to_wgs84_transform(layer.crs())
+        sites = []
+        for feature in features:
+            if len(sites) >= self.MAX_IMPORT:
+                self.status_label.setText(f"Imported the first {self.MAX_IMPORT} features only.")
+                break
+            geometry = feature.geometry()
+            if geometry.isEmpty():
+                continue
+            point = geometry.centroid().asPoint()
+            try:
+                if transform is not None:
+                    point = transform.transform(point)
+            except QgsCsException:
+                continue
+            name = feature[name_field] if name_field else None
+            sites.append((str(name) if name else f"{layer.name()} {feature.id()}", point.y(), point.x()))
+        self.add_sites(sites)
+
+    def import_bookmarks(self):
+        """Pin the centers of the project and user bookmarks."""
+        bookmarks = (QgsProject.instance().bookmarkManager().bookmarks()
+                     + QgsApplication.bookmarkManager().bookmarks())
+        sites = []
+        for bookmark in bookmarks:
+            extent = bookmark.extent()
+            point = QgsPointXY(extent.center())
+            try:
+                transform = to_wgs84_transform(extent.crs())
+                if transform is not None:
+                    point = transform.transform(point)
+            except QgsCsException:
+                continue
+            sites.append((bookmark.name(), point.y(), point.x()))
+        if not sites:
+            QtWidgets.QMessageBox.information(self, "Import Bookmarks", "There are no spatial bookmarks to import.")
+        self.add_sites(sites)
+
+    def add_sites(self, sites):
+        """Pin a list of (name, latitude, longitude) sites, skipping those already pinned, and refresh."""
+        pinned = {(round(site.latitude, 4), round(site.longitude, 4)) for site in self.sites}
+        for name, latitude, longitude in sites:
+            if (round(latitude, 4), round(longitude, 4)) in pinned:
+                continue
+            pinned.add((round(latitude, 4), round(longitude, 4)))
+            site = _Site(name, latitude, longitude)
+            self.sites.append(site)
+            self._add_row(site)
+        self._save()
+        self.refresh()
+
+    def remove_selected(self):
+        """Unpin the selected sites."""
+        selected = {id(item) for item in self.tree.selectedItems()}
+        for site in [site for site in self.sites if id(site.item) in selected]:
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(site.item))
+            if site.detail is not None:
+                site.detail.deleteLater()
+            self.sites.remove(site)
+        self._save()
+
+    def _save(self):
+        """Store the sites in the settings."""
+        QSettings().setValue(SettingsDialog.WATCHLIST_KEY, json.dumps(
+            [{'name': site.name, 'latitude': site.latitude, 'longitude': site.longitude} for site in self.sites]))
+
+    def _add_row(self, site):
+        """Add the summary row of a site, with a placeholder child so it can be expanded."""
+        site.item = QtWidgets.QTreeWidgetItem([site.name, "...", "", ""])
+        site.item.setFlags(site.item.flags() | Qt.ItemIsEditable)
+        site.item.setToolTip(0, f"{site.latitude:.4f}, {site.longitude:.4f}")
+        for column in range(1, len(self.COLUMNS)):
+            site.item.setTextAlignment(column, int(Qt.AlignRight | Qt.AlignVCenter))
+        site.item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.ShowIndicator)
+        self.tree.addTopLevelItem(site.item)
+
+    def _show(self, site, forecast):
+        """Update the summary row of a site, and its forecast table if expanded."""
+        self.tree.blockSignals(True)  # Not a rename by the user
+        item = site.item
+        if forecast.current:
+            name = 'temperature_2m' if 'temperature_2m' in forecast.current else next(iter(forecast.current))
+            item.setText(1, format_current(forecast, name))
+        else:
+            item.setText(1, "N/A")
+        item.setText(2, self._day_range(forecast))
+        entry = self.cache.peek_cell(site.key)
+        fetched_at = entry[0] if entry is not None else time.time()
+        item.setText(3, time.strftime("%H:%M", time.localtime(fetched_at)))
+        item.setToolTip(3, "")
+        self.tree.blockSignals(False)
+        if site.detail is not None:
+            site.detail.set_forecast(forecast)
+
+    @staticmethod
+    def _day_range(forecast):
+        """Return the minimum and maximum of the first variable over the next 24 hours."""
+        name = next(iter(forecast.hourly), None)
+        if name is None:
+            return ""
+        values = [value for value in forecast.hourly[name][:24] if not math.isnan(value)]
+        if not values:
+            return ""
+        template = value_template(name, forecast.hourly_units.get(name, ''))
+        return f"{variable_title(name)} {template.format(min(values))} – {template.format(max(values))}"
+
+    def _site_of(self, item):
+        """Return the site of a summary row."""
+        return next((site for site in self.sites if site.item is item), None)
+
+    def _on_expanded(self, item):
+        """Show the hourly forecast of a site below its summary row."""
+        site = self._site_of(item)
+        if site is None or site.detail is not None:
+            return
+        forecast = self.cache.peek(site.key) if site.key is not None else None
+        site.detail = ForecastTableModel(self)
+        if forecast is not None:
+            site.detail.set_forecast(forecast.window(*forecast_window(SettingsDialog.get_forecast_days())))
+        table = QtWidgets.QTableView()
+        table.setModel(site.detail)
+        table.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        table.verticalHeader().hide()
+        table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(table.fontMetrics().height() + 6)
+        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        table.setFixedHeight(table.verticalHeader().defaultSectionSize() * (self.DETAIL_ROWS + 1))
+        child = QtWidgets.QTreeWidgetItem()
+        item.addChild(child)
+        child.setFirstColumnSpanned(True)
+        self.tree.setItemWidget(child, 0, table)
+
+    def _on_collapsed(self, item):
+        """Free the forecast table of a collapsed site."""
+        site = self._site_of(item)
+        if site is None or site.detail is None:
+            return
+        item.takeChildren()
+        site.detail.deleteLater()
+        site.detail = None
+
+    def _on_item_changed(self, item, column):
+        """Store a site renamed by the user."""
+        site = self._site_of(item)
+        if site is not None and column == 0:
+            site.name = item.text(0)
+            self._save()
+
+    def _on_batch_received(self, request_id, forecasts):
+        """Cache the forecasts of a finished batch and update their rows."""
+        keys = self._pending.pop(request_id, None)
+        if keys is None:
+            return  # Not ours, or superseded
+        window = forecast_window(SettingsDialog.get_forecast_days())
+        for key, forecast in zip(keys, forecasts):
+            self.cache.put(key, forecast)
+            for site in self.sites:
+                if site.key == key:
+                    self._show(site, forecast.window(*window))
+        if not self._pending:
+            self.status_label.setText(f"{len(self.sites)} sites")
+
+    def _on_failed(self, request_id, error_message):
+        """Mark the sites of a failed batch, they keep their last values."""
+        keys = self._pending.pop(request_id, None)
+        if keys is None:
+            return
+        keys = set(keys)
+        for site in self.sites:
+            if site.key in keys:
+                site.item.setToolTip(3, f"Update failed: {error_message}")
+        self.status_label.setText(f"Updating some sites failed: {error_message}")
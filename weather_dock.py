@@ -8,19 +8,25 @@
 """
 
 import os
+import time
 from PyQt5.QtCore import QSettings, QTranslator, QCoreApplication, Qt, QTimer
 from PyQt5.QtGui import QIcon
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QAction, QMenu
-from qgis.core import QgsProject, QgsCoordinateTransform, QgsCoordinateReferenceSystem
-from .weather_dock_widget import WeatherDockWidget
+from qgis.core import QgsApplication, QgsProject, QgsCsException, QgsPointXY
 from .settings_dialog import SettingsDialog
+from .transforms import canvas_center_wgs84, clear_transform_cache, to_wgs84_transform
 
 
 class WeatherDock:
     """QGIS Plugin Implementation."""
 
-    UPDATE_DELAY_MS = 3000  # Delay in milliseconds (3 seconds)
+    UPDATE_DELAY_MS = 3000  # Delay in milliseconds (3 seconds) after continuous panning
+    FAST_UPDATE_DELAY_MS = 300  # Delay after a single jump, e.g. to a bookmark or layer extent
+    DELAY_RAMP_S = 1.0  # Interaction lasting this long gets the full UPDATE_DELAY_MS
+    SCALE_CHANGE_FACTOR = 2.0  # Zooming by less than this is not a new view of the same cell
+    PREFETCH_INTERVAL_S = 0.3  # Minimum time between two prefetch predictions
+    PREFETCH_LOOKAHEAD_S = (0.5, 1.5)  # Predict the canvas center this far ahead
 
     def __init__(self, iface):
         """Constructor."""
@@ -39,6 +45,63 @@ class WeatherDock:
         self.actions = []
         self.menu = self.tr(u'&Weather Dock')
         self.first_start = None
+        self.processing_provider = None
+        # Everything else is created by load() when the dock is first opened, so an
+        # enabled but unused plugin costs next to nothing at startup and while panning.
+        # The overlay only needs what load_service() creates.
+        self.forecast_cache = None
+        self.fetch_service = None
+        self.overlay = None
+        self.loaded = False
+        self.canvas_connected = False
+
+    def load_service(self):
+        """Create the forecast cache, the fetch service and the overlay, once."""
+        if self.fetch_service is not None:
+            return
+        from .fetch_service import WeatherFetchService, request_bucket
+        from .forecast_cache import ForecastCache
+        from .weather_overlay import WeatherOverlay
+
+        # The cache lives on the plugin so it survives re-creating the dock widget
+        self.forecast_cache = ForecastCache(
+            ttl_seconds=SettingsDialog.get_cache_ttl_minutes() * 60,
+            max_entries=SettingsDialog.get_cache_max_entries())
+        # One long-lived client for all requests of the plugin
+        request_bucket.configure(SettingsDialog.get_request_rate(), SettingsDialog.get_request_burst())
+        self.fetch_service = WeatherFetchService(provider=SettingsDialog.get_provider())
+        self.overlay = WeatherOverlay(self.iface, self.fetch_service, self.forecast_cache)
+        QgsProject.instance().transformContextChanged.connect(clear_transform_cache)
+
+    def load(self):
+        """Import the modules of the dock and create the long-lived objects, once."""
+        if self.loaded:
+            return
+        self.loaded = True
+        self.load_service()
+        from .canvas_motion import CanvasMotionTracker
+        from .forecast_store import ForecastStore
+        from .grid_sampler import WeatherGridSampler
+        from .prefetcher import ForecastPrefetcher
+        from .refresh_scheduler import RefreshScheduler
+        from .temporal_layer import ForecastTemporalLayer
+
+        self.forecast_store = ForecastStore()
+        self.forecast_store.set_source(self.fetch_service.provider.cache_key())
+        self.grid_sampler = WeatherGridSampler(self.iface, self.fetch_service, self.forecast_cache)
+        self.temporal_layer = ForecastTemporalLayer(self.iface)
+        self.grid_sampler.sampled.connect(self.on_grid_sampled)
+        self.prefetcher = ForecastPrefetcher(self.fetch_service, self.forecast_cache)
+        self.prefetcher.prefetchFinished.connect(self.on_prefetch_finished)
+        # Cache key the dock waits for a prefetch of instead of requesting it again
+        self.awaited_key = None
+        self.prefetch_enabled = SettingsDialog.get_prefetch_enabled()
+        self.motion_tracker = CanvasMotionTracker()
+        self.last_prefetch_time = 0.0
+        # (cache key, scale) of the last update, to skip insignificant canvas changes
+        self.last_update = None
+        self.refresh_scheduler = RefreshScheduler(self.fetch_service)
+        self.refresh_scheduler.refreshDue.connect(self.on_refresh_due)
 
         self.update_timer = QTimer()
         self.update_timer.setInterval(self.UPDATE_DELAY_MS)
@@ -101,66 +164,276 @@ class WeatherDock:
             add_to_menu=True
         )
 
+        # --- Canvas Overlay (Menu Only, checkable) ---
+        self.overlay_action = self.add_action(
+            None,
+            text=self.tr(u'Weather Overlay'),
+            callback=self.set_overlay_enabled,
+            parent=self.iface.mainWindow(),
+            add_to_toolbar=False,
+            add_to_menu=True
+        )
+        self.overlay_action.setCheckable(True)
+
         self.first_start = True
-        # Connect extentsChanged to schedule_update instead of directly updating
-        self.iface.mapCanvas().extentsChanged.connect(self.schedule_update)
+
+        # --- Processing Algorithms ---
+        # Registered at startup so the algorithm is listed in the toolbox; it imports its
+        # dependencies when it is first run
+        from .processing_provider import WeatherProcessingProvider
+        self.processing_provider = WeatherProcessingProvider()
+        QgsApplication.processingRegistry().addProvider(self.processing_provider)
+        # The canvas is only tracked while the dock is visible, see on_dock_visibility_changed()
+
+        if SettingsDialog.get_overlay_enabled():
+            self.overlay_action.setChecked(True)
+            self.set_overlay_enabled(True)
 
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
-        # --- STOP TIMER ---
-        self.update_timer.stop()
-
         for action in self.actions:
             self.iface.removePluginMenu(self.menu, action)
             if action.icon():
                 self.iface.removeToolBarIcon(action)
 
+        if self.processing_provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.processing_provider)
+            self.processing_provider = None
+
+        if self.fetch_service is None:
+            return  # Neither the dock nor the overlay was used, nothing else was set up
         try:
-            # --- DISCONNECT CORRECT SLOT ---
-            self.iface.mapCanvas().extentsChanged.disconnect(self.schedule_update)
+            QgsProject.instance().transformContextChanged.disconnect(clear_transform_cache)
         except TypeError:
             pass
+        clear_transform_cache()
+
+        if self.loaded:
+            self.track_canvas(False)
+            if self.dock_widget:
+                self.dock_widget.cancel_fetch()
+                self.iface.removeDockWidget(self.dock_widget)
+                self.dock_widget = None
+            self.refresh_scheduler.stop()
+            self.grid_sampler.cancel()
+            self.prefetcher.cancel()
 
-        if self.dock_widget:
-            self.iface.removeDockWidget(self.dock_widget)
-            self.dock_widget = None
+        self.overlay.set_enabled(False)
+        self.fetch_service.abort_all()
+        if self.loaded:
+            self.forecast_store.close()
 
     def run(self):
         """Run method that shows the dock widget and triggers initial weather update."""
+        self.load()
+        from .weather_dock_widget import WeatherDockWidget
         if self.first_start or self.dock_widget is None:
             self.first_start = False
-            self.dock_widget = WeatherDockWidget(self.iface)
+            self.dock_widget = WeatherDockWidget(self.iface, self.fetch_service, self.forecast_cache, self.forecast_store)
+            self.dock_widget.visibilityChanged.connect(self.on_dock_visibility_changed)
+            self.dock_widget.forecastDisplayed.connect(self.on_forecast_displayed)
             self.iface.addDockWidget(Qt.RightDockWidgetArea, self.dock_widget)
         else:
             if not self.iface.mainWindow().findChild(WeatherDockWidget):
-                self.dock_widget = WeatherDockWidget(self.iface)
+                self.dock_widget = WeatherDockWidget(self.iface, self.fetch_service, self.forecast_cache, self.forecast_store)
+                self.dock_widget.visibilityChanged.connect(self.on_dock_visibility_changed)
+                self.dock_widget.forecastDisplayed.connect(self.on_forecast_displayed)
                 self.iface.addDockWidget(Qt.RightDockWidgetArea, self.dock_widget)
 
+        self.dock_widget.set_debug_enabled(SettingsDialog.get_debug_metrics_enabled())
         self.dock_widget.show()
         self.dock_widget.raise_()
 
         # --- Trigger initial update immediately ---
         self.update_timer.stop()  # Cancel any pending timer from previous interactions
-        self.perform_delayed_update()  # Call the actual update method directly
+        self.perform_delayed_update(force=True)  # Call the actual update method directly
 
     def show_settings_dialog(self):
         """Create and show the settings dialog."""
-        dialog = SettingsDialog(self.iface.mainWindow())
+        if self.fetch_service is None:
+            # load_service() and load() read the new settings when they are first needed
+            SettingsDialog(self.iface.mainWindow()).exec_()
+            return
+        from .fetch_service import request_bucket
+        dialog = SettingsDialog(self.iface.mainWindow(), self.forecast_cache, self.fetch_service)
         if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            self.forecast_cache.configure(
+                ttl_seconds=SettingsDialog.get_cache_ttl_minutes() * 60,
+                max_entries=SettingsDialog.get_cache_max_entries())
+            request_bucket.configure(SettingsDialog.get_request_rate(), SettingsDialog.get_request_burst())
+            provider = SettingsDialog.get_provider()
+            if provider.cache_key() != self.fetch_service.provider.cache_key():
+                # Forecasts of the previous source or variables must not be served as those of the new one
+                self.fetch_service.abort_all()
+                self.fetch_service.provider = provider
+                self.forecast_cache.clear()
+                if self.loaded:
+                    self.forecast_store.set_source(provider.cache_key())
+                self.overlay.clear()
+            if not self.loaded:
+                return  # Only the overlay is in use
+            self.prefetch_enabled = SettingsDialog.get_prefetch_enabled()
+            if self.dock_widget:
+                self.dock_widget.set_debug_enabled(SettingsDialog.get_debug_metrics_enabled())
+            self.on_dock_visibility_changed(bool(self.dock_widget and self.dock_widget.isVisible()))
             # --- Trigger immediate update after settings change ---
             self.update_timer.stop()  # Cancel any pending delayed update
-            self.perform_delayed_update()  # Call the actual update method directly
+            self.perform_delayed_update(force=True)  # Call the actual update method directly
+            self.refresh_watchlist()
+
+    def on_dock_visibility_changed(self, visible):
+        """Track the canvas and check for new model runs only while the dock is visible."""
+        self.track_canvas(visible)
+        if visible and SettingsDialog.get_auto_refresh_enabled():
+            self.refresh_scheduler.resume()
+        else:
+            self.refresh_scheduler.pause()
+        if visible:
+            # Catch up with the canvas changes made while the dock was hidden
+            self.update_timer.start(self.FAST_UPDATE_DELAY_MS)
+        else:
+            self.update_timer.stop()
+            self.motion_tracker.reset()
+            self.prefetcher.cancel()
+            if self.dock_widget:
+                self.dock_widget.release_render_cache()
+
+    def track_canvas(self, enabled):
+        """Connect to the canvas signals, or disconnect so panning costs nothing while the dock is hidden."""
+        if enabled == self.canvas_connected:
+            return
+        canvas = self.iface.mapCanvas()
+        if enabled:
+            canvas.extentsChanged.connect(self.schedule_update)
+        else:
+            try:
+                canvas.extentsChanged.disconnect(self.schedule_update)
+            except TypeError:
+                pass
+        self.canvas_connected = enabled
+
+    def set_overlay_enabled(self, enabled):
+        """Show or remove the weather glyphs on the map canvas and remember the choice."""
+        QSettings().setValue(SettingsDialog.OVERLAY_ENABLED_KEY, enabled)
+        if enabled:
+            self.load_service()  # Not load(), the overlay needs neither the store nor the dock's helpers
+        elif self.overlay is None:
+            return
+        self.overlay.set_enabled(enabled)
+
+    def refresh_watchlist(self):
+        """Refresh the pinned sites if their tab is shown, otherwise showing it refreshes them."""
+        watchlist_view = self.dock_widget.watchlist_view if self.dock_widget else None
+        if watchlist_view is not None and watchlist_view.isVisible():
+            watchlist_view.refresh()
+
+    def on_forecast_displayed(self, forecast):
+        """Publish the forecast of the map center to the temporal layer, if selected."""
+        if (SettingsDialog.get_temporal_layer_enabled()
+                and SettingsDialog.get_temporal_source() == SettingsDialog.TEMPORAL_SOURCE_CENTER):
+            self.temporal_layer.publish([(QgsPointXY(forecast.longitude, forecast.latitude), forecast)])
+
+    def on_grid_sampled(self, samples):
+        """Publish the forecasts of the sampled grid to the temporal layer, if selected."""
+        if (SettingsDialog.get_temporal_layer_enabled()
+                and SettingsDialog.get_temporal_source() == SettingsDialog.TEMPORAL_SOURCE_GRID):
+            self.temporal_layer.publish(samples)
+
+    def on_refresh_due(self, available_at):
+        """Refetch the shown forecasts after a new model run was published."""
+        self.forecast_cache.expire_before(available_at)
+        self.overlay.expire_before(available_at)
+        if self.dock_widget and self.dock_widget.isVisible():
+            self.update_timer.stop()
+            self.perform_delayed_update(force=True)
+            self.refresh_watchlist()
+
+    def on_prefetch_finished(self, keys):
+        """Show the forecast the dock waited for, from the cache or, if the prefetch failed, fetched."""
+        if self.awaited_key in keys:
+            self.perform_delayed_update(force=True)
 
     def schedule_update(self):
-        """Restarts the timer when the map extent changes."""
-        # Don't need to check if widget is visible here,
-        # the check happens in perform_delayed_update.
-        # Simply restart the timer whenever the map moves.
-        self.update_timer.start()  # Restarts the timer if already running
-
-    def perform_delayed_update(self):
-        """Update the weather data - called after the timer delay."""
+        """Restarts the timer when the map extent changes, connected while the dock is visible."""
+        canvas = self.iface.mapCanvas()
+        center = canvas.center()
+        self.motion_tracker.add(center.x(), center.y(), canvas.mapSettings().destinationCrs())
+
+        # Fire fast after a deliberate jump, wait longer while the user keeps dragging or zooming
+        ramp = min(self.motion_tracker.burst_duration() / self.DELAY_RAMP_S, 1.0)
+        delay = self.FAST_UPDATE_DELAY_MS + ramp * (self.UPDATE_DELAY_MS - self.FAST_UPDATE_DELAY_MS)
+        self.update_timer.start(int(delay))  # Restarts the timer if already running
+
+        if self.prefetch_enabled:
+            self.prefetch_ahead()
+
+    def prefetch_ahead(self):
+        """Prefetch the forecasts of the locations the canvas is panned toward."""
+        now = time.monotonic()
+        if now - self.last_prefetch_time < self.PREFETCH_INTERVAL_S:
+            return
+        predictions = [self.motion_tracker.predict(seconds) for seconds in self.PREFETCH_LOOKAHEAD_S]
+        predictions = [prediction for prediction in predictions if prediction is not None]
+        if not predictions:
+            return
+        self.last_prefetch_time = now
+
+        transform = to_wgs84_transform(self.iface.mapCanvas().mapSettings().destinationCrs())
+        points = []
+        for x, y in predictions:
+            point = QgsPointXY(x, y)
+            if transform is not None:
+                try:
+                    point = transform.transform(point)
+                except QgsCsException:
+                    continue  # Predicted outside the valid area of the CRS
+            points.append((point.y(), point.x()))
+        if points:
+            self.prefetcher.prefetch(points, SettingsDialog.get_forecast_days())
+
+    def perform_delayed_update(self, force=False):
+        """Update the weather data - called after the timer delay.
+
+        :param force: Update even if the canvas did not move significantly since the last update.
+        """
+        self.motion_tracker.reset()
+        self.awaited_key = None
+
         # Only update if the dock widget exists and is visible
-        if self.dock_widget and self.dock_widget.isVisible():
-            # Call the update method on the widget instance
+        if not (self.dock_widget and self.dock_widget.isVisible()):
+            self.prefetcher.cancel()
+            return
+
+        # Skip the update if the center stayed in the same forecast cell at a comparable scale
+        canvas = self.iface.mapCanvas()
+        center = canvas_center_wgs84(canvas)
+        if center is None:
+            # Outside the valid area of the canvas CRS: say so instead of showing the last location as current
+            self.prefetcher.cancel()
+            self.last_update = None
             self.dock_widget.update_weather()
+            return
+        key = self.forecast_cache.cell_key(center.y(), center.x(), SettingsDialog.get_forecast_days())
+        # The canvas came to rest: speculation toward elsewhere is obsolete, a prefetch of
+        # the resting cell is awaited instead of requested again under another URL
+        if self.prefetcher.cancel_far_from(key) and not self.forecast_cache.contains(key):
+            self.awaited_key = key
+            self.last_update = None
+            self.dock_widget.cancel_fetch()
+            self.dock_widget.show_message("Loading weather data...")
+            return
+        scale = canvas.scale()
+        if not force and self.last_update is not None:
+            last_key, last_scale = self.last_update
+            comparable_scale = last_scale > 0 and 1 / self.SCALE_CHANGE_FACTOR < scale / last_scale < self.SCALE_CHANGE_FACTOR
+            if key == last_key and comparable_scale and self.dock_widget.is_current(key):
+                return
+        self.last_update = (key, scale)
+
+        # Call the update method on the widget instance
+        self.dock_widget.update_weather()
+        if SettingsDialog.get_grid_enabled():
+            self.grid_sampler.update(
+                SettingsDialog.get_grid_rows(),
+                SettingsDialog.get_grid_columns(),
+                SettingsDialog.get_forecast_days())
@@ -7,35 +7,82 @@
 """
 
 import os
-import json
-import urllib.request
-import urllib.error
-from datetime import datetime, timezone
+import time
 
 from PyQt5 import QtGui, QtWidgets, QtCore
 from PyQt5.QtCore import QSettings
 
-from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject
+from qgis.core import Qgis, QgsMessageLog
 
+from .forecast_data import forecast_window
+from .forecast_renderer import FORECAST_CSS, PAGE_TEMPLATE, TABLE_ANCHOR, ForecastRenderer
+from .forecast_table_view import ForecastNativeView
+from .metrics import metrics
+from .metrics_view import MetricsView
 from .settings_dialog import SettingsDialog
+from .transforms import canvas_center_wgs84
+from .watchlist import WatchlistView
 
 
 class WeatherDockWidget(QtWidgets.QDockWidget):
     """Weather dock widget implementation."""
 
-    def __init__(self, iface):
+    forecastDisplayed = QtCore.pyqtSignal(object)  # Forecast now on display
+
+    RENDER_BUDGET_MS = 16.0  # One frame at 60 Hz
+
+    def __init__(self, iface, service, cache=None, store=None):
         """Constructor."""
         super(WeatherDockWidget, self).__init__()
         self.iface = iface
+        self.service = service
+        self.cache = cache
+        self.store = store
         self.setWindowTitle("Weather Dock")
         self.setMinimumWidth(350)
         self.text_browser = QtWidgets.QTextBrowser()
         self.text_browser.setReadOnly(True)
         self.text_browser.setOpenExternalLinks(True)
-        self.setWidget(self.text_browser)
+        # Parse the forecast style sheet once instead of with every document
+        self.text_browser.document().setDefaultStyleSheet(FORECAST_CSS)
+        # The document is patched in place on refreshes, nothing to undo in a read-only view
+        self.text_browser.document().setUndoRedoEnabled(False)
+        self.native_view = ForecastNativeView()
+        self.stack = QtWidgets.QStackedWidget()
+        self.stack.addWidget(self.text_browser)
+        self.stack.addWidget(self.native_view)
+        # The tab bar only shows up with the optional debug tab
+        self.tabs = QtWidgets.QTabWidget()
+        self.tabs.setTabBarAutoHide(True)
+        self.tabs.addTab(self.stack, "Forecast")
+        # Pinned sites share the cache, so the tab needs one
+        self.watchlist_view = WatchlistView(iface, service, cache) if cache is not None else None
+        if self.watchlist_view is not None:
+            self.tabs.addTab(self.watchlist_view, "Watchlist")
+        self.setWidget(self.tabs)
+        self.metrics_view = None
+        self.renderer = ForecastRenderer()
+        # HTML of the parts above and from the hourly table on of the forecast on display, None for messages
+        self.current_top = None
+        self.current_table = None
+        self.last_render_ms = 0.0
         self.show_message("Loading weather data...")
-        # Store the fetch thread to prevent multiple simultaneous requests
-        self.fetch_thread = None
+        # Id of the latest service request; older ones are aborted when superseded
+        self.request_id = None
+        # Cache key of the latest request
+        self.fetch_key = None
+        # Cache key of the up-to-date forecast on display, None while loading or on errors
+        self.displayed_key = None
+        # Stored (fetched_at, forecast) shown while the latest request revalidates it
+        self.stale_entry = None
+        # (start, end) UTC epochs of the hours to show
+        self.fetch_window = None
+        # Cached (fetched_at, forecast) the latest request only fetches the missing hours of
+        self.delta_base = None
+        # metrics Trace of the latest update
+        self.trace = None
+        self.service.forecastReceived.connect(self.on_weather_data_received)
+        self.service.forecastFailed.connect(self.on_weather_data_error)
 
     def show_message(self, message):
         """Show a message in the text browser."""
@@ -44,7 +91,7 @@ class WeatherDockWidget(QtWidgets.QDockWidget):
         <style>body {{font-family: Arial, sans-serif; margin: 10px; color: black; background-color: white;}}</style>
         </head><body><p>{message}</p></body></html>
         """
-        self.text_browser.setHtml(html)
+        self.set_html(html)
 
     def show_error(self, message):
         """Show an error message in the text browser."""
@@ -59,239 +106,226 @@ class WeatherDockWidget(QtWidgets.QDockWidget):
             <p>Please try again later, check your network connection, or review settings.</p>
         </body></html>
         """
-        self.text_browser.setHtml(html)
+        self.set_html(html)
 
     def update_weather(self):
         """Update the weather data for the current map extent."""
-        # Prevent starting a new fetch if one is already running
-        if self.fetch_thread and self.fetch_thread.isRunning():
-            # Optionally: print("Fetch already in progress, skipping.")
+        # The latest request wins: supersede any fetch still in flight
+        self.cancel_fetch()
+        self.displayed_key = None
+
+        self.trace = metrics.start_trace("Forecast update")
+        start = time.perf_counter()
+        center = canvas_center_wgs84(self.iface.mapCanvas())
+        metrics.record('transform', (time.perf_counter() - start) * 1000.0, self.trace)
+        if center is None:
+            self.show_message("The map center is outside the area the map projection is valid for.")
+            self.finish_trace("skipped")
             return
-
-        canvas = self.iface.mapCanvas()
-        extent = canvas.extent()
-        center = extent.center()
-        source_crs = canvas.mapSettings().destinationCrs()
-        dest_crs = QgsCoordinateReferenceSystem("EPSG:4326")
-        if source_crs != dest_crs:
-            transform = QgsCoordinateTransform(source_crs, dest_crs, QgsProject.instance())
-            center = transform.transform(center)
         latitude = center.y()
         longitude = center.x()
-        self.show_message(f"Loading weather data for coordinates: {latitude:.4f}, {longitude:.4f}...")
 
         # Get forecast days from settings
         forecast_days = SettingsDialog.get_forecast_days()
+        self.fetch_window = forecast_window(forecast_days)
+        hours = self.fetch_window
+
+        # Serve repeat views of the same grid cell from memory
+        self.stale_entry = None
+        self.delta_base = None
+        if self.cache is not None:
+            self.fetch_key = self.cache.cell_key(latitude, longitude, forecast_days)
+            cached_forecast = self.cache.get(self.fetch_key, self.fetch_window)
+            if cached_forecast is not None:
+                self.display_weather(cached_forecast.window(*self.fetch_window))
+                self.displayed_key = self.fetch_key
+                self.finish_trace("cache hit")
+                return
+            # Fetch the cell center so the cached forecast is valid for the whole cell
+            latitude, longitude = self.cache.cell_center(self.fetch_key)
+            # A fresh forecast of the cell for other forecast days, or one the clock has moved
+            # past, only needs to be trimmed or extended by the missing hours
+            cell_entry = self.cache.peek_cell(self.fetch_key)
+            if cell_entry is not None:
+                fetched_at, cell_forecast = cell_entry
+                missing = cell_forecast.missing_window(*self.fetch_window)
+                if missing is None:
+                    forecast = cell_forecast.window(*self.fetch_window)
+                    self.cache.put(self.fetch_key, forecast, fetched_at)
+                    self.display_weather(forecast)
+                    self.displayed_key = self.fetch_key
+                    self.finish_trace("cache hit")
+                    return
+                if missing != self.fetch_window:
+                    self.delta_base = (fetched_at, cell_forecast.window(*self.fetch_window))
+                    self.stale_entry = self.delta_base
+                    hours = missing
+            # Paint the last known forecast at once and revalidate it in the background
+            if self.stale_entry is None and self.store is not None:
+                stored_entry = self.store.load(self.fetch_key)
+                if stored_entry is not None:
+                    # Without the hours that have passed since it was stored, nothing left is not worth showing
+                    fetched_at, stored_forecast = stored_entry
+                    stored_forecast = stored_forecast.window(*self.fetch_window)
+                    if len(stored_forecast):
+                        self.stale_entry = (fetched_at, stored_forecast)
+
+        if self.stale_entry is not None:
+            fetched_at, stale_forecast = self.stale_entry
+            self.display_weather(
+                stale_forecast, status=f"Forecast from {format_age(time.time() - fetched_at)} ago, updating...")
+        else:
+            self.show_message(f"Loading weather data for coordinates: {latitude:.4f}, {longitude:.4f}...")
 
-        # Start the fetch thread
-        self.fetch_thread = FetchWeatherThread(latitude, longitude, forecast_days) # Pass days
-        self.fetch_thread.weatherDataReceived.connect(self.on_weather_data_received)
-        self.fetch_thread.weatherDataError.connect(self.on_weather_data_error)
-        # Optional: Connect finished signal to allow new fetches after completion
-        # self.fetch_thread.finished.connect(self.on_fetch_finished)
-        self.fetch_thread.start()
+        self.request_id = self.service.fetch(latitude, longitude, forecast_days, hours=hours, trace=self.trace)
 
-    def on_weather_data_received(self, weather_data):
-        """Handle received weather data."""
-        self.display_weather_html(weather_data)
-        self.fetch_thread = None # Allow new fetch
+    def is_current(self, key):
+        """Return True if the forecast for key is on display or being fetched."""
+        return key == self.displayed_key or (self.request_id is not None and key == self.fetch_key)
 
-    def on_weather_data_error(self, error_message):
+    def cancel_fetch(self):
+        """Abort the fetch in flight, its late result will be ignored."""
+        if self.request_id is not None:
+            self.service.abort(self.request_id)
+            self.request_id = None
+
+    def on_weather_data_received(self, request_id, forecast):
+        """Handle received weather data."""
+        if request_id != self.request_id:
+            return  # Superseded, or requested by someone else
+        fetched_at = None
+        if self.delta_base is not None:
+            # Keep the age of the extended forecast, so its older hours still expire with the TTL
+            fetched_at, base_forecast = self.delta_base
+            forecast = base_forecast.merged(forecast).window(*self.fetch_window)
+            self.delta_base = None
+        if self.cache is not None and self.fetch_key is not None:
+            self.cache.put(self.fetch_key, forecast, fetched_at)
+            if self.store is not None:
+                self.store.save(self.fetch_key, forecast, fetched_at)
+        self.stale_entry = None
+        self.request_id = None
+        self.display_weather(forecast)
+        self.displayed_key = self.fetch_key
+        self.finish_trace("fetched")
+
+    def on_weather_data_error(self, request_id, error_message):
         """Handle weather data fetch errors."""
-        self.show_error(error_message)
-        self.fetch_thread = None # Allow new fetch
-
-    def display_weather_html(self, weather_data):
-        """Display the weather data as HTML using tables."""
-        # Extract current weather data
-        current = weather_data.get('current', {})
-        current_time_str = current.get('time', '')
-        current_temp = current.get('temperature_2m', 'N/A')
-        current_wind = current.get('wind_speed_10m', 'N/A')
-
-        # Extract hourly forecast data
-        hourly = weather_data.get('hourly', {})
-        hourly_times = hourly.get('time', [])
-        hourly_temps = hourly.get('temperature_2m', [])
-        hourly_wind_speeds = hourly.get('wind_speed_10m', [])
-        hourly_humidity = hourly.get('relative_humidity_2m', [])
-
-        # Format current time (display in local time)
-        formatted_time = "Unknown Time"
-        if current_time_str:
-            try:
-                local_dt = datetime.now()
-                formatted_time = local_dt.strftime("%A, %B %d, %Y %H:%M %Z%z") # Include timezone info
-            except (ValueError, TypeError):
-                formatted_time = current_time_str # Fallback
-
-        # Get units
-        units = weather_data.get('current_units', {})
-        temp_unit = units.get('temperature_2m', '°C')
-        wind_unit = units.get('wind_speed_10m', 'km/h')
-        hourly_units = weather_data.get('hourly_units', {})
-        hourly_temp_unit = hourly_units.get('temperature_2m', temp_unit)
-        hourly_wind_unit = hourly_units.get('wind_speed_10m', wind_unit)
-        hourly_humidity_unit = hourly_units.get('relative_humidity_2m', '%')
-
-        # --- Generate HTML table rows for the forecast ---
-        forecast_table_rows = ""
-        # The number of rows is now determined by the length of the returned data
-        if hourly_times: # Check if there's any hourly data
-            for i in range(len(hourly_times)):
-                # Format time to local timezone
-                time_str = "N/A"
-                if i < len(hourly_times):
-                     try:
-                         # Parse as naive, assume UTC, convert to local
-                         utc_dt = datetime.fromisoformat(hourly_times[i]).replace(tzinfo=timezone.utc)
-                         local_dt = utc_dt.astimezone(None)
-                         # Format as "Day HH:MM" e.g., "Mon 14:00"
-                         time_str = local_dt.strftime("%a %H:%M") # Use %a for abbreviated weekday
-                     except (ValueError, TypeError):
-                         time_str = hourly_times[i] # Fallback
-
-                temp_str = f"{hourly_temps[i]:.1f}" if i < len(hourly_temps) and hourly_temps[i] is not None else "N/A"
-                wind_str = f"{hourly_wind_speeds[i]:.1f}" if i < len(hourly_wind_speeds) and hourly_wind_speeds[i] is not None else "N/A"
-                humidity_str = f"{hourly_humidity[i]}" if i < len(hourly_humidity) and hourly_humidity[i] is not None else "N/A"
-
-                row_style = "background-color: #f0f0f0;" if i % 2 != 0 else ""
-
-                forecast_table_rows += f"""
-                <tr style="{row_style}">
-                    <td class="time-cell">{time_str}</td>
-                    <td class="data-cell">{temp_str} {hourly_temp_unit}</td>
-                    <td class="data-cell">{wind_str} {hourly_wind_unit}</td>
-                    <td class="data-cell">{humidity_str}{hourly_humidity_unit}</td>
-                </tr>
-                """
+        if request_id != self.request_id:
+            return  # Superseded, or requested by someone else
+        self.request_id = None
+        metrics.count('updates_failed')
+        if self.stale_entry is not None:
+            # Keep serving the last known forecast while offline
+            fetched_at, stale_forecast = self.stale_entry
+            self.display_weather(
+                stale_forecast,
+                status=f"Offline: showing forecast from {format_age(time.time() - fetched_at)} ago ({error_message})")
+            self.finish_trace("failed, stale shown")
         else:
-            forecast_table_rows = '<tr><td colspan="4" style="text-align: center;">No hourly forecast data available.</td></tr>'
+            self.show_error(error_message)
+            self.finish_trace("failed")
 
-        forecast_days = SettingsDialog.get_forecast_days()
-        forecast_title = f"Hourly Forecast ({forecast_days} Day{'s' if forecast_days > 1 else ''})"
+    def display_weather(self, forecast, status=None):
+        """Display the weather data in the view selected in the settings.
 
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                /* CSS styles remain largely the same as previous version */
-                body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 0; background-color: white; color: black; font-size: 16px; }}
-                .container {{ padding: 15px; }}
-                .header {{ background-color: white; color: black; padding: 15px; border-radius: 8px 8px 0 0; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); border-bottom: 1px solid #ccc; }}
-                .header h2 {{ margin-top: 0; margin-bottom: 5px; }}
-                .header p {{ margin-bottom: 0; font-size: 0.9em; }}
-                .current-weather {{ background-color: white; border-radius: 8px; padding: 20px; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); overflow: hidden; }}
-                .temp-display {{ font-size: 2.0em; /* Slightly smaller */ font-weight: bold; margin-bottom: 10px; color: black; }} /* Adjusted size and added margin */
-                .weather-details p {{ margin: 5px 0; font-size: 1.1em; color: black; }}
-                .forecast-container {{ background-color: white; border-radius: 8px; padding: 20px; margin-bottom: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }}
-                h3 {{ margin-top: 0; color: black; border-bottom: 1px solid #ccc; padding-bottom: 5px; margin-bottom: 15px; font-size: 1.4em; }}
-                .forecast-table table {{ width: 100%; border-collapse: collapse; font-size: 1em; border: 1px solid black; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }}
-                .forecast-table th, .forecast-table td {{ border: none; border-bottom: 1px solid #ddd; padding: 10px 8px; color: black; }}
-                .forecast-table thead tr {{ border-bottom: 2px solid black; }}
-                .forecast-table th {{ background-color: white; font-weight: bold; border-bottom: 2px solid black; }}
-                .forecast-table th.time-header {{ text-align: left; }}
-                .forecast-table th.data-header {{ text-align: right; padding-right: 12px; }}
-                .forecast-table td.time-cell {{ text-align: left; }}
-                .forecast-table td.data-cell {{ text-align: right; padding-right: 12px; }}
-                .forecast-table tbody tr:last-child td {{ border-bottom: none; }}
-                .footer {{ font-size: 0.9em; text-align: center; margin-top: 20px; color: black; }}
-                .footer a {{ color: black; text-decoration: underline; }}
-                .label {{ font-weight: bold; color: black; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h2>Weather Forecast</h2>
-                    <p>{formatted_time}</p>
-                </div>
-
-                <div class="current-weather">
-                     <!-- Display current temp and wind side-by-side using a simple table for layout -->
-                     <table style="width:100%; border:none;"><tr>
-                       <td style="width:50%; border:none; vertical-align:top;">
-                         <div class="temp-display"><span class="label">Now:</span><br><strong>{current_temp}{temp_unit}</strong></div>
-                       </td>
-                       <td style="width:50%; border:none; vertical-align:top;">
-                         <div class="weather-details">
-                           <p><span class="label">Wind:</span><br><strong>{current_wind} {wind_unit}</strong></p>
-                         </div>
-                       </td>
-                     </tr></table>
-                </div>
-                <p></p>
-                <p></p>
-                <div class="forecast-container">
-                    <!-- Use dynamic title -->
-                    <h3>{forecast_title}</h3>
-                    <div class="forecast-table">
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th class="time-header">Time</th>
-                                    <th class="data-header">Temp</th>
-                                    <th class="data-header">Wind</th>
-                                    <th class="data-header">Humidity</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {forecast_table_rows}
-                            </tbody>
-                        </table>
-                    </div>
-                </div>
-
-                <div class="footer">
-                    Data provided by <a href="https://open-meteo.com/" target="_blank">Open-Meteo.com</a>
-                </div>
-            </div>
-        </body>
-        </html>
+        :param status: Optional notice shown above the forecast, e.g. for stale data.
         """
-        self.text_browser.setHtml(html)
-
-
-class FetchWeatherThread(QtCore.QThread):
-    """Thread for fetching weather data."""
-    weatherDataReceived = QtCore.pyqtSignal(dict)
-    weatherDataError = QtCore.pyqtSignal(str)
+        if SettingsDialog.get_display_mode() == SettingsDialog.DISPLAY_MODE_TABLE:
+            start = time.perf_counter()
+            self.native_view.show_forecast(forecast, SettingsDialog.get_forecast_days(), status)
+            self.stack.setCurrentWidget(self.native_view)
+            metrics.record('render', (time.perf_counter() - start) * 1000.0, self.trace)
+        else:
+            self.display_weather_html(forecast, status)
+        self.forecastDisplayed.emit(forecast)
 
-    def __init__(self, latitude, longitude, forecast_days):
-        """Constructor."""
-        super(FetchWeatherThread, self).__init__()
-        self.latitude = latitude
-        self.longitude = longitude
-        self.forecast_days = forecast_days # Store forecast days
-
-    def run(self):
-        """Run the thread to fetch weather data."""
-        try:
-            # Use self.forecast_days in the API call
-            url = (
-                f"https://api.open-meteo.com/v1/forecast"
-                f"?latitude={self.latitude}"
-                f"&longitude={self.longitude}"
-                f"&current=temperature_2m,wind_speed_10m"
-                f"&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m"
-                f"&forecast_days={self.forecast_days}" # Use the setting
-                f"&timezone=auto" # Ask API to detect timezone if needed (though we convert manually)
-            )
-            # print(f"Fetching URL: {url}") # Uncomment for debugging API calls
-
-            with urllib.request.urlopen(url, timeout=20) as response: # Increased timeout slightly
-                data = response.read()
-                weather_data = json.loads(data.decode('utf-8'))
-            self.weatherDataReceived.emit(weather_data)
-        except urllib.error.URLError as e:
-            if hasattr(e, 'reason'):
-                self.weatherDataError.emit(f"Network Error: {e.reason}")
-            else:
-                self.weatherDataError.emit(f"URL Error: {e}")
-        except json.JSONDecodeError:
-            self.weatherDataError.emit("Error: Could not parse weather data from the server.")
-        except Exception as e:
-            self.weatherDataError.emit(f"An unexpected error occurred: {str(e)}")
+    def display_weather_html(self, forecast, status=None):
+        """Display the weather data as HTML using tables.
 
+        :param status: Optional notice shown above the forecast, e.g. for stale data.
+        """
+        start = time.perf_counter()
+        top = self.renderer.render_top(forecast, status)
+        table = self.renderer.render_table(forecast, SettingsDialog.get_forecast_days())
+        rendered = time.perf_counter()
+        metrics.record('render', (rendered - start) * 1000.0, self.trace)
+        # A refresh that changed nothing visible does not need a new layout, one that left
+        # the hourly table as it was only replaces the part above it
+        if table != self.current_table or top != self.current_top:
+            if table != self.current_table or not self.replace_top(top):
+                self.set_html(PAGE_TEMPLATE.format(top=top, table=table))
+                self.current_table = table
+            self.current_top = top
+            metrics.record('layout', (time.perf_counter() - rendered) * 1000.0, self.trace)
+        self.stack.setCurrentWidget(self.text_browser)
+        self.last_render_ms = (time.perf_counter() - start) * 1000.0
+        if self.last_render_ms > self.RENDER_BUDGET_MS:
+            QgsMessageLog.logMessage(
+                f"Rendering the forecast took {self.last_render_ms:.1f} ms", 'Weather Dock', Qgis.Info)
+
+    def finish_trace(self, outcome):
+        """Record the total time of the latest update."""
+        if self.trace is not None:
+            self.trace.label = f"Forecast update ({outcome})"
+            metrics.finish_trace(self.trace)
+            self.trace = None
+
+    def set_debug_enabled(self, enabled):
+        """Show or remove the debug tab with the request metrics."""
+        metrics.log_traces = enabled
+        if enabled and self.metrics_view is None:
+            self.metrics_view = MetricsView(self.cache, self.service)
+            self.tabs.addTab(self.metrics_view, "Metrics")
+        elif not enabled and self.metrics_view is not None:
+            self.tabs.removeTab(self.tabs.indexOf(self.metrics_view))
+            self.metrics_view.deleteLater()
+            self.metrics_view = None
+
+    def release_render_cache(self):
+        """Free the rendered forecast while the dock is hidden, it is redrawn from the cache when shown."""
+        self.renderer.clear()
+        self.native_view.clear()
+        if self.watchlist_view is not None:
+            self.watchlist_view.release()
+        self.text_browser.clear()
+        self.current_top = None
+        self.current_table = None
+        self.displayed_key = None
+
+    def set_html(self, html):
+        """Replace the document of the text browser and show it."""
+        self.text_browser.setHtml(html)
+        self.current_top = None
+        self.current_table = None
+        self.stack.setCurrentWidget(self.text_browser)
+
+    def replace_top(self, top):
+        """Replace the part of the document above the hourly table, return False if it cannot be found."""
+        document = self.text_browser.document()
+        block = document.begin()
+        while block.isValid():
+            fragments = block.begin()
+            while not fragments.atEnd():
+                if TABLE_ANCHOR in fragments.fragment().charFormat().anchorNames():
+                    # Keep the block separator before the table title, so the title keeps its format
+                    cursor = QtGui.QTextCursor(document)
+                    cursor.setPosition(block.position() - 1, QtGui.QTextCursor.KeepAnchor)
+                    cursor.insertHtml(top)
+                    return True
+                fragments += 1
+            block = block.next()
+        return False
+
+
+def format_age(seconds):
+    """Format an age in seconds as a short human readable string."""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 120:
+        return f"{minutes} min"
+    hours = minutes // 60
+    if hours < 48:
+        return f"{hours} h"
+    return f"{hours // 24} days"
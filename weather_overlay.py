@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ WeatherOverlay
+ Wind arrows and temperatures drawn on the map canvas at a scale dependent density.
+ ***************************************************************************/
+"""
+
+import math
+import time
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import QPointF, Qt
+from PyQt5.QtGui import QColor, QFont, QImage, QPainter, QPainterPath, QPen
+from PyQt5.QtNetwork import QNetworkRequest
+
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsMessageLog,
+    QgsPointXY,
+    QgsTask,
+)
+from qgis.gui import QgsMapCanvasItem
+
+from . import open_meteo
+from .forecast_cache import ForecastCache
+from .forecast_data import HOUR_SECONDS
+from .transforms import to_wgs84_transform
+
+# (temperature, wind speed, wind direction) of a sample, each None if not fetched
+GLYPH_VARIABLES = ('temperature_2m', 'wind_speed_10m', 'wind_direction_10m')
+
+
+def sample_values(forecast, epoch):
+    """Return the GLYPH_VARIABLES values of a forecast at the hour of epoch, the current ones as fallback."""
+    index = (epoch - forecast.start) // forecast.step
+    values = []
+    for name in GLYPH_VARIABLES:
+        value = forecast.value_at(name, index) if 0 <= index < len(forecast) else None
+        if value is None:
+            value = forecast.current.get(name)
+        values.append(value)
+    return tuple(values)
+
+
+def aggregate(samples):
+    """Return the mean of a list of GLYPH_VARIABLES tuples, wind directions averaged as vectors."""
+    temperatures = [sample[0] for sample in samples if sample[0] is not None]
+    speeds = [sample[1] for sample in samples if sample[1] is not None]
+    winds = [(sample[1], math.radians(sample[2])) for sample in samples
+             if sample[1] is not None and sample[2] is not None]
+    direction = None
+    if winds:
+        east = sum(speed * math.sin(angle) for speed, angle in winds)
+        north = sum(speed * math.cos(angle) for speed, angle in winds)
+        direction = math.degrees(math.atan2(east, north)) % 360.0
+    return (
+        sum(temperatures) / len(temperatures) if temperatures else None,
+        sum(speeds) / len(speeds) if speeds else None,
+        direction,
+    )
+
+
+class SamplePyramid:
+    """Level-of-detail pyramid over the forecast cache cells.
+
+    Level 0 holds one sample per cache cell. A cell of level n spans
+    2^n x 2^n cells of level 0, and its values are aggregated from the level
+    0 samples inside it, so zooming out never fetches anything the finer
+    levels already have. Aggregates are computed once per level and kept
+    until new samples arrive.
+    """
+
+    MAX_SAMPLES = 50000
+
+    def __init__(self, cell_size=ForecastCache.CELL_SIZE_DEGREES, levels=8):
+        """Constructor.
+
+        :param cell_size: Size of a level 0 cell in degrees.
+        :param levels: Number of levels, the coarsest cells are cell_size * 2^(levels - 1) degrees.
+        """
+        self.cell_size = cell_size
+        self.levels = levels
+        # Level 0 cells whose centers are valid WGS 84 coordinates
+        self.max_row = int(90.0 / cell_size + 1e-9)
+        self.max_column = int(180.0 / cell_size + 1e-9)
+        self.samples = {}  # level 0 cell (row, column) -> (fetched_at, values)
+        self.version = 0  # Incremented whenever the samples change
+        self._aggregates = {}  # level -> {cell: values}
+
+    def fine_cell(self, latitude, longitude):
+        """Return the level 0 cell of a coordinate, the same cells as the forecast cache."""
+        return ForecastCache.cell_key(latitude, longitude, 0)[:2]
+
+    def level_for(self, degrees):
+        """Return the finest level whose cells are at least degrees wide."""
+        for level in range(self.levels):
+            if self.cell_size * (1 << level) >= degrees:
+                return level
+        return self.levels - 1
+
+    def cells_in(self, level, south, west, north, east):
+        """Return the cells of a level overlapping a WGS 84 extent."""
+        factor = 1 << level
+        rows = range(round(south / self.cell_size) // factor, round(north / self.cell_size) // factor + 1)
+        columns = range(round(west / self.cell_size) // factor, round(east / self.cell_size) // factor + 1)
+        return [(row, column) for row in rows for column in columns]
+
+    def center(self, level, cell):
+        """Return the (latitude, longitude) center of a cell, within the valid WGS 84 range."""
+        factor = 1 << level
+        latitude, longitude = ((index * factor + (factor - 1) / 2.0) * self.cell_size for index in cell)
+        return min(max(latitude, -90.0), 90.0), min(max(longitude, -180.0), 180.0)
+
+    def fine_cell_at(self, level, cell):
+        """Return the level 0 cell at the center of a cell, the one to fetch for it.
+
+        Coarse cells at the poles or the antimeridian reach past the valid
+        coordinates, their fetched cell is moved onto the edge.
+        """
+        factor = 1 << level
+        row, column = (index * factor + factor // 2 for index in cell)
+        return (min(max(row, -self.max_row), self.max_row),
+                min(max(column, -self.max_column), self.max_column))
+
+    def add(self, samples, fetched_at=None):
+        """Add a dict of level 0 cell -> values."""
+        if not samples:
+            return
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        for cell, values in samples.items():
+            self.samples.pop(cell, None)  # Move to the end, the oldest samples are dropped first
+            self.samples[cell] = (fetched_at, values)
+        while len(self.samples) > self.MAX_SAMPLES:
+            del self.samples[next(iter(self.samples))]
+        self._changed()
+
+    def value(self, level, cell):
+        """Return the values of a cell, aggregated from its level 0 samples, or None if it has none."""
+        if level == 0:
+            sample = self.samples.get(cell)
+            return sample[1] if sample is not None else None
+        aggregates = self._aggregates.get(level)
+        if aggregates is None:
+            factor = 1 << level
+            groups = {}
+            for (row, column), (_, values) in self.samples.items():
+                groups.setdefault((row // factor, column // factor), []).append(values)
+            aggregates = self._aggregates[level] = {key: aggregate(group) for key, group in groups.items()}
+        return aggregates.get(cell)
+
+    def expire_before(self, timestamp):
+        """Drop the samples fetched before timestamp."""
+        stale = [cell for cell, (fetched_at, _) in self.samples.items() if fetched_at < timestamp]
+        for cell in stale:
+            del self.samples[cell]
+        if stale:
+            self._changed()
+
+    def clear(self):
+        """Drop all samples."""
+        self.samples.clear()
+        self._changed()
+
+    def _changed(self):
+        """Invalidate the aggregates."""
+        self._aggregates.clear()
+        self.version += 1
+
+
+def render_glyphs(task, width, height, ratio, glyphs):
+    """Draw glyphs into a transparent image; runs on a worker thread.
+
+    :param glyphs: List of (x, y, temperature, wind speed, wind direction) in logical pixels.
+    :return: The QImage, or None if the task was canceled.
+    """
+    image = QImage(int(width * ratio), int(height * ratio), QImage.Format_ARGB32_Premultiplied)
+    image.setDevicePixelRatio(ratio)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    font = QFont()
+    font.setPointSizeF(8.5)
+    font.setBold(True)
+    painter.setFont(font)
+    arrow_pen = QPen(QColor(30, 60, 120), 1.6)
+    halo_pen = QPen(QColor(255, 255, 255, 220), 3.5)
+    for number, (x, y, temperature, speed, direction) in enumerate(glyphs):
+        if number % 64 == 0 and task.isCanceled():
+            painter.end()
+            return None
+        if speed is not None and direction is not None:
+            # The direction is where the wind comes from, the arrow points downwind
+            length = 10.0 + min(speed, 60.0) / 60.0 * 22.0
+            angle = math.radians(direction + 180.0)
+            dx, dy = math.sin(angle) * length / 2.0, -math.cos(angle) * length / 2.0
+            tail, head = QPointF(x - dx, y - dy), QPointF(x + dx, y + dy)
+            path = QPainterPath(tail)
+            path.lineTo(head)
+            for side in (-0.45, 0.45):
+                barb = angle + math.pi + side
+                path.moveTo(head)
+                path.lineTo(head + QPointF(math.sin(barb) * 6.0, -math.cos(barb) * 6.0))
+            for pen in (halo_pen, arrow_pen):
+                painter.setPen(pen)
+                painter.drawPath(path)
+        if temperature is not None:
+            text = f"{temperature:.0f}°"
+            path = QPainterPath()
+            path.addText(QPointF(x + 6.0, y - 6.0), font, text)
+            painter.setPen(halo_pen)
+            painter.drawPath(path)
+            painter.fillPath(path, QColor(20, 20, 20))
+    painter.end()
+    return image
+
+
+class _OverlayItem(QgsMapCanvasItem):
+    """Canvas item showing the last rendered overlay image over the extent it was rendered for.
+
+    The canvas moves and scales the item with the map, so the image follows
+    panning without being redrawn until the new one is ready.
+    """
+
+    def __init__(self, canvas):
+        """Constructor."""
+        super(_OverlayItem, self).__init__(canvas)
+        self.image = None
+        self.setZValue(100)
+
+    def set_image(self, image, extent):
+        """Show image over a map extent."""
+        self.image = image
+        self.setRect(extent)
+        self.update()
+
+    def paint(self, painter, option=None, widget=None):
+        """Draw the image."""
+        if self.image is not None:
+            painter.drawImage(self.boundingRect(), self.image)
+
+
+class WeatherOverlay(QtCore.QObject):
+    """Draws wind arrows and temperatures over the map canvas.
+
+    The glyph density follows the scale through the levels of a
+    SamplePyramid: coarse cells when zoomed out, cache cells when zoomed
+    in. Only level 0 cells missing from both the pyramid and the forecast
+    cache are fetched, one hour of the GLYPH_VARIABLES each, whatever
+    variables the dock shows, in batched low priority requests.
+    The glyphs are drawn on a worker thread into an image that is only
+    redrawn when the extent or the samples changed.
+    """
+
+    UPDATE_DELAY_MS = 250  # Wait for the canvas to come to rest
+    MIN_SAMPLE_AGE_S = 15 * 60  # Samples are kept at least this long, also when the cache is disabled
+    RETRY_DELAY_S = 5 * 60  # Cells of a failed request are not requested again before this
+    GLYPH_SPACING_PX = 90
+    MAX_GLYPHS = 600
+
+    def __init__(self, iface, service, cache):
+        """Constructor."""
+        super(WeatherOverlay, self).__init__()
+        self.iface = iface
+        self.service = service
+        self.cache = cache
+        self.pyramid = SamplePyramid()
+        self.item = None
+        self._pending = {}  # request id -> level 0 cells in request order
+        self._failed = {}  # level 0 cell -> monotonic time from which it may be requested again
+        self._task = None
+        self._job = 0  # Id of the latest render job, older results are dropped
+        self._render_key = None  # Extent, size and samples version of the image on display
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.UPDATE_DELAY_MS)
+        self.timer.timeout.connect(self.update)
+        self.service.batchReceived.connect(self._on_batch_received)
+        self.service.forecastFailed.connect(self._on_failed)
+
+    def set_enabled(self, enabled):
+        """Show or remove the overlay; the canvas is only tracked while it is shown."""
+        canvas = self.iface.mapCanvas()
+        if enabled and self.item is None:
+            self.item = _OverlayItem(canvas)
+            canvas.extentsChanged.connect(self.timer.start)
+            self.update()
+        elif not enabled and self.item is not None:
+            try:
+                canvas.extentsChanged.disconnect(self.timer.start)
+            except TypeError:
+                pass
+            self.timer.stop()
+            self.cancel()
+            canvas.scene().removeItem(self.item)
+            self.item = None
+            self._render_key = None
+
+    def cancel(self):
+        """Abort the requests and the render job in progress."""
+        for request_id in list(self._pending):
+            self.service.abort(request_id)
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def expire_before(self, timestamp):
+        """Drop the samples fetched before timestamp, e.g. when a newer model run is available."""
+        self.pyramid.expire_before(timestamp)
+        if self.item is not None:
+            self.timer.start()
+
+    def clear(self):
+        """Drop all samples, e.g. after the weather provider changed."""
+        self.cancel()
+        self.pyramid.clear()
+        self._failed.clear()
+        if self.item is not None:
+            self.timer.start()
+
+    def update(self):
+        """Pick the level for the scale, fetch what is missing and redraw if anything changed."""
+        if self.item is None:
+            return
+        canvas = self.iface.mapCanvas()
+        settings = canvas.mapSettings()
+        extent = canvas.extent()
+        transform = to_wgs84_transform(settings.destinationCrs())
+        try:
+            bounds = transform.transformBoundingBox(extent) if transform is not None else extent
+        except QgsCsException:
+            return
+        south, north = max(bounds.yMinimum(), -90.0), min(bounds.yMaximum(), 90.0)
+        west, east = max(bounds.xMinimum(), -180.0), min(bounds.xMaximum(), 180.0)
+        width, height = settings.outputSize().width(), settings.outputSize().height()
+        if width <= 0 or height <= 0 or south >= north or west >= east:
+            return
+
+        self.pyramid.expire_before(time.time() - max(self.cache.ttl_seconds, self.MIN_SAMPLE_AGE_S))
+        level = self.pyramid.level_for((east - west) / width * self.GLYPH_SPACING_PX)
+        cells = self.pyramid.cells_in(level, south, west, north, east)
+        while len(cells) > self.MAX_GLYPHS and level < self.pyramid.levels - 1:
+            level += 1
+            cells = self.pyramid.cells_in(level, south, west, north, east)
+        cells = cells[:self.MAX_GLYPHS]
+
+        # Cells without samples take them from forecasts the dock already cached, then from the service
+        hour = int(time.time() // HOUR_SECONDS) * HOUR_SECONDS
+        missing = [self.pyramid.fine_cell_at(level, cell) for cell in cells if self.pyramid.value(level, cell) is None]
+        from_cache = {}
+        variables = self.service.provider.variables(GLYPH_VARIABLES)[1]
+        for fine_cell in missing:
+            entry = self.cache.peek_cell(fine_cell + (0,))
+            # The dock's selection may lack a glyph variable, e.g. the wind direction
+            if entry is not None and all(name in entry[1].hourly for name in variables):
+                from_cache[fine_cell] = sample_values(entry[1], hour)
+        self.pyramid.add(from_cache)
+        self._fetch([fine_cell for fine_cell in missing if fine_cell not in from_cache], hour)
+
+        key = (extent.toString(), width, height, level, self.pyramid.version)
+        if key == self._render_key:
+            return
+        self._render_key = key
+
+        to_pixel = settings.mapToPixel()
+        glyphs = []
+        for cell in cells:
+            values = self.pyramid.value(level, cell)
+            if values is None:
+                continue
+            latitude, longitude = self.pyramid.center(level, cell)
+            point = QgsPointXY(longitude, latitude)
+            try:
+                if transform is not None:
+                    point = transform.transform(point, QgsCoordinateTransform.ReverseTransform)
+            except QgsCsException:
+                continue
+            pixel = to_pixel.transform(point)
+            glyphs.append((pixel.x(), pixel.y()) + tuple(values))
+        self._render(glyphs, width, height, canvas.devicePixelRatioF(), extent)
+
+    def _fetch(self, fine_cells, hour):
+        """Fetch the hour of the level 0 cells not requested yet, nor failed recently, in batches."""
+        now = time.monotonic()
+        self._failed = {fine_cell: retry_at for fine_cell, retry_at in self._failed.items() if retry_at > now}
+        pending = {fine_cell for cells in self._pending.values() for fine_cell in cells}
+        fine_cells = [fine_cell for fine_cell in dict.fromkeys(fine_cells)
+                      if fine_cell not in pending and fine_cell not in self._failed]
+        for start in range(0, len(fine_cells), open_meteo.MAX_BATCH_SIZE):
+            batch = fine_cells[start:start + open_meteo.MAX_BATCH_SIZE]
+            points = [ForecastCache.cell_center(fine_cell + (0,)) for fine_cell in batch]
+            request_id = self.service.fetch_batch(
+                points, 1, QNetworkRequest.LowPriority, (hour, hour + HOUR_SECONDS), GLYPH_VARIABLES)
+            self._pending[request_id] = batch
+
+    def _render(self, glyphs, width, height, ratio, extent):
+        """Draw the glyphs on a worker thread, superseding a render job in progress."""
+        if self._task is not None:
+            self._task.cancel()
+        self._job += 1
+        job = self._job
+
+        def on_finished(exception, image=None):
+            if job != self._job:
+                return  # Superseded
+            self._task = None
+            if exception is not None:
+                QgsMessageLog.logMessage(f"Drawing the weather overlay failed: {exception}", 'Weather Dock', Qgis.Warning)
+            elif image is not None and self.item is not None:
+                self.item.set_image(image, extent)
+
+        self._task = QgsTask.fromFunction(
+            "Weather overlay", render_glyphs, width, height, ratio, glyphs,
+            on_finished=on_finished, flags=QgsTask.CanCancel | QgsTask.Hidden)
+        QgsApplication.taskManager().addTask(self._task)
+
+    def _on_batch_received(self, request_id, forecasts):
+        """Add the samples of a finished batch and redraw."""
+        fine_cells = self._pending.pop(request_id, None)
+        if fine_cells is None:
+            return  # Not ours, or superseded
+        hour = int(time.time() // HOUR_SECONDS) * HOUR_SECONDS
+        self.pyramid.add({fine_cell: sample_values(forecast, hour) for fine_cell, forecast in zip(fine_cells, forecasts)})
+        if self.item is not None:
+            self.timer.start()
+
+    def _on_failed(self, request_id, error_message):
+        """Drop a failed batch, its cells are requested again after RETRY_DELAY_S."""
+        fine_cells = self._pending.pop(request_id, None)
+        if fine_cells is not None:
+            retry_at = time.monotonic() + self.RETRY_DELAY_S
+            self._failed.update((fine_cell, retry_at) for fine_cell in fine_cells)
+            QgsMessageLog.logMessage(f"Weather overlay request failed: {error_message}", 'Weather Dock', Qgis.Info)